@@ -15,7 +15,7 @@ def create_app():
         "CORS_ORIGINS",
         "http://localhost:5173,http://127.0.0.1:5173"
     ).split(",")
-    CORS(app, origins=[o.strip() for o in origins])
+    CORS(app, origins=[o.strip() for o in origins], expose_headers=["X-Next-Cursor", "X-Search-Truncated"])
 
     with app.app_context():
         init_db()
@@ -42,4 +42,12 @@ def create_app():
 
 if __name__ == "__main__":
     app = create_app()
+    # The development server also executes queued autoruns unless AUTORUN_EMBEDDED_WORKER=0.
+    # Other deployments run worker.py. Under the reloader only the serving child starts one.
+    if os.environ.get("AUTORUN_EMBEDDED_WORKER", "1") == "1" and (
+        not app.debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+    ):
+        from services.job_queue import start_embedded_worker
+
+        start_embedded_worker()
     app.run(port=5000)
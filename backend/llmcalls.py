@@ -1,12 +1,26 @@
+import json
+import os
 import sys
+import threading
+import time
+
+import asyncio
+
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from google import genai
 from google.genai import types as genai_types
 
+from models import on_config_changed
+from services import llm_cache, resilience
+from services.governor import PermitTimeout, estimate_tokens, governor, max_wait
+from utils.aio import submit
+
 
 def _check_response(resp, provider: str):
     """Raise with full API error body instead of just the HTTP status line."""
-    if not resp.ok:
+    if resp.status_code >= 400:
         try:
             body = resp.json()
         except Exception:
@@ -78,8 +92,84 @@ AVAILABLE_MODELS = {
 _O_SERIES_PREFIXES = ("o1", "o3", "o4")
 
 
-def call_openai(prompt, user_input, model, api_key, endpoint=None, **kwargs):
-    url = endpoint or "https://api.openai.com/v1/chat/completions"
+# --- Client registry ---
+# One keep-alive session (or SDK client) per provider/api-key/endpoint, reused across
+# calls so connection setup is paid once instead of on every request.
+
+_HTTP_POOL_SIZE = int(os.environ.get("LLM_HTTP_POOL_SIZE", "32"))
+# Upper bound for any single upstream call; a run's deadline can only shorten it
+DEFAULT_TIMEOUT = 120
+_clients_lock = threading.Lock()
+_http_sessions = {}
+_async_clients = {}
+_gemini_clients = {}
+
+
+def _get_session(provider, api_key, url):
+    key = (provider, api_key, url)
+    with _clients_lock:
+        session = _http_sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_sessions[key] = session
+        return session
+
+
+def _get_gemini_client(api_key):
+    with _clients_lock:
+        client = _gemini_clients.get(api_key)
+        if client is None:
+            client = genai.Client(api_key=api_key)
+            _gemini_clients[api_key] = client
+        return client
+
+
+def invalidate_clients(provider=None):
+    """Drop and close cached sessions/clients for a provider (all providers if None)
+    after its key or endpoint changes."""
+    with _clients_lock:
+        sessions = [_http_sessions.pop(k) for k in list(_http_sessions) if provider in (None, k[0])]
+        async_clients = [(k[1], _async_clients.pop(k)) for k in list(_async_clients) if provider in (None, k[0])]
+        gemini_clients = []
+        if provider in (None, "gemini"):
+            gemini_clients = list(_gemini_clients.values())
+            _gemini_clients.clear()
+
+    for session in sessions:
+        # Connections still checked out by in-flight calls are discarded when released
+        session.close()
+    for loop, client in async_clients:
+        if not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(_aclose_later(client.aclose), loop)
+    for client in gemini_clients:
+        submit(_aclose_later(client.aio.aclose, client.close))
+
+
+async def _aclose_later(aclose, close=None):
+    # Give calls already running on the evicted client time to finish before closing it
+    await asyncio.sleep(DEFAULT_TIMEOUT)
+    try:
+        await aclose()
+        if close is not None:
+            close()
+    except Exception as e:
+        print(f"[llmcalls] closing evicted client failed: {e}", file=sys.stderr)
+
+
+def _on_config_changed(payload):
+    if payload is None:
+        invalidate_clients()
+    elif payload.startswith("providers:"):
+        invalidate_clients(payload.split(":", 1)[1])
+
+
+on_config_changed(_on_config_changed)
+
+
+def _openai_request(prompt, user_input, model, api_key, **kwargs):
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
     is_o_series = model.startswith(_O_SERIES_PREFIXES)
     messages = []
@@ -91,9 +181,10 @@ def call_openai(prompt, user_input, model, api_key, endpoint=None, **kwargs):
         # o-series: no temperature; use reasoning_effort + max_completion_tokens
         payload["reasoning_effort"] = kwargs.get("reasoning_effort", "medium")
         payload["max_completion_tokens"] = kwargs.get("max_tokens", 8192)
-    resp = requests.post(url, json=payload, headers=headers, timeout=120)
-    _check_response(resp, "openai")
-    data = resp.json()
+    return payload, headers
+
+
+def _openai_result(data, model):
     return {
         "text": data["choices"][0]["message"]["content"],
         "usage": data.get("usage", {}),
@@ -101,16 +192,20 @@ def call_openai(prompt, user_input, model, api_key, endpoint=None, **kwargs):
     }
 
 
-def call_gemini(prompt, user_input, model, api_key, endpoint=None, **kwargs):
-    client = genai.Client(api_key=api_key)
-    config = genai_types.GenerateContentConfig(
-        system_instruction=prompt if prompt else None,
-    )
-    response = client.models.generate_content(
-        model=model,
-        contents=user_input,
-        config=config,
-    )
+def _call_openai_compatible(provider, prompt, user_input, model, api_key, url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    payload, headers = _openai_request(prompt, user_input, model, api_key, **kwargs)
+    session = _get_session(provider, api_key, url)
+    resp = session.post(url, json=payload, headers=headers, timeout=timeout)
+    _check_response(resp, provider)
+    return _openai_result(resp.json(), model)
+
+
+def call_openai(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.openai.com/v1/chat/completions"
+    return _call_openai_compatible("openai", prompt, user_input, model, api_key, url, timeout=timeout, **kwargs)
+
+
+def _gemini_result(response, model):
     return {
         "text": response.text,
         "usage": {
@@ -121,8 +216,25 @@ def call_gemini(prompt, user_input, model, api_key, endpoint=None, **kwargs):
     }
 
 
-def call_claude(prompt, user_input, model, api_key, endpoint=None, **kwargs):
-    url = endpoint or "https://api.anthropic.com/v1/messages"
+def _gemini_config(prompt, timeout):
+    return genai_types.GenerateContentConfig(
+        system_instruction=prompt if prompt else None,
+        http_options=genai_types.HttpOptions(timeout=int(timeout * 1000)),
+    )
+
+
+def call_gemini(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    client = _get_gemini_client(api_key)
+    config = _gemini_config(prompt, timeout)
+    response = client.models.generate_content(
+        model=model,
+        contents=user_input,
+        config=config,
+    )
+    return _gemini_result(response, model)
+
+
+def _claude_request(prompt, user_input, model, api_key, **kwargs):
     headers = {
         "x-api-key": api_key,
         "anthropic-version": "2023-06-01",
@@ -135,9 +247,10 @@ def call_claude(prompt, user_input, model, api_key, endpoint=None, **kwargs):
     }
     if prompt:
         payload["system"] = prompt
-    resp = requests.post(url, json=payload, headers=headers, timeout=120)
-    _check_response(resp, "claude")
-    data = resp.json()
+    return payload, headers
+
+
+def _claude_result(data, model):
     return {
         "text": data["content"][0]["text"],
         "usage": data.get("usage", {}),
@@ -145,12 +258,18 @@ def call_claude(prompt, user_input, model, api_key, endpoint=None, **kwargs):
     }
 
 
-def call_grok(prompt, user_input, model, api_key, endpoint=None, **kwargs):
-    return call_openai(
-        prompt, user_input, model, api_key,
-        endpoint=endpoint or "https://api.x.ai/v1/chat/completions",
-        **kwargs,
-    )
+def call_claude(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.anthropic.com/v1/messages"
+    payload, headers = _claude_request(prompt, user_input, model, api_key, **kwargs)
+    session = _get_session("claude", api_key, url)
+    resp = session.post(url, json=payload, headers=headers, timeout=timeout)
+    _check_response(resp, "claude")
+    return _claude_result(resp.json(), model)
+
+
+def call_grok(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.x.ai/v1/chat/completions"
+    return _call_openai_compatible("grok", prompt, user_input, model, api_key, url, timeout=timeout, **kwargs)
 
 
 PROVIDERS = {
@@ -161,25 +280,485 @@ PROVIDERS = {
 }
 
 
-def call_llm(provider, prompt, user_input, model, api_key, endpoint=None, **kwargs):
+def _error_result(provider, model, error, usage=None):
+    return {
+        "text": "",
+        "usage": usage or {},
+        "model": model,
+        "provider": provider,
+        "error": error,
+    }
+
+
+def _replay_miss(provider, model, mode):
+    return llm_cache.mark(_error_result(provider, model, "Cache miss in replay mode"), mode, hit=False)
+
+
+def _with_retries(result, retries):
+    usage = dict(result.get("usage") or {})
+    usage["retries"] = retries
+    result["usage"] = usage
+    return result
+
+
+def _remaining(provider, deadline):
+    """Timeout for the next upstream step: time left before the deadline, capped at DEFAULT_TIMEOUT."""
+    if deadline is None:
+        return DEFAULT_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise resilience.DeadlineExceeded(f"[{provider}] deadline exceeded")
+    return min(DEFAULT_TIMEOUT, remaining)
+
+
+def _permit_timeout(provider, deadline):
+    """How long to queue for a governor permit: until the deadline, or the configured maximum."""
+    if deadline is None:
+        return max_wait(provider)
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise resilience.DeadlineExceeded(f"[{provider}] deadline exceeded")
+    return remaining
+
+
+def _attempt_failed(provider, permit, exc, retries, deadline):
+    """Report a failed attempt; return seconds to wait before retrying, or None to give up."""
+    permit.release(rate_limited=resilience.error_status(exc) == 429)
+    resilience.breaker(provider).record_failure(exc)
+    delay = resilience.policy(provider).delay(exc, retries)
+    if delay is not None and deadline is not None and time.monotonic() + delay >= deadline:
+        return None
+    return delay
+
+
+def _invoke(provider, prompt, user_input, model, api_key, endpoint, kwargs, deadline=None):
+    """Call a provider under its governor, retry policy, circuit breaker and deadline. Never raises."""
+    tokens = estimate_tokens(prompt, user_input, kwargs)
+    retries = 0
+    while True:
+        try:
+            resilience.breaker(provider).check()
+            permit = governor.acquire(provider, model, api_key, tokens, timeout=_permit_timeout(provider, deadline))
+        except (resilience.CircuitOpenError, TimeoutError) as e:
+            return _with_retries(_error_result(provider, model, str(e)), retries)
+        try:
+            started = time.monotonic()
+            timeout = _remaining(provider, deadline)
+            result = PROVIDERS[provider](prompt, user_input, model, api_key, endpoint, timeout=timeout, **kwargs)
+            result["provider"] = provider
+            result["error"] = None
+            permit.release(result.get("usage") or {})
+            resilience.breaker(provider).record_success()
+            resilience.record_latency(provider, model, time.monotonic() - started)
+            return _with_retries(result, retries)
+        except Exception as e:
+            delay = _attempt_failed(provider, permit, e, retries, deadline)
+            if delay is None:
+                return _with_retries(_error_result(provider, model, str(e)), retries)
+        finally:
+            permit.release()
+        retries += 1
+        time.sleep(delay)
+
+
+def call_llm(provider, prompt, user_input, model, api_key, endpoint=None, cache_mode=None, deadline=None, **kwargs):
+    """Call a provider and return a result dict; never raises.
+
+    deadline is a time.monotonic() value bounding queueing, retries and upstream timeouts.
+    """
     if provider not in PROVIDERS:
-        return {
-            "text": "",
-            "usage": {},
-            "model": model,
-            "provider": provider,
-            "error": f"Unknown provider: {provider}",
-        }
+        return _error_result(provider, model, f"Unknown provider: {provider}")
+
+    mode = llm_cache.resolve_mode(cache_mode)
+    cache_key = None
+    if mode != "off":
+        cache_key = llm_cache.request_key(provider, prompt, user_input, model, endpoint, kwargs)
+        if mode in llm_cache.READ_MODES:
+            cached = llm_cache.lookup(cache_key, mode)
+            if cached is not None:
+                cached["provider"] = provider
+                cached["error"] = None
+                return cached
+            if mode == "replay":
+                return _replay_miss(provider, model, mode)
+
+    result = _invoke(provider, prompt, user_input, model, api_key, endpoint, kwargs, deadline)
+    if cache_key:
+        if not result["error"]:
+            llm_cache.store(cache_key, provider, result)
+        llm_cache.mark(result, mode, hit=False)
+    return result
+
+
+# --- Async ---
+# Coroutine counterparts of the call_* functions, driven by the shared event loop in
+# utils/aio.py. They use HTTP/2 httpx clients (one per provider and event loop) and
+# Gemini's native async client, so many upstream calls can share a handful of threads.
+
+_ASYNC_MAX_CONNECTIONS = int(os.environ.get("LLM_ASYNC_MAX_CONNECTIONS", "200"))
+
+
+def _get_async_client(provider):
+    key = (provider, asyncio.get_running_loop())
+    with _clients_lock:
+        client = _async_clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(
+                http2=True,
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=_ASYNC_MAX_CONNECTIONS,
+                    max_keepalive_connections=_HTTP_POOL_SIZE,
+                ),
+            )
+            _async_clients[key] = client
+        return client
+
+
+async def _acall_openai_compatible(provider, prompt, user_input, model, api_key, url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    payload, headers = _openai_request(prompt, user_input, model, api_key, **kwargs)
+    resp = await _get_async_client(provider).post(url, json=payload, headers=headers, timeout=timeout)
+    _check_response(resp, provider)
+    return _openai_result(resp.json(), model)
+
+
+async def acall_openai(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.openai.com/v1/chat/completions"
+    return await _acall_openai_compatible("openai", prompt, user_input, model, api_key, url, timeout=timeout, **kwargs)
+
+
+async def acall_gemini(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    client = _get_gemini_client(api_key)
+    config = _gemini_config(prompt, timeout)
+    response = await client.aio.models.generate_content(
+        model=model,
+        contents=user_input,
+        config=config,
+    )
+    return _gemini_result(response, model)
+
+
+async def acall_claude(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.anthropic.com/v1/messages"
+    payload, headers = _claude_request(prompt, user_input, model, api_key, **kwargs)
+    resp = await _get_async_client("claude").post(url, json=payload, headers=headers, timeout=timeout)
+    _check_response(resp, "claude")
+    return _claude_result(resp.json(), model)
+
+
+async def acall_grok(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.x.ai/v1/chat/completions"
+    return await _acall_openai_compatible("grok", prompt, user_input, model, api_key, url, timeout=timeout, **kwargs)
+
+
+ASYNC_PROVIDERS = {
+    "openai": acall_openai,
+    "gemini": acall_gemini,
+    "claude": acall_claude,
+    "grok": acall_grok,
+}
+
+
+async def _aattempt(provider, prompt, user_input, model, api_key, endpoint, kwargs, tokens, deadline):
+    """One governed call, hard-bounded by the deadline. Raises on failure."""
+    permit = await governor.aacquire(provider, model, api_key, tokens, timeout=_permit_timeout(provider, deadline))
     try:
-        result = PROVIDERS[provider](prompt, user_input, model, api_key, endpoint, **kwargs)
-        result["provider"] = provider
-        result["error"] = None
+        started = time.monotonic()
+        timeout = _remaining(provider, deadline)
+        try:
+            result = await asyncio.wait_for(
+                ASYNC_PROVIDERS[provider](prompt, user_input, model, api_key, endpoint, timeout=timeout, **kwargs),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            raise resilience.DeadlineExceeded(f"[{provider}] deadline exceeded") from None
+        permit.release(result.get("usage") or {})
+        resilience.record_latency(provider, model, time.monotonic() - started)
         return result
     except Exception as e:
-        return {
-            "text": "",
-            "usage": {},
-            "model": model,
-            "provider": provider,
-            "error": str(e),
-        }
+        permit.release(rate_limited=resilience.error_status(e) == 429)
+        raise
+    finally:
+        # Also returns the slot when the call is cancelled, e.g. as the losing side of a hedge
+        permit.release()
+
+
+async def _ahedged(provider, prompt, user_input, model, api_key, endpoint, kwargs, tokens, deadline, hedge):
+    """Run one attempt; if hedging and it outlives the model's p95 latency, race a duplicate.
+
+    The first successful reply wins and the other request is cancelled. Returns
+    (result, hedge) where hedge is None, "primary" or "backup".
+    """
+    def attempt():
+        return asyncio.ensure_future(
+            _aattempt(provider, prompt, user_input, model, api_key, endpoint, kwargs, tokens, deadline)
+        )
+
+    delay = resilience.hedge_delay(provider, model) if hedge else None
+    primary = attempt()
+    if delay is None:
+        return await primary, None
+    tasks = {primary}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return primary.result(), None
+        backup = attempt()
+        tasks.add(backup)
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), "primary" if task is primary else "backup"
+                if task is primary or error is None:
+                    error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _ainvoke(provider, prompt, user_input, model, api_key, endpoint, kwargs, deadline=None, hedge=False):
+    tokens = estimate_tokens(prompt, user_input, kwargs)
+    retries = 0
+    while True:
+        try:
+            resilience.breaker(provider).check()
+        except resilience.CircuitOpenError as e:
+            return _with_retries(_error_result(provider, model, str(e)), retries)
+        try:
+            result, hedged = await _ahedged(
+                provider, prompt, user_input, model, api_key, endpoint, kwargs, tokens, deadline, hedge
+            )
+            result["provider"] = provider
+            result["error"] = None
+            resilience.breaker(provider).record_success()
+            if hedged:
+                result["usage"] = dict(result.get("usage") or {}, hedge=hedged)
+            return _with_retries(result, retries)
+        except PermitTimeout as e:
+            # Queued locally for too long; the provider was never called
+            return _with_retries(_error_result(provider, model, str(e)), retries)
+        except Exception as e:
+            resilience.breaker(provider).record_failure(e)
+            delay = resilience.policy(provider).delay(e, retries)
+            if delay is not None and deadline is not None and time.monotonic() + delay >= deadline:
+                delay = None
+            if delay is None:
+                return _with_retries(_error_result(provider, model, str(e)), retries)
+        retries += 1
+        await asyncio.sleep(delay)
+
+
+async def acall_llm(provider, prompt, user_input, model, api_key, endpoint=None, cache_mode=None,
+                    deadline=None, hedge=False, **kwargs):
+    """Async counterpart of call_llm with the same never-raise result contract.
+
+    With hedge=True a duplicate request is sent once the call has taken longer than the
+    model's recent p95 latency; usage["hedge"] records which request won.
+    """
+    if provider not in ASYNC_PROVIDERS:
+        return _error_result(provider, model, f"Unknown provider: {provider}")
+
+    mode = llm_cache.resolve_mode(cache_mode)
+    cache_key = None
+    if mode != "off":
+        cache_key = llm_cache.request_key(provider, prompt, user_input, model, endpoint, kwargs)
+        if mode in llm_cache.READ_MODES:
+            cached = await llm_cache.alookup(cache_key, mode)
+            if cached is not None:
+                cached["provider"] = provider
+                cached["error"] = None
+                return cached
+            if mode == "replay":
+                return _replay_miss(provider, model, mode)
+
+    result = await _ainvoke(provider, prompt, user_input, model, api_key, endpoint, kwargs, deadline, hedge)
+    if cache_key:
+        if not result["error"]:
+            await llm_cache.astore(cache_key, provider, result)
+        llm_cache.mark(result, mode, hit=False)
+    return result
+
+
+# --- Streaming ---
+# Each stream_* generator yields text deltas as they arrive and returns the same
+# {"text", "usage", "model"} dict as its call_* counterpart once the stream ends.
+
+def _iter_sse_data(resp):
+    for line in resp.iter_lines(decode_unicode=True):
+        if line and line.startswith("data:"):
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            yield json.loads(data)
+
+
+def _stream_openai_compatible(provider, prompt, user_input, model, api_key, url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    payload, headers = _openai_request(prompt, user_input, model, api_key, **kwargs)
+    payload["stream"] = True
+    payload["stream_options"] = {"include_usage": True}
+    session = _get_session(provider, api_key, url)
+    parts = []
+    usage = {}
+    with session.post(url, json=payload, headers=headers, timeout=timeout, stream=True) as resp:
+        _check_response(resp, provider)
+        for event in _iter_sse_data(resp):
+            model = event.get("model", model)
+            if event.get("usage"):
+                usage = event["usage"]
+            for choice in event.get("choices") or []:
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+    return {"text": "".join(parts), "usage": usage, "model": model}
+
+
+def stream_openai(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.openai.com/v1/chat/completions"
+    return (yield from _stream_openai_compatible("openai", prompt, user_input, model, api_key, url, timeout=timeout, **kwargs))
+
+
+def stream_gemini(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    client = _get_gemini_client(api_key)
+    config = _gemini_config(prompt, timeout)
+    parts = []
+    usage_metadata = None
+    for chunk in client.models.generate_content_stream(
+        model=model,
+        contents=user_input,
+        config=config,
+    ):
+        if chunk.usage_metadata:
+            usage_metadata = chunk.usage_metadata
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+    return {
+        "text": "".join(parts),
+        "usage": {
+            "prompt_tokens": getattr(usage_metadata, "prompt_token_count", 0),
+            "completion_tokens": getattr(usage_metadata, "candidates_token_count", 0),
+        },
+        "model": model,
+    }
+
+
+def stream_claude(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.anthropic.com/v1/messages"
+    payload, headers = _claude_request(prompt, user_input, model, api_key, **kwargs)
+    payload["stream"] = True
+    session = _get_session("claude", api_key, url)
+    parts = []
+    usage = {}
+    with session.post(url, json=payload, headers=headers, timeout=timeout, stream=True) as resp:
+        _check_response(resp, "claude")
+        for event in _iter_sse_data(resp):
+            kind = event.get("type")
+            if kind == "message_start":
+                message = event.get("message", {})
+                model = message.get("model", model)
+                usage.update(message.get("usage", {}))
+            elif kind == "content_block_delta":
+                delta = event.get("delta", {}).get("text")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            elif kind == "message_delta":
+                usage.update(event.get("usage", {}))
+            elif kind == "error":
+                raise requests.HTTPError(f"[claude] stream error: {event.get('error')}")
+    return {"text": "".join(parts), "usage": usage, "model": model}
+
+
+def stream_grok(prompt, user_input, model, api_key, endpoint=None, timeout=DEFAULT_TIMEOUT, **kwargs):
+    url = endpoint or "https://api.x.ai/v1/chat/completions"
+    return (yield from _stream_openai_compatible("grok", prompt, user_input, model, api_key, url, timeout=timeout, **kwargs))
+
+
+STREAM_PROVIDERS = {
+    "openai": stream_openai,
+    "gemini": stream_gemini,
+    "claude": stream_claude,
+    "grok": stream_grok,
+}
+
+
+def stream_llm(provider, prompt, user_input, model, api_key, endpoint=None, cache_mode=None, deadline=None, **kwargs):
+    """Yield ("delta", text) events, then a final ("done", result) shaped like call_llm's return value.
+
+    A cache hit is replayed as a single delta carrying the whole text. Past the deadline the
+    stream is cut off and the text received so far is returned with an error.
+    """
+    if provider not in STREAM_PROVIDERS:
+        yield "done", _error_result(provider, model, f"Unknown provider: {provider}")
+        return
+
+    mode = llm_cache.resolve_mode(cache_mode)
+    cache_key = None
+    if mode != "off":
+        cache_key = llm_cache.request_key(provider, prompt, user_input, model, endpoint, kwargs)
+        if mode in llm_cache.READ_MODES:
+            cached = llm_cache.lookup(cache_key, mode)
+            if cached is not None:
+                cached["provider"] = provider
+                cached["error"] = None
+                if cached["text"]:
+                    yield "delta", cached["text"]
+                yield "done", cached
+                return
+            if mode == "replay":
+                yield "done", _replay_miss(provider, model, mode)
+                return
+
+    parts = []
+    tokens = estimate_tokens(prompt, user_input, kwargs)
+    retries = 0
+    # Retry only while nothing has been sent to the client; a stream that fails midway
+    # keeps the text received so far
+    while True:
+        try:
+            resilience.breaker(provider).check()
+            permit = governor.acquire(provider, model, api_key, tokens, timeout=_permit_timeout(provider, deadline))
+        except (resilience.CircuitOpenError, TimeoutError) as e:
+            result = _error_result(provider, model, str(e))
+            break
+        stream = None
+        try:
+            timeout = _remaining(provider, deadline)
+            stream = STREAM_PROVIDERS[provider](prompt, user_input, model, api_key, endpoint, timeout=timeout, **kwargs)
+            while True:
+                try:
+                    delta = next(stream)
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+                parts.append(delta)
+                yield "delta", delta
+                _remaining(provider, deadline)
+            result["provider"] = provider
+            result["error"] = None
+            permit.release(result.get("usage") or {})
+            resilience.breaker(provider).record_success()
+            break
+        except Exception as e:
+            delay = _attempt_failed(provider, permit, e, retries, deadline)
+            if delay is None or parts:
+                result = _error_result(provider, model, str(e))
+                result["text"] = "".join(parts)
+                break
+        finally:
+            # Closing the provider generator releases its HTTP response if we stop early
+            if stream is not None:
+                stream.close()
+            permit.release()
+        retries += 1
+        time.sleep(delay)
+    _with_retries(result, retries)
+    if cache_key:
+        if not result["error"]:
+            llm_cache.store(cache_key, provider, result)
+        llm_cache.mark(result, mode, hit=False)
+    yield "done", result
@@ -0,0 +1,14 @@
+-- migrate: no-transaction
+-- Foreign keys the run detail, progress and export queries join on, and the run
+-- history order. Built concurrently so writes to these tables carry on meanwhile.
+
+-- get_run: a run's prompts, in order
+CREATE INDEX CONCURRENTLY IF NOT EXISTS run_prompts_run_id_idx ON run_prompts (run_id, sequence_num);
+
+-- Outputs, scores and judge results of a prompt
+CREATE INDEX CONCURRENTLY IF NOT EXISTS run_outputs_run_prompt_id_idx ON run_outputs (run_prompt_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS scores_run_prompt_id_idx ON scores (run_prompt_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS judge_results_run_prompt_id_idx ON judge_results (run_prompt_id);
+
+-- list_runs: newest first, id breaking ties between runs created together
+CREATE INDEX CONCURRENTLY IF NOT EXISTS runs_created_at_idx ON runs (created_at DESC, id DESC);
@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- Run history filters by provider and model with containment on models_config
+-- (r.models_config @> '[{"provider": ...}]'), which jsonb_path_ops indexes compactly.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS runs_models_config_idx ON runs USING GIN (models_config jsonb_path_ops);
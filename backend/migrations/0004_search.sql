@@ -0,0 +1,122 @@
+-- migrate: no-transaction
+-- Search over prompts and outputs (GET /api/runs/search).
+--
+-- Word search reads tsvectors kept in side tables, one row per prompt or output,
+-- which triggers fill as rows are written. Keeping them out of run_prompts and
+-- run_outputs keeps them out of SELECT * there. Backfilling them also does not
+-- rewrite those tables or fire their notify and leaderboard triggers. Substring
+-- search uses trigram indexes on the text itself. Parsing uses the 'english'
+-- configuration; queries must use the same one.
+--
+-- Inserts fill the side tables once per statement, from a transition table, so a
+-- batch writer's multi-row INSERT parses and indexes its rows in one go. Edits to
+-- the text are rare and stay per row (triggers with transition tables cannot list
+-- columns). The GIN indexes queue new entries in a 16 MB pending list that vacuum
+-- merges in bulk, rather than updating the index on every insert.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE TABLE IF NOT EXISTS run_prompts_search (
+    run_prompt_id INTEGER PRIMARY KEY REFERENCES run_prompts(id) ON DELETE CASCADE,
+    document TSVECTOR NOT NULL
+);
+
+-- provider and model are copied so filtered searches never join run_outputs
+CREATE TABLE IF NOT EXISTS run_outputs_search (
+    run_output_id INTEGER PRIMARY KEY REFERENCES run_outputs(id) ON DELETE CASCADE,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    document TSVECTOR NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION run_prompts_search_inserted() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO run_prompts_search (run_prompt_id, document)
+    SELECT id, to_tsvector('english', prompt_text) FROM new_rows
+    ON CONFLICT (run_prompt_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION run_outputs_search_inserted() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO run_outputs_search (run_output_id, provider, model, document)
+    SELECT id, provider, model, to_tsvector('english', COALESCE(output_text, '')) FROM new_rows
+    ON CONFLICT (run_output_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION run_prompts_search_changed() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO run_prompts_search (run_prompt_id, document)
+    VALUES (NEW.id, to_tsvector('english', NEW.prompt_text))
+    ON CONFLICT (run_prompt_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION run_outputs_search_changed() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO run_outputs_search (run_output_id, provider, model, document)
+    VALUES (NEW.id, NEW.provider, NEW.model, to_tsvector('english', COALESCE(NEW.output_text, '')))
+    ON CONFLICT (run_output_id) DO UPDATE SET document = EXCLUDED.document;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER run_prompts_search_inserted
+    AFTER INSERT ON run_prompts REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION run_prompts_search_inserted();
+
+CREATE OR REPLACE TRIGGER run_outputs_search_inserted
+    AFTER INSERT ON run_outputs REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION run_outputs_search_inserted();
+
+CREATE OR REPLACE TRIGGER run_prompts_search
+    AFTER UPDATE OF prompt_text ON run_prompts
+    FOR EACH ROW EXECUTE FUNCTION run_prompts_search_changed();
+
+CREATE OR REPLACE TRIGGER run_outputs_search
+    AFTER UPDATE OF output_text ON run_outputs
+    FOR EACH ROW EXECUTE FUNCTION run_outputs_search_changed();
+
+-- Rows written before the triggers existed, in batches committed one at a time. Safe to
+-- run again: rows the triggers (or an earlier, interrupted pass) already covered are kept
+DO $$
+DECLARE
+    batch CONSTANT INTEGER := 10000;
+    next_id INTEGER := 0;
+    last_id INTEGER;
+BEGIN
+    SELECT MAX(id) INTO last_id FROM run_prompts;
+    WHILE next_id <= COALESCE(last_id, -1) LOOP
+        INSERT INTO run_prompts_search (run_prompt_id, document)
+        SELECT id, to_tsvector('english', prompt_text) FROM run_prompts
+        WHERE id >= next_id AND id < next_id + batch
+        ON CONFLICT (run_prompt_id) DO NOTHING;
+        COMMIT;
+        next_id := next_id + batch;
+    END LOOP;
+
+    next_id := 0;
+    SELECT MAX(id) INTO last_id FROM run_outputs;
+    WHILE next_id <= COALESCE(last_id, -1) LOOP
+        INSERT INTO run_outputs_search (run_output_id, provider, model, document)
+        SELECT id, provider, model, to_tsvector('english', COALESCE(output_text, '')) FROM run_outputs
+        WHERE id >= next_id AND id < next_id + batch
+        ON CONFLICT (run_output_id) DO NOTHING;
+        COMMIT;
+        next_id := next_id + batch;
+    END LOOP;
+END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS run_prompts_search_document_idx ON run_prompts_search
+    USING GIN (document) WITH (fastupdate = on, gin_pending_list_limit = 16384);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS run_outputs_search_document_idx ON run_outputs_search
+    USING GIN (document) WITH (fastupdate = on, gin_pending_list_limit = 16384);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS run_prompts_prompt_text_trgm_idx ON run_prompts
+    USING GIN (prompt_text gin_trgm_ops) WITH (fastupdate = on, gin_pending_list_limit = 16384);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS run_outputs_output_text_trgm_idx ON run_outputs
+    USING GIN (output_text gin_trgm_ops) WITH (fastupdate = on, gin_pending_list_limit = 16384);
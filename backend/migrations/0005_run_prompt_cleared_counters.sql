@@ -0,0 +1,5 @@
+-- Autorun status deltas only carry rows written since the client's cursor, so they cannot
+-- show rows that were deleted. clear_prompt_results bumps these counters instead; the
+-- prompt row then comes back in the next delta and the client drops what it had cached.
+ALTER TABLE run_prompts ADD COLUMN IF NOT EXISTS outputs_cleared INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE run_prompts ADD COLUMN IF NOT EXISTS judge_results_cleared INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,11 @@
+-- Content-addressed cache of LLM responses (see services/llm_cache.py)
+CREATE TABLE IF NOT EXISTS llm_cache (
+    cache_key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    response JSONB NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    last_hit_at TIMESTAMPTZ DEFAULT NOW()
+);
@@ -0,0 +1,41 @@
+-- Broadcast run changes (any table in a run's tree) on the run_changed channel so every
+-- process can invalidate what it knows about that run without polling the database.
+CREATE OR REPLACE FUNCTION notify_run_changed() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+    changed_run_id INTEGER;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+    IF TG_TABLE_NAME = 'runs' THEN
+        changed_run_id := rec.id;
+    ELSIF TG_TABLE_NAME = 'run_prompts' THEN
+        changed_run_id := rec.run_id;
+    ELSE
+        SELECT run_id INTO changed_run_id FROM run_prompts WHERE id = rec.run_prompt_id;
+    END IF;
+    IF changed_run_id IS NOT NULL THEN
+        PERFORM pg_notify('run_changed', changed_run_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER runs_notify_changed
+    AFTER UPDATE OR DELETE ON runs
+    FOR EACH ROW EXECUTE FUNCTION notify_run_changed();
+CREATE OR REPLACE TRIGGER run_prompts_notify_changed
+    AFTER INSERT OR UPDATE OR DELETE ON run_prompts
+    FOR EACH ROW EXECUTE FUNCTION notify_run_changed();
+CREATE OR REPLACE TRIGGER run_outputs_notify_changed
+    AFTER INSERT OR UPDATE OR DELETE ON run_outputs
+    FOR EACH ROW EXECUTE FUNCTION notify_run_changed();
+CREATE OR REPLACE TRIGGER scores_notify_changed
+    AFTER INSERT OR UPDATE OR DELETE ON scores
+    FOR EACH ROW EXECUTE FUNCTION notify_run_changed();
+CREATE OR REPLACE TRIGGER judge_results_notify_changed
+    AFTER INSERT OR UPDATE OR DELETE ON judge_results
+    FOR EACH ROW EXECUTE FUNCTION notify_run_changed();
@@ -0,0 +1,31 @@
+-- Durable autorun queue: one job per run, one task per prompt (see services/job_queue.py).
+-- Job state: active | paused | cancelled | done.
+-- Task state: pending | running | done | failed | cancelled. A running task belongs to
+-- worker_id until lease_expires_at; workers extend the lease while they work on it.
+CREATE TABLE IF NOT EXISTS autorun_jobs (
+    id SERIAL PRIMARY KEY,
+    run_id INTEGER NOT NULL UNIQUE REFERENCES runs(id) ON DELETE CASCADE,
+    state TEXT NOT NULL DEFAULT 'active',
+    params JSONB NOT NULL DEFAULT '{}',
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS autorun_tasks (
+    id SERIAL PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES autorun_jobs(id) ON DELETE CASCADE,
+    run_prompt_id INTEGER NOT NULL UNIQUE REFERENCES run_prompts(id) ON DELETE CASCADE,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    last_error TEXT,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- compare: calling the models; judge: outputs saved, waiting for or in the judge call
+ALTER TABLE autorun_tasks ADD COLUMN IF NOT EXISTS stage TEXT NOT NULL DEFAULT 'compare';
+
+CREATE INDEX IF NOT EXISTS autorun_tasks_open_idx
+    ON autorun_tasks (job_id, id) WHERE state IN ('pending', 'running');
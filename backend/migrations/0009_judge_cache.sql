@@ -0,0 +1,14 @@
+-- Judge evaluations keyed by a hash of everything the judge sees (see services/judge_service.py)
+CREATE TABLE IF NOT EXISTS judge_cache (
+    cache_key TEXT PRIMARY KEY,
+    judge_provider TEXT NOT NULL,
+    judge_model TEXT NOT NULL,
+    judge_prompt_id TEXT,
+    result_json JSONB NOT NULL,
+    latency_ms INTEGER,
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    last_hit_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS judge_cache_created_at_idx ON judge_cache (created_at);
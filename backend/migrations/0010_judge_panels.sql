@@ -0,0 +1,4 @@
+-- A judge panel saves each judge's result plus the aggregate (judge_provider 'panel')
+-- under one panel_id
+ALTER TABLE judge_results ADD COLUMN IF NOT EXISTS panel_id TEXT;
+CREATE INDEX IF NOT EXISTS judge_results_panel_id_idx ON judge_results (panel_id) WHERE panel_id IS NOT NULL;
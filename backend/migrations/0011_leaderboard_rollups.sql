@@ -0,0 +1,209 @@
+-- Leaderboard rollups (see get_leaderboard in models.py). Triggers on run_outputs, scores
+-- and judge_results add each row as it is written and subtract it when it is deleted, so
+-- the leaderboard never scans history. Buckets are per UTC day, which keeps a time window
+-- down to a few rows per model.
+CREATE TABLE IF NOT EXISTS leaderboard_outputs_daily (
+    day DATE NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    outputs BIGINT NOT NULL DEFAULT 0,
+    errors BIGINT NOT NULL DEFAULT 0,
+    -- Successful calls that reached the provider (not cache hits); latency and throughput use these
+    timed BIGINT NOT NULL DEFAULT 0,
+    latency_ms_sum BIGINT NOT NULL DEFAULT 0,
+    completion_tokens_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, provider, model)
+);
+
+CREATE TABLE IF NOT EXISTS leaderboard_scores_daily (
+    day DATE NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    scores BIGINT NOT NULL DEFAULT 0,
+    score_sum BIGINT NOT NULL DEFAULT 0,
+    wins BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, provider, model)
+);
+
+CREATE TABLE IF NOT EXISTS leaderboard_judge_daily (
+    day DATE NOT NULL,
+    judge_prompt_id TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    evaluations BIGINT NOT NULL DEFAULT 0,
+    score_sum NUMERIC NOT NULL DEFAULT 0,
+    wins BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, judge_prompt_id, provider, model)
+);
+
+CREATE OR REPLACE FUNCTION leaderboard_add_output(rec run_outputs, sign INTEGER) RETURNS void AS $$
+DECLARE
+    timed BOOLEAN := rec.error IS NULL AND rec.latency_ms IS NOT NULL
+        AND COALESCE((rec.usage_data->'cache'->>'hits')::int, 0) = 0;
+BEGIN
+    INSERT INTO leaderboard_outputs_daily AS l
+        (day, provider, model, outputs, errors, timed, latency_ms_sum, completion_tokens_sum)
+    VALUES (
+        (COALESCE(rec.created_at, NOW()) AT TIME ZONE 'UTC')::date, rec.provider, rec.model, sign,
+        CASE WHEN rec.error IS NOT NULL THEN sign ELSE 0 END,
+        CASE WHEN timed THEN sign ELSE 0 END,
+        CASE WHEN timed THEN sign * rec.latency_ms ELSE 0 END,
+        CASE WHEN timed THEN sign * COALESCE(
+            (rec.usage_data->>'completion_tokens')::numeric, (rec.usage_data->>'output_tokens')::numeric, 0
+        )::bigint ELSE 0 END
+    )
+    ON CONFLICT (day, provider, model) DO UPDATE SET
+        outputs = l.outputs + EXCLUDED.outputs,
+        errors = l.errors + EXCLUDED.errors,
+        timed = l.timed + EXCLUDED.timed,
+        latency_ms_sum = l.latency_ms_sum + EXCLUDED.latency_ms_sum,
+        completion_tokens_sum = l.completion_tokens_sum + EXCLUDED.completion_tokens_sum;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Scores and judge evaluations name models by label ("Model A" is models_config[0], ...)
+CREATE OR REPLACE FUNCTION leaderboard_add_score(rec scores, models_config JSONB, sign INTEGER) RETURNS void AS $$
+DECLARE
+    cfg JSONB := models_config -> (array_position(ARRAY['Model A', 'Model B', 'Model C'], rec.model_label) - 1);
+BEGIN
+    IF cfg IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO leaderboard_scores_daily AS l (day, provider, model, scores, score_sum, wins)
+    VALUES (
+        (COALESCE(rec.created_at, NOW()) AT TIME ZONE 'UTC')::date, cfg->>'provider', cfg->>'model', sign,
+        sign * rec.score,
+        -- The top score is the number of models compared
+        CASE WHEN rec.score = jsonb_array_length(models_config) THEN sign ELSE 0 END
+    )
+    ON CONFLICT (day, provider, model) DO UPDATE SET
+        scores = l.scores + EXCLUDED.scores,
+        score_sum = l.score_sum + EXCLUDED.score_sum,
+        wins = l.wins + EXCLUDED.wins;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION leaderboard_add_judge_result(rec judge_results, models_config JSONB, sign INTEGER) RETURNS void AS $$
+BEGIN
+    -- A panel counts once, through its aggregate row
+    IF rec.panel_id IS NOT NULL AND rec.judge_provider <> 'panel' THEN
+        RETURN;
+    END IF;
+    IF jsonb_typeof(rec.result_json->'evaluations') IS DISTINCT FROM 'array' THEN
+        RETURN;
+    END IF;
+    INSERT INTO leaderboard_judge_daily AS l (day, judge_prompt_id, provider, model, evaluations, score_sum, wins)
+    SELECT (COALESCE(rec.created_at, NOW()) AT TIME ZONE 'UTC')::date, COALESCE(rec.judge_prompt_id, ''),
+           m.cfg->>'provider', m.cfg->>'model', sign * COUNT(*), sign * SUM((m.ev->>'score')::numeric),
+           sign * COUNT(*) FILTER (WHERE m.ev->>'model_label' = rec.result_json->>'winner')
+    FROM (
+        SELECT ev, models_config -> (array_position(ARRAY['Model A', 'Model B', 'Model C'], ev->>'model_label') - 1) AS cfg
+        FROM jsonb_array_elements(rec.result_json->'evaluations') ev
+        WHERE jsonb_typeof(ev->'score') = 'number'
+    ) m
+    WHERE m.cfg IS NOT NULL
+    GROUP BY m.cfg->>'provider', m.cfg->>'model'
+    ON CONFLICT (day, judge_prompt_id, provider, model) DO UPDATE SET
+        evaluations = l.evaluations + EXCLUDED.evaluations,
+        score_sum = l.score_sum + EXCLUDED.score_sum,
+        wins = l.wins + EXCLUDED.wins;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION prompt_models_config(p_run_prompt_id INTEGER) RETURNS JSONB AS $$
+    SELECT r.models_config FROM run_prompts rp JOIN runs r ON r.id = rp.run_id WHERE rp.id = p_run_prompt_id
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION leaderboard_outputs_changed() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM leaderboard_add_output(OLD, -1);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM leaderboard_add_output(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- When a whole run is deleted its scores and judge results are subtracted by
+-- leaderboard_run_deleted while the run still exists; the cascaded row deletes then find
+-- no run and are skipped
+CREATE OR REPLACE FUNCTION leaderboard_scores_changed() RETURNS trigger AS $$
+DECLARE
+    cfg JSONB;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        cfg := prompt_models_config(OLD.run_prompt_id);
+        IF cfg IS NOT NULL THEN
+            PERFORM leaderboard_add_score(OLD, cfg, -1);
+        END IF;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM leaderboard_add_score(NEW, prompt_models_config(NEW.run_prompt_id), 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION leaderboard_judge_results_changed() RETURNS trigger AS $$
+DECLARE
+    cfg JSONB;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        cfg := prompt_models_config(OLD.run_prompt_id);
+        IF cfg IS NOT NULL THEN
+            PERFORM leaderboard_add_judge_result(OLD, cfg, -1);
+        END IF;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM leaderboard_add_judge_result(NEW, prompt_models_config(NEW.run_prompt_id), 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION leaderboard_run_deleted() RETURNS trigger AS $$
+BEGIN
+    PERFORM leaderboard_add_score(s, OLD.models_config, -1)
+    FROM scores s JOIN run_prompts rp ON rp.id = s.run_prompt_id
+    WHERE rp.run_id = OLD.id;
+    PERFORM leaderboard_add_judge_result(j, OLD.models_config, -1)
+    FROM judge_results j JOIN run_prompts rp ON rp.id = j.run_prompt_id
+    WHERE rp.run_id = OLD.id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER run_outputs_leaderboard
+    AFTER INSERT OR UPDATE OR DELETE ON run_outputs
+    FOR EACH ROW EXECUTE FUNCTION leaderboard_outputs_changed();
+
+CREATE OR REPLACE TRIGGER scores_leaderboard
+    AFTER INSERT OR UPDATE OR DELETE ON scores
+    FOR EACH ROW EXECUTE FUNCTION leaderboard_scores_changed();
+
+CREATE OR REPLACE TRIGGER judge_results_leaderboard
+    AFTER INSERT OR UPDATE OR DELETE ON judge_results
+    FOR EACH ROW EXECUTE FUNCTION leaderboard_judge_results_changed();
+
+CREATE OR REPLACE TRIGGER runs_leaderboard
+    BEFORE DELETE ON runs
+    FOR EACH ROW EXECUTE FUNCTION leaderboard_run_deleted();
+
+-- One-time backfill of history written before the rollups existed
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM leaderboard_outputs_daily) THEN
+        PERFORM leaderboard_add_output(o, 1) FROM run_outputs o;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM leaderboard_scores_daily) THEN
+        PERFORM leaderboard_add_score(s, r.models_config, 1)
+        FROM scores s JOIN run_prompts rp ON rp.id = s.run_prompt_id JOIN runs r ON r.id = rp.run_id;
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM leaderboard_judge_daily) THEN
+        PERFORM leaderboard_add_judge_result(j, r.models_config, 1)
+        FROM judge_results j JOIN run_prompts rp ON rp.id = j.run_prompt_id JOIN runs r ON r.id = rp.run_id;
+    END IF;
+END;
+$$;
@@ -0,0 +1,33 @@
+-- Full 64-bit id (xid8) of the transaction that last wrote each row of a run's tree, for
+-- the autorun status delta cursor. Unlike xmin it does not wrap around, so cursors keep
+-- comparing correctly across xid epochs. Rows written before this migration stay NULL
+-- and are only returned by a full (cursor 0) read.
+ALTER TABLE run_prompts ADD COLUMN IF NOT EXISTS written_xid xid8;
+ALTER TABLE run_outputs ADD COLUMN IF NOT EXISTS written_xid xid8;
+ALTER TABLE scores ADD COLUMN IF NOT EXISTS written_xid xid8;
+ALTER TABLE judge_results ADD COLUMN IF NOT EXISTS written_xid xid8;
+
+ALTER TABLE run_prompts ALTER COLUMN written_xid SET DEFAULT pg_current_xact_id();
+ALTER TABLE run_outputs ALTER COLUMN written_xid SET DEFAULT pg_current_xact_id();
+ALTER TABLE scores ALTER COLUMN written_xid SET DEFAULT pg_current_xact_id();
+ALTER TABLE judge_results ALTER COLUMN written_xid SET DEFAULT pg_current_xact_id();
+
+CREATE OR REPLACE FUNCTION stamp_written_xid() RETURNS trigger AS $$
+BEGIN
+    NEW.written_xid := pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER run_prompts_written_xid
+    BEFORE UPDATE ON run_prompts
+    FOR EACH ROW EXECUTE FUNCTION stamp_written_xid();
+CREATE OR REPLACE TRIGGER run_outputs_written_xid
+    BEFORE UPDATE ON run_outputs
+    FOR EACH ROW EXECUTE FUNCTION stamp_written_xid();
+CREATE OR REPLACE TRIGGER scores_written_xid
+    BEFORE UPDATE ON scores
+    FOR EACH ROW EXECUTE FUNCTION stamp_written_xid();
+CREATE OR REPLACE TRIGGER judge_results_written_xid
+    BEFORE UPDATE ON judge_results
+    FOR EACH ROW EXECUTE FUNCTION stamp_written_xid();
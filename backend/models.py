@@ -1,70 +1,551 @@
+import atexit
+import copy
+import itertools
 import json
 import os
+import re
+import select
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from urllib.parse import urlparse, unquote
 
 import psycopg2
+import psycopg2.extensions
+import psycopg2.errors
 import psycopg2.extras
+import psycopg2.pool
 
 
-def get_db():
+def _connect_params():
     # If individual DB_* vars are set, use them directly (avoids URL special-char encoding issues)
     db_host = os.environ.get("DB_HOST")
     if db_host:
-        conn = psycopg2.connect(
-            host=db_host,
-            port=int(os.environ.get("DB_PORT", "5432")),
-            dbname=os.environ.get("DB_NAME", "postgres"),
-            user=os.environ.get("DB_USER", "postgres"),
-            password=os.environ.get("DB_PASSWORD", ""),
-            sslmode="require",
-        )
-    else:
-        url = os.environ.get("DATABASE_URL", "")
-        parsed = urlparse(url)
-        conn = psycopg2.connect(
-            host=parsed.hostname,
-            port=parsed.port or 5432,
-            dbname=parsed.path.lstrip("/"),
-            user=parsed.username,
-            password=unquote(parsed.password or ""),
-            sslmode="require",
-        )
+        return {
+            "host": db_host,
+            "port": int(os.environ.get("DB_PORT", "5432")),
+            "dbname": os.environ.get("DB_NAME", "postgres"),
+            "user": os.environ.get("DB_USER", "postgres"),
+            "password": os.environ.get("DB_PASSWORD", ""),
+            "sslmode": "require",
+        }
+    url = os.environ.get("DATABASE_URL", "")
+    parsed = urlparse(url)
+    return {
+        "host": parsed.hostname,
+        "port": parsed.port or 5432,
+        "dbname": parsed.path.lstrip("/"),
+        "user": parsed.username,
+        "password": unquote(parsed.password or ""),
+        "sslmode": "require",
+    }
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers when it was opened and last returned."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class _ConnectionPool:
+    """Thread-safe, blocking connection pool.
+
+    psycopg2's built-in pools raise when exhausted and close every connection
+    above ``minconn`` on return, so under load they reconnect constantly. This
+    pool keeps up to ``maxconn`` connections open, makes callers wait for a free
+    one, pings connections that sat idle before handing them out and recycles
+    broken or expired ones.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, max_lifetime, max_idle, ping_after, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition()
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        for _ in range(minconn):
+            self._open += 1
+            self._idle.append(self._connect())
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=_PooledConnection, **self._connect_kwargs)
+        conn.autocommit = False
+        return conn
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if now - conn.created_at > self.max_lifetime:
+            return False
+        if now - conn.last_used > self.ping_after:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                while not self._idle and self._open >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise psycopg2.pool.PoolError("timed out waiting for a database connection")
+                    self._cond.wait(remaining)
+                conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    self._open += 1
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn, close=False):
+        if not close and not conn.closed:
+            # Hand the connection back in a clean state; a failed rollback means it is broken.
+            try:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+        if close or conn.closed or self._closed:
+            self._discard(conn)
+            return
+
+        now = time.monotonic()
+        conn.last_used = now
+        expired = []
+        with self._cond:
+            self._idle.append(conn)
+            # Oldest connections sit at the front; trim the ones idle too long, keeping minconn warm.
+            while len(self._idle) > self.minconn and now - self._idle[0].last_used > self.max_idle:
+                expired.append(self._idle.pop(0))
+            self._cond.notify()
+        for old in expired:
+            self._discard(old)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _ConnectionPool(
+                    minconn=int(os.environ.get("DB_POOL_MIN", "1")),
+                    maxconn=int(os.environ.get("DB_POOL_MAX", "10")),
+                    timeout=float(os.environ.get("DB_POOL_TIMEOUT", "30")),
+                    max_lifetime=float(os.environ.get("DB_POOL_MAX_LIFETIME", "1800")),
+                    max_idle=float(os.environ.get("DB_POOL_MAX_IDLE", "300")),
+                    ping_after=float(os.environ.get("DB_POOL_PING_AFTER", "30")),
+                    **_connect_params(),
+                )
+    return _pool
+
+
+def get_db():
+    """Check a connection out of the process-wide pool. Always pair with release_db()."""
+    return _get_pool().getconn()
+
+
+def release_db(conn, discard=False):
+    """Return a connection to the pool, rolling back anything left uncommitted."""
+    _get_pool().putconn(conn, close=discard)
+
+
+@atexit.register
+def close_db_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+# --- Schema migrations ---
+# schema.sql is the baseline, version 1. Later changes are files in migrations/ named
+# NNNN_description.sql, each applied once, in order, and recorded in schema_migrations.
+# A migration runs in one transaction together with its version row, unless its first
+# line is "-- migrate: no-transaction": then its ;-terminated statements run one by one
+# in autocommit, as CREATE INDEX CONCURRENTLY requires, and must be safe to repeat in case
+# it is interrupted halfway.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+_MIGRATION_FILE = re.compile(r"^(\d+)_(\w+)\.sql$")
+_NO_TRANSACTION = "-- migrate: no-transaction"
+_CONCURRENT_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.I)
+# pg_advisory_lock key held while migrating, so workers booting together migrate once
+_MIGRATION_LOCK = 0x6C6C6D77
+
+
+def _migrations():
+    """(version, name, path) of the baseline and every migration file, in order."""
+    migrations = [(1, "baseline", os.path.join(os.path.dirname(__file__), "schema.sql"))]
+    if os.path.isdir(MIGRATIONS_DIR):
+        for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+            match = _MIGRATION_FILE.match(filename)
+            if match:
+                migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+    versions = [m[0] for m in migrations]
+    if len(set(versions)) != len(versions) or versions[0] != 1:
+        raise RuntimeError(f"Migration versions must be unique and above 1: {versions}")
+    return migrations
+
+
+def _statements(sql):
+    """Split on ; at the end of a line, except inside $$-quoted function and DO bodies."""
+    statements, current, quoted = [], [], False
+    for line in sql.splitlines():
+        current.append(line)
+        quoted ^= line.count("$$") % 2 == 1
+        if not quoted and line.rstrip().endswith(";"):
+            statements.append("\n".join(current))
+            current = []
+    statements.append("\n".join(current))
+    return [
+        statement.strip() for statement in statements
+        if any(line.strip() and not line.strip().startswith("--") for line in statement.splitlines())
+    ]
+
+
+def _apply_migration(conn, version, name, sql):
+    cur = conn.cursor()
+    if sql.startswith(_NO_TRANSACTION):
+        for statement in _statements(sql):
+            # A concurrent build that failed leaves an invalid index behind, which
+            # IF NOT EXISTS would then skip; drop it and build it again
+            index = _CONCURRENT_INDEX.search(statement)
+            if index:
+                cur.execute(
+                    """SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                       WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+                         AND NOT i.indisvalid""",
+                    (index.group(1),),
+                )
+                if cur.fetchone():
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index.group(1)}")
+            cur.execute(statement)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        return
     conn.autocommit = False
-    return conn
+    try:
+        cur.execute(sql)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
 
 
 def init_db():
+    """Apply pending migrations. Costs a single query when the schema is already current."""
+    migrations = _migrations()
     conn = get_db()
     try:
         cur = conn.cursor()
-        schema_path = os.path.join(os.path.dirname(__file__), "schema.sql")
-        with open(schema_path) as f:
-            cur.execute(f.read())
-        conn.commit()
+        try:
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {row[0] for row in cur.fetchall()}
+        except psycopg2.errors.UndefinedTable:
+            applied = set()
+    finally:
+        release_db(conn)
+    # Compared as sets so a migration merged in below the latest applied one still runs
+    if applied >= {m[0] for m in migrations}:
+        return
+
+    # A connection of its own: migrations switch autocommit, and hold a session lock
+    conn = psycopg2.connect(**_connect_params())
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s)", (_MIGRATION_LOCK,))
+        cur.execute(
+            """CREATE TABLE IF NOT EXISTS schema_migrations (
+                   version INTEGER PRIMARY KEY,
+                   name TEXT NOT NULL,
+                   applied_at TIMESTAMPTZ DEFAULT NOW()
+               )"""
+        )
+        # Another process may have migrated while we waited for the lock
+        cur.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cur.fetchall()}
+        for version, name, path in migrations:
+            if version in applied:
+                continue
+            with open(path) as f:
+                sql = f.read()
+            _apply_migration(conn, version, name, sql)
     finally:
         conn.close()
 
 
+# --- Change notifications ---
+# One dedicated LISTEN connection per process fans Postgres NOTIFY messages out to
+# in-process handlers, so caches in every worker can be invalidated by any writer.
+
+class _NotificationListener(threading.Thread):
+    def __init__(self):
+        super().__init__(name="llmwars-pg-listener", daemon=True)
+        self.connected = threading.Event()
+        self._handlers = {}
+        self._start_lock = threading.Lock()
+
+    def subscribe(self, channel, handler):
+        """Register handler(payload) for a channel. payload is None after a reconnect,
+        meaning notifications may have been missed. Subscribe at import time, before start."""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def ensure_started(self):
+        if not self.is_alive():
+            with self._start_lock:
+                if not self.is_alive() and self.ident is None:
+                    self.start()
+
+    def _dispatch(self, channel, payload):
+        for handler in self._handlers.get(channel, []):
+            try:
+                handler(payload)
+            except Exception:
+                pass
+
+    def _reset_all(self):
+        for channel in self._handlers:
+            self._dispatch(channel, None)
+
+    def run(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**_connect_params())
+                conn.autocommit = True
+                cur = conn.cursor()
+                for channel in self._handlers:
+                    cur.execute(f"LISTEN {channel}")
+                # Anything cached before LISTEN took effect may already be stale
+                self._reset_all()
+                self.connected.set()
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        self._dispatch(note.channel, note.payload)
+            except Exception:
+                self.connected.clear()
+                self._reset_all()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+_listener = _NotificationListener()
+
+
+# --- Run versions ---
+# Every write to a run's tree fires run_changed (see notify_run_changed in schema.sql).
+# Counting those per run gives a cheap token for "has this run changed?" that can be
+# answered without a query. Versions are drawn from one process-wide counter, so a run
+# that is evicted and tracked again, or re-tracked after a listener reconnect, never gets
+# a version it had before; tokens also embed a per-process boot id.
+
+_BOOT_ID = uuid.uuid4().hex[:12]
+_MAX_TRACKED_RUNS = 10000
+_run_versions = OrderedDict()
+_run_versions_lock = threading.Lock()
+_run_versions_clock = itertools.count(1)
+
+
+def _on_run_changed(payload):
+    with _run_versions_lock:
+        if payload is None:
+            _run_versions.clear()
+            return
+        try:
+            run_id = int(payload)
+        except ValueError:
+            return
+        if run_id in _run_versions:
+            _run_versions[run_id] = next(_run_versions_clock)
+
+
+_listener.subscribe("run_changed", _on_run_changed)
+
+
+# Autorun workers register here to be woken when jobs are enqueued or change state
+_jobs_changed_callbacks = []
+
+
+def _on_jobs_changed(_payload):
+    for callback in list(_jobs_changed_callbacks):
+        callback()
+
+
+_listener.subscribe("jobs_changed", _on_jobs_changed)
+
+
+def on_jobs_changed(callback):
+    """Call callback() (from the listener thread) whenever autorun jobs change in any process."""
+    _jobs_changed_callbacks.append(callback)
+    _listener.ensure_started()
+
+
+def run_version_token(run_id):
+    """Opaque token for the run's current state, or None if this process can't vouch for it.
+
+    Take the token *before* reading the run: a change that lands during the read bumps
+    the version, so the next request with this token is served fresh.
+    """
+    _listener.ensure_started()
+    if not _listener.connected.is_set():
+        return None
+    with _run_versions_lock:
+        if run_id in _run_versions:
+            _run_versions.move_to_end(run_id)
+        else:
+            _run_versions[run_id] = next(_run_versions_clock)
+            while len(_run_versions) > _MAX_TRACKED_RUNS:
+                _run_versions.popitem(last=False)
+        return f"{_BOOT_ID}.{run_id}.{_run_versions[run_id]}"
+
+
+# --- Config cache ---
+# providers and settings are read on every comparison and judge call but change rarely.
+# Entries live for CONFIG_CACHE_TTL seconds, are dropped immediately by local writes and,
+# through the config_changed channel, by writes from any other process. While the
+# listener is disconnected the cache is bypassed, so a worker never serves stale keys.
+
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+_config_cache_generation = 0
+
+
+def _config_cache_ttl():
+    return float(os.environ.get("CONFIG_CACHE_TTL", "60"))
+
+
+def invalidate_config_cache(_payload=None):
+    global _config_cache_generation
+    with _config_cache_lock:
+        _config_cache.clear()
+        _config_cache_generation += 1
+
+
+_listener.subscribe("config_changed", invalidate_config_cache)
+
+
+def on_config_changed(callback):
+    """Call callback(payload) (from the listener thread) whenever providers or settings change.
+
+    The payload is "settings", "providers" or "providers:<name>" when that provider's key or
+    endpoint changed, and None after a listener reconnect, when any of them may have changed.
+    """
+    _listener.subscribe("config_changed", callback)
+    _listener.ensure_started()
+
+
+def _cached_config(key, loader):
+    ttl = _config_cache_ttl()
+    if ttl <= 0:
+        return loader()
+    _listener.ensure_started()
+    if not _listener.connected.is_set():
+        return loader()
+
+    now = time.monotonic()
+    with _config_cache_lock:
+        entry = _config_cache.get(key)
+        generation = _config_cache_generation
+    if entry and entry[0] > now:
+        return copy.deepcopy(entry[1])
+
+    value = loader()
+    with _config_cache_lock:
+        # Skip the store if an invalidation landed while we were loading
+        if generation == _config_cache_generation:
+            _config_cache[key] = (now + ttl, value)
+    return copy.deepcopy(value)
+
+
+def _notify_config_changed(cur, what):
+    # Delivered to every listening process when the surrounding transaction commits
+    cur.execute("SELECT pg_notify('config_changed', %s)", (what,))
+
+
 # --- Providers ---
 
-def get_providers():
+def _load_providers():
     conn = get_db()
     try:
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute("SELECT id, name, display_name, api_key, endpoint, is_active, created_at, updated_at FROM providers ORDER BY id")
-        return list(cur.fetchall())
+        return [dict(row) for row in cur.fetchall()]
     finally:
-        conn.close()
+        release_db(conn)
+
+
+def get_providers():
+    return _cached_config("providers", _load_providers)
 
 
 def get_provider(name):
-    conn = get_db()
-    try:
-        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        cur.execute("SELECT * FROM providers WHERE name = %s", (name,))
-        return cur.fetchone()
-    finally:
-        conn.close()
+    return next((p for p in get_providers() if p["name"] == name), None)
 
 
 def upsert_provider(name, api_key=None, endpoint=None, is_active=None):
@@ -89,32 +570,32 @@ def upsert_provider(name, api_key=None, endpoint=None, is_active=None):
                 f"UPDATE providers SET {', '.join(updates)} WHERE name = %s",
                 values,
             )
+            credentials_changed = api_key is not None or endpoint is not None
+            _notify_config_changed(cur, f"providers:{name}" if credentials_changed else "providers")
             conn.commit()
+            invalidate_config_cache()
     finally:
-        conn.close()
+        release_db(conn)
 
 
 # --- Settings ---
 
-def get_settings():
+def _load_settings():
     conn = get_db()
     try:
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute("SELECT key, value FROM settings")
         return {row["key"]: row["value"] for row in cur.fetchall()}
     finally:
-        conn.close()
+        release_db(conn)
+
+
+def get_settings():
+    return _cached_config("settings", _load_settings)
 
 
 def get_setting(key):
-    conn = get_db()
-    try:
-        cur = conn.cursor()
-        cur.execute("SELECT value FROM settings WHERE key = %s", (key,))
-        row = cur.fetchone()
-        return row[0] if row else None
-    finally:
-        conn.close()
+    return get_settings().get(key)
 
 
 def set_setting(key, value):
@@ -125,9 +606,11 @@ def set_setting(key, value):
             "INSERT INTO settings (key, value) VALUES (%s, %s) ON CONFLICT (key) DO UPDATE SET value = %s",
             (key, value, value),
         )
+        _notify_config_changed(cur, "settings")
         conn.commit()
+        invalidate_config_cache()
     finally:
-        conn.close()
+        release_db(conn)
 
 
 # --- Runs ---
@@ -144,7 +627,7 @@ def create_run(mode, models_config, judge_enabled=False):
         conn.commit()
         return run_id
     finally:
-        conn.close()
+        release_db(conn)
 
 
 def update_run_status(run_id, status):
@@ -154,7 +637,7 @@ def update_run_status(run_id, status):
         cur.execute("UPDATE runs SET status = %s WHERE id = %s", (status, run_id))
         conn.commit()
     finally:
-        conn.close()
+        release_db(conn)
 
 
 def add_run_prompt(run_id, prompt_text, sequence_num=1):
@@ -169,7 +652,24 @@ def add_run_prompt(run_id, prompt_text, sequence_num=1):
         conn.commit()
         return prompt_id
     finally:
-        conn.close()
+        release_db(conn)
+
+
+def add_run_prompts(run_id, prompt_texts):
+    """Insert a run's prompts in one statement. Returns their ids in sequence order."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        rows = psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO run_prompts (run_id, prompt_text, sequence_num) VALUES %s RETURNING id, sequence_num",
+            [(run_id, text, i + 1) for i, text in enumerate(prompt_texts)],
+            fetch=True,
+        )
+        conn.commit()
+        return [row[0] for row in sorted(rows, key=lambda r: r[1])]
+    finally:
+        release_db(conn)
 
 
 def add_run_output(run_prompt_id, provider, model, output_text, usage_data, latency_ms, error=None):
@@ -184,7 +684,75 @@ def add_run_output(run_prompt_id, provider, model, output_text, usage_data, late
         conn.commit()
         return output_id
     finally:
-        conn.close()
+        release_db(conn)
+
+
+_OUTPUT_COLUMNS = ("run_prompt_id", "provider", "model", "output_text", "usage_data", "latency_ms", "error")
+_JUDGE_RESULT_COLUMNS = (
+    "run_prompt_id", "judge_provider", "judge_model", "judge_prompt_id", "result_json", "latency_ms", "panel_id",
+)
+
+
+def _output_values(row):
+    usage_data = row.get("usage_data")
+    return (
+        row["run_prompt_id"], row["provider"], row["model"], row.get("output_text"),
+        json.dumps(usage_data) if usage_data else None, row.get("latency_ms"), row.get("error"),
+    )
+
+
+def _judge_result_values(row):
+    return (
+        row["run_prompt_id"], row["judge_provider"], row["judge_model"], row.get("judge_prompt_id"),
+        json.dumps(row["result_json"]), row.get("latency_ms"), row.get("panel_id"),
+    )
+
+
+def _insert_many(cur, table, columns, values):
+    if not values:
+        return []
+    rows = psycopg2.extras.execute_values(
+        cur,
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s RETURNING id",
+        values,
+        page_size=max(len(values), 100),
+        fetch=True,
+    )
+    return [row[0] for row in rows]
+
+
+def add_run_outputs(outputs):
+    """Insert several outputs (dicts with add_run_output's arguments) in one statement.
+    Returns their ids in input order."""
+    return write_batch(outputs=outputs)[0]
+
+
+class CommitOutcomeUnknown(Exception):
+    """The connection failed while a COMMIT was in flight, so the rows may or may not have
+    been stored. Retrying the write could insert them twice."""
+
+
+def write_batch(outputs=(), judge_results=()):
+    """Insert outputs and judge results with multi-row INSERTs in a single transaction.
+    Returns (output_ids, judge_result_ids), each in input order. Raises CommitOutcomeUnknown
+    if the commit was sent but no answer came back; any other error means nothing was stored."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        output_ids = _insert_many(cur, "run_outputs", _OUTPUT_COLUMNS, [_output_values(r) for r in outputs])
+        judge_ids = _insert_many(
+            cur, "judge_results", _JUDGE_RESULT_COLUMNS, [_judge_result_values(r) for r in judge_results]
+        )
+        try:
+            conn.commit()
+        except psycopg2.Error as e:
+            # An error the server reported (it has a SQLSTATE) means it rolled back
+            if e.pgcode is None:
+                raise CommitOutcomeUnknown(str(e)) from e
+            raise
+        return output_ids, judge_ids
+    finally:
+        release_db(conn)
 
 
 def save_score(run_prompt_id, model_label, score, comment):
@@ -199,37 +767,67 @@ def save_score(run_prompt_id, model_label, score, comment):
         conn.commit()
         return score_id
     finally:
-        conn.close()
+        release_db(conn)
 
 
-def save_judge_result(run_prompt_id, judge_provider, judge_model, judge_prompt_id, result_json, latency_ms):
+def save_judge_result(run_prompt_id, judge_provider, judge_model, judge_prompt_id, result_json, latency_ms,
+                      panel_id=None):
     conn = get_db()
     try:
         cur = conn.cursor()
         cur.execute(
-            "INSERT INTO judge_results (run_prompt_id, judge_provider, judge_model, judge_prompt_id, result_json, latency_ms) VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
-            (run_prompt_id, judge_provider, judge_model, judge_prompt_id, json.dumps(result_json), latency_ms),
+            "INSERT INTO judge_results (run_prompt_id, judge_provider, judge_model, judge_prompt_id, result_json, latency_ms, panel_id) VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id",
+            (run_prompt_id, judge_provider, judge_model, judge_prompt_id, json.dumps(result_json), latency_ms, panel_id),
         )
         result_id = cur.fetchone()[0]
         conn.commit()
         return result_id
     finally:
-        conn.close()
+        release_db(conn)
 
 
 # --- Query runs ---
 
-def list_runs(limit=50, offset=0):
+def list_runs(filters=None, limit=50, after=None):
+    """One page of runs, newest first, with per-run summary counts.
+
+    filters: as for _run_filter_sql. after: (created_at, id) of the last run on the previous
+    page. Returns (runs, more), more being whether another page follows.
+    """
+    clauses, params = _run_filter_sql(filters or {})
+    if after is not None:
+        clauses.append("(r.created_at, r.id) < (%s, %s)")
+        params.extend(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
     conn = get_db()
     try:
         cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        # Summaries are computed for the page's runs only, after the limit
         cur.execute(
-            "SELECT id, mode, judge_enabled, models_config, status, created_at FROM runs ORDER BY created_at DESC LIMIT %s OFFSET %s",
-            (limit, offset),
+            f"""WITH page AS (
+                    SELECT r.id, r.mode, r.judge_enabled, r.models_config, r.status, r.created_at
+                    FROM runs r {where}
+                    ORDER BY r.created_at DESC, r.id DESC
+                    LIMIT %s
+                )
+                SELECT page.*, p.prompt_count, o.error_count, o.avg_latency_ms
+                FROM page
+                CROSS JOIN LATERAL (
+                    SELECT COUNT(*) AS prompt_count FROM run_prompts rp WHERE rp.run_id = page.id
+                ) p
+                CROSS JOIN LATERAL (
+                    SELECT COUNT(ro.error) AS error_count,
+                           ROUND(AVG(ro.latency_ms) FILTER (WHERE ro.error IS NULL))::int AS avg_latency_ms
+                    FROM run_prompts rp JOIN run_outputs ro ON ro.run_prompt_id = rp.id
+                    WHERE rp.run_id = page.id
+                ) o
+                ORDER BY page.created_at DESC, page.id DESC""",
+            params + [limit + 1],
         )
-        return list(cur.fetchall())
+        rows = list(cur.fetchall())
+        return rows[:limit], len(rows) > limit
     finally:
-        conn.close()
+        release_db(conn)
 
 
 def get_run(run_id):
@@ -243,21 +841,365 @@ def get_run(run_id):
 
         cur.execute("SELECT * FROM run_prompts WHERE run_id = %s ORDER BY sequence_num", (run_id,))
         prompts = list(cur.fetchall())
-
+        by_id = {}
         for prompt in prompts:
-            cur.execute("SELECT * FROM run_outputs WHERE run_prompt_id = %s ORDER BY id", (prompt["id"],))
-            prompt["outputs"] = list(cur.fetchall())
+            prompt.pop("written_xid", None)
+            prompt["outputs"] = []
+            prompt["scores"] = []
+            prompt["judge_results"] = []
+            by_id[prompt["id"]] = prompt
 
-            cur.execute("SELECT * FROM scores WHERE run_prompt_id = %s ORDER BY id", (prompt["id"],))
-            prompt["scores"] = list(cur.fetchall())
-
-            cur.execute("SELECT * FROM judge_results WHERE run_prompt_id = %s ORDER BY id", (prompt["id"],))
-            prompt["judge_results"] = list(cur.fetchall())
+        # One query per child table for the whole run instead of three per prompt
+        for table, key in (("run_outputs", "outputs"), ("scores", "scores"), ("judge_results", "judge_results")):
+            cur.execute(
+                f"""SELECT c.* FROM {table} c
+                    JOIN run_prompts rp ON rp.id = c.run_prompt_id
+                    WHERE rp.run_id = %s ORDER BY c.id""",
+                (run_id,),
+            )
+            for row in cur.fetchall():
+                row.pop("written_xid", None)
+                by_id[row["run_prompt_id"]][key].append(row)
 
         run["prompts"] = prompts
         return run
     finally:
-        conn.close()
+        release_db(conn)
+
+
+def get_run_header(run_id):
+    """The runs row alone, without its prompt tree."""
+    conn = get_db()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            "SELECT id, mode, judge_enabled, models_config, status, created_at FROM runs WHERE id = %s",
+            (run_id,),
+        )
+        return cur.fetchone()
+    finally:
+        release_db(conn)
+
+
+# One row per prompt with its outputs and scores aggregated alongside, plus the first judge result
+_EXPORT_PROMPT_COLUMNS = """
+    rp.id, rp.run_id, rp.sequence_num, rp.prompt_text,
+    (SELECT COALESCE(json_agg(json_build_object(
+                'provider', o.provider, 'model', o.model, 'output_text', o.output_text,
+                'latency_ms', o.latency_ms, 'error', o.error, 'usage_data', o.usage_data
+            ) ORDER BY o.id), '[]')
+     FROM run_outputs o WHERE o.run_prompt_id = rp.id) AS outputs,
+    (SELECT COALESCE(json_agg(json_build_object(
+                'model_label', s.model_label, 'score', s.score, 'comment', s.comment
+            ) ORDER BY s.id), '[]')
+     FROM scores s WHERE s.run_prompt_id = rp.id) AS scores,
+    (SELECT j.result_json FROM judge_results j WHERE j.run_prompt_id = rp.id ORDER BY j.id LIMIT 1) AS judge_result
+"""
+
+
+def iter_run_export_prompts(run_id, itersize=200):
+    """Stream a run's prompts (see _EXPORT_PROMPT_COLUMNS) through a named server-side cursor,
+    so memory stays flat however large the run is. Holds a pooled connection until exhausted
+    or closed."""
+    conn = get_db()
+    try:
+        cur = conn.cursor(name=f"export_run_{uuid.uuid4().hex}", cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.itersize = itersize
+        cur.execute(
+            f"SELECT {_EXPORT_PROMPT_COLUMNS} FROM run_prompts rp WHERE rp.run_id = %s ORDER BY rp.sequence_num",
+            (run_id,),
+        )
+        for row in cur:
+            yield row
+        cur.close()
+    finally:
+        release_db(conn)
+
+
+def _run_filter_sql(filters):
+    """WHERE-clause fragments (ANDed) and params for run filters on alias r.
+
+    Supported keys: date_from, date_to, provider, model, mode, status, judge_enabled.
+    """
+    clauses = []
+    params = []
+    if filters.get("date_from"):
+        clauses.append("r.created_at >= %s")
+        params.append(filters["date_from"])
+    if filters.get("date_to"):
+        clauses.append("r.created_at < %s")
+        params.append(filters["date_to"])
+    model_match = {k: filters[k] for k in ("provider", "model") if filters.get(k)}
+    if model_match:
+        # Containment on the JSONB array: some entry has this provider and/or model
+        clauses.append("r.models_config @> %s::jsonb")
+        params.append(json.dumps([model_match]))
+    for key in ("mode", "status"):
+        if filters.get(key):
+            clauses.append(f"r.{key} = %s")
+            params.append(filters[key])
+    if filters.get("judge_enabled") is not None:
+        clauses.append("r.judge_enabled = %s")
+        params.append(filters["judge_enabled"])
+    return clauses, params
+
+
+def get_leaderboard(filters):
+    """Per provider/model aggregates from the leaderboard rollups.
+
+    filters: date_from / date_to (dates; from inclusive, to exclusive, whole UTC days),
+    judge_prompt_id (judge columns only count that template) and provider.
+    """
+    day_clauses = []
+    day_params = []
+    if filters.get("date_from"):
+        day_clauses.append("day >= %s")
+        day_params.append(filters["date_from"])
+    if filters.get("date_to"):
+        day_clauses.append("day < %s")
+        day_params.append(filters["date_to"])
+    if filters.get("provider"):
+        day_clauses.append("provider = %s")
+        day_params.append(filters["provider"])
+    judge_clauses = list(day_clauses)
+    judge_params = list(day_params)
+    if filters.get("judge_prompt_id"):
+        judge_clauses.append("judge_prompt_id = %s")
+        judge_params.append(filters["judge_prompt_id"])
+    where = f"WHERE {' AND '.join(day_clauses)}" if day_clauses else ""
+    judge_where = f"WHERE {' AND '.join(judge_clauses)}" if judge_clauses else ""
+    conn = get_db()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            f"""WITH o AS (
+                    SELECT provider, model, SUM(outputs) AS outputs, SUM(errors) AS errors, SUM(timed) AS timed,
+                           SUM(latency_ms_sum) AS latency_ms_sum, SUM(completion_tokens_sum) AS tokens
+                    FROM leaderboard_outputs_daily {where} GROUP BY provider, model
+                ), s AS (
+                    SELECT provider, model, SUM(scores) AS scores, SUM(score_sum) AS score_sum, SUM(wins) AS wins
+                    FROM leaderboard_scores_daily {where} GROUP BY provider, model
+                ), j AS (
+                    SELECT provider, model, SUM(evaluations) AS evaluations, SUM(score_sum) AS score_sum,
+                           SUM(wins) AS wins
+                    FROM leaderboard_judge_daily {judge_where} GROUP BY provider, model
+                )
+                SELECT provider, model,
+                       COALESCE(o.outputs, 0)::bigint AS outputs,
+                       COALESCE(o.errors, 0)::bigint AS errors,
+                       (o.latency_ms_sum::float8 / NULLIF(o.timed, 0)) AS mean_latency_ms,
+                       (o.tokens * 1000.0 / NULLIF(o.latency_ms_sum, 0))::float8 AS tokens_per_second,
+                       COALESCE(s.scores, 0)::bigint AS user_scores,
+                       (s.score_sum::float8 / NULLIF(s.scores, 0)) AS mean_user_score,
+                       (s.wins::float8 / NULLIF(s.scores, 0)) AS user_win_rate,
+                       COALESCE(j.evaluations, 0)::bigint AS judge_evaluations,
+                       (j.score_sum::float8 / NULLIF(j.evaluations, 0)) AS mean_judge_score,
+                       (j.wins::float8 / NULLIF(j.evaluations, 0)) AS judge_win_rate
+                FROM o FULL JOIN s USING (provider, model) FULL JOIN j USING (provider, model)
+                WHERE COALESCE(o.outputs, 0) + COALESCE(s.scores, 0) + COALESCE(j.evaluations, 0) > 0
+                ORDER BY judge_win_rate DESC NULLS LAST, user_win_rate DESC NULLS LAST, outputs DESC""",
+            day_params + day_params + judge_params,
+        )
+        return list(cur.fetchall())
+    finally:
+        release_db(conn)
+
+
+def get_rating_watermarks():
+    """Highest visible scores and judge_results ids, with the xmin and xmax of the snapshot
+    they were read in.
+
+    Rows with lower ids may still be committed by transactions that were running then
+    (ids are allocated before commit), so these ids only become safe watermarks once a
+    later snapshot's xmin has reached this one's xmax.
+    """
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT (SELECT COALESCE(MAX(id), 0) FROM scores), (SELECT COALESCE(MAX(id), 0) FROM judge_results),
+                   pg_snapshot_xmin(pg_current_snapshot())::text::bigint,
+                   pg_snapshot_xmax(pg_current_snapshot())::text::bigint"""
+        )
+        return cur.fetchone()
+    finally:
+        release_db(conn)
+
+
+def get_committed_rating_watermarks():
+    """Highest scores and judge_results ids written by transactions that had already ended
+    when the oldest transaction still running began (rows from before written_xid existed
+    count as ended). Safe to load up to without waiting for a later snapshot, bar a row
+    whose id was allocated before such an id and whose transaction is still open."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT COALESCE((SELECT id FROM scores
+                                WHERE written_xid IS NULL OR written_xid < pg_snapshot_xmin(pg_current_snapshot())
+                                ORDER BY id DESC LIMIT 1), 0),
+                      COALESCE((SELECT id FROM judge_results
+                                WHERE written_xid IS NULL OR written_xid < pg_snapshot_xmin(pg_current_snapshot())
+                                ORDER BY id DESC LIMIT 1), 0)"""
+        )
+        return cur.fetchone()
+    finally:
+        release_db(conn)
+
+
+# Each scored row (a user score, or one model's evaluation in a judge result) with the
+# model its label refers to
+_LABEL_CFG = "r.models_config -> (array_position(ARRAY['Model A', 'Model B', 'Model C'], {label}) - 1)"
+
+_RATING_SCORE_ROWS = f"""
+    SELECT s.id, s.run_prompt_id AS grp, s.score::numeric AS score,
+           {_LABEL_CFG.format(label="s.model_label")} ->> 'provider' AS provider,
+           {_LABEL_CFG.format(label="s.model_label")} ->> 'model' AS model
+    FROM scores s JOIN run_prompts rp ON rp.id = s.run_prompt_id JOIN runs r ON r.id = rp.run_id
+    WHERE s.id <= %(score_hi)s
+      AND s.run_prompt_id IN (SELECT run_prompt_id FROM scores WHERE id > %(score_lo)s AND id <= %(score_hi)s)
+"""
+
+_RATING_JUDGE_ROWS = f"""
+    SELECT j.id, j.id AS grp, (ev->>'score')::numeric AS score,
+           {_LABEL_CFG.format(label="ev->>'model_label'")} ->> 'provider' AS provider,
+           {_LABEL_CFG.format(label="ev->>'model_label'")} ->> 'model' AS model
+    FROM judge_results j
+    JOIN run_prompts rp ON rp.id = j.run_prompt_id
+    JOIN runs r ON r.id = rp.run_id
+    CROSS JOIN LATERAL jsonb_array_elements(
+        CASE WHEN jsonb_typeof(j.result_json->'evaluations') = 'array' THEN j.result_json->'evaluations' ELSE '[]' END
+    ) ev
+    WHERE j.id > %(judge_lo)s AND j.id <= %(judge_hi)s
+      -- A panel counts once, through its aggregate row
+      AND (j.panel_id IS NULL OR j.judge_provider = 'panel')
+      AND (%(judge_prompt_id)s::text IS NULL OR j.judge_prompt_id = %(judge_prompt_id)s)
+      AND jsonb_typeof(ev->'score') = 'number'
+"""
+
+_RATING_PAIRS = """
+    SELECT a.provider AS a_provider, a.model AS a_model, b.provider AS b_provider, b.model AS b_model,
+           a.score AS a_score, b.score AS b_score
+    FROM {rows} a
+    JOIN {rows} b ON b.grp = a.grp AND (a.provider, a.model) < (b.provider, b.model)
+    -- A pair is counted once, in the window holding the later of its two rows
+    WHERE GREATEST(a.id, b.id) > %({lo})s
+"""
+
+
+def get_pairwise_counts(sources, judge_prompt_id, since, until):
+    """Pairwise outcomes between models, aggregated per model pair.
+
+    Every prompt's user scores and every judge evaluation (for judge_prompt_id, if given)
+    compare each pair of models in it once. sources is a subset of ("user", "judge");
+    since and until are (scores id, judge_results id) watermarks, so comparisons added in
+    between can be folded into counts loaded earlier. Returns rows of a_provider, a_model,
+    b_provider, b_model, a_wins, b_wins and ties.
+    """
+    parts = []
+    if "user" in sources:
+        parts.append(_RATING_PAIRS.format(rows="score_rows", lo="score_lo"))
+    if "judge" in sources:
+        parts.append(_RATING_PAIRS.format(rows="judge_rows", lo="judge_lo"))
+    if not parts:
+        return []
+    conn = get_db()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            f"""WITH score_rows AS MATERIALIZED ({_RATING_SCORE_ROWS}),
+                     judge_rows AS MATERIALIZED ({_RATING_JUDGE_ROWS}),
+                     pairs AS ({' UNION ALL '.join(parts)})
+                SELECT a_provider, a_model, b_provider, b_model,
+                       COUNT(*) FILTER (WHERE a_score > b_score) AS a_wins,
+                       COUNT(*) FILTER (WHERE a_score < b_score) AS b_wins,
+                       COUNT(*) FILTER (WHERE a_score = b_score) AS ties
+                FROM pairs
+                WHERE a_provider IS NOT NULL AND b_provider IS NOT NULL
+                GROUP BY a_provider, a_model, b_provider, b_model""",
+            {
+                "score_lo": since[0],
+                "score_hi": until[0],
+                "judge_lo": since[1],
+                "judge_hi": until[1],
+                "judge_prompt_id": judge_prompt_id,
+            },
+        )
+        return list(cur.fetchall())
+    finally:
+        release_db(conn)
+
+
+def iter_export_prompts(filters, itersize=500):
+    """Stream every prompt of every run matching filters, ordered by run then sequence,
+    in a single pass over a named server-side cursor. Rows carry the run's fields
+    (run_mode, judge_enabled, models_config, run_created_at) next to the prompt's."""
+    clauses, params = _run_filter_sql(filters)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    conn = get_db()
+    try:
+        cur = conn.cursor(name=f"export_runs_{uuid.uuid4().hex}", cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.itersize = itersize
+        cur.execute(
+            f"""SELECT r.mode AS run_mode, r.judge_enabled, r.models_config, r.created_at AS run_created_at,
+                       {_EXPORT_PROMPT_COLUMNS}
+                FROM runs r JOIN run_prompts rp ON rp.run_id = r.id
+                {where}
+                ORDER BY r.id, rp.sequence_num""",
+            params,
+        )
+        for row in cur:
+            yield row
+        cur.close()
+    finally:
+        release_db(conn)
+
+
+def get_run_status_delta(run_id, since=None):
+    """Status counters plus the rows of a run that changed since a cursor, in one query.
+
+    The cursor is the full (xid8) id of the oldest transaction still running when the
+    previous delta was read; rows carry the id of the transaction that last wrote them in
+    written_xid. Any row written by a transaction at or after the cursor is returned again,
+    so rows committed out of id order are never skipped; callers dedupe by id. Deleted rows
+    are not returned; instead a prompt whose outputs_cleared or judge_results_cleared
+    counter moved comes back, and callers drop the rows of that kind they hold for it. Pass
+    since=None (or 0) to get every row. completed counts the prompts the autorun queue has
+    finished (judged, when the run is judged), or for runs without a queue job the prompts
+    with outputs. Returns None if the run does not exist.
+    """
+    conn = get_db()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            """WITH p AS (
+                   SELECT * FROM run_prompts WHERE run_id = %(run_id)s
+               )
+               SELECT r.status,
+                   (SELECT COUNT(*) FROM p) AS total,
+                   CASE WHEN aj.id IS NULL
+                       THEN (SELECT COUNT(DISTINCT o.run_prompt_id) FROM run_outputs o JOIN p ON p.id = o.run_prompt_id)
+                       ELSE (SELECT COUNT(*) FROM autorun_tasks t WHERE t.job_id = aj.id AND t.state = 'done')
+                   END AS completed,
+                   pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS cursor,
+                   (SELECT COALESCE(json_agg(to_jsonb(p) - 'written_xid' ORDER BY p.sequence_num), '[]')
+                    FROM p WHERE %(since)s = 0 OR p.written_xid >= %(since)s::text::xid8) AS prompts,
+                   (SELECT COALESCE(json_agg(to_jsonb(o) - 'written_xid' ORDER BY o.id), '[]')
+                    FROM run_outputs o JOIN p ON p.id = o.run_prompt_id
+                    WHERE %(since)s = 0 OR o.written_xid >= %(since)s::text::xid8) AS outputs,
+                   (SELECT COALESCE(json_agg(to_jsonb(s) - 'written_xid' ORDER BY s.id), '[]')
+                    FROM scores s JOIN p ON p.id = s.run_prompt_id
+                    WHERE %(since)s = 0 OR s.written_xid >= %(since)s::text::xid8) AS scores,
+                   (SELECT COALESCE(json_agg(to_jsonb(j) - 'written_xid' ORDER BY j.id), '[]')
+                    FROM judge_results j JOIN p ON p.id = j.run_prompt_id
+                    WHERE %(since)s = 0 OR j.written_xid >= %(since)s::text::xid8) AS judge_results
+               FROM runs r LEFT JOIN autorun_jobs aj ON aj.run_id = r.id
+               WHERE r.id = %(run_id)s""",
+            {"run_id": run_id, "since": max(since or 0, 0)},
+        )
+        return cur.fetchone()
+    finally:
+        release_db(conn)
 
 
 def delete_run(run_id):
@@ -268,7 +1210,7 @@ def delete_run(run_id):
         conn.commit()
         return cur.rowcount > 0
     finally:
-        conn.close()
+        release_db(conn)
 
 
 def get_run_prompts_count(run_id):
@@ -278,7 +1220,7 @@ def get_run_prompts_count(run_id):
         cur.execute("SELECT COUNT(*) FROM run_prompts WHERE run_id = %s", (run_id,))
         return cur.fetchone()[0]
     finally:
-        conn.close()
+        release_db(conn)
 
 
 def get_completed_prompts_count(run_id):
@@ -293,4 +1235,595 @@ def get_completed_prompts_count(run_id):
         )
         return cur.fetchone()[0]
     finally:
-        conn.close()
+        release_db(conn)
+
+
+# --- Search ---
+# Word search matches the tsvectors in run_prompts_search and run_outputs_search (see
+# migrations/0004_search.sql) and ranks hits with ts_rank. A term found in most of the
+# history would mean ranking most of it, so only the SEARCH_RANK_CANDIDATES newest
+# matches of each table are ranked, and the search reports itself truncated; rarer
+# terms rank all their matches. Substring
+# search is an ILIKE served by trigram indexes; its hits rank equally, newest first.
+# Snippets are cut only for the hits on the returned page, with each match wrapped in
+# SNIPPET_START and SNIPPET_END.
+
+SEARCH_MATCHES = ("words", "substring")
+SEARCH_SCOPES = ("all", "prompts", "outputs")
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+_HEADLINE_OPTIONS = (
+    f"StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, "
+    'MinWords=15, MaxWords=35, MaxFragments=2, FragmentDelimiter=" … "'
+)
+# Written out in each query rather than computed once in a CTE: it folds to a constant,
+# so the planner sees the actual terms and can tell common ones from rare ones
+_TSQUERY = "websearch_to_tsquery('english', %(q)s)"
+# Characters of context either side of a substring match
+_SNIPPET_CONTEXT = 80
+SEARCH_RANK_CANDIDATES = int(os.environ.get("SEARCH_RANK_CANDIDATES", "20000"))
+
+
+def _like_pattern(text):
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _filter_sql(alias, keys):
+    return "".join(f" AND {alias}.{key} = %({key})s" for key in keys)
+
+
+def _ranked_matches(kind, table, key, filters=""):
+    """Word-search hits in one search table. The newest matches are taken first, so for a
+    common term only SEARCH_RANK_CANDIDATES rows are read and ranked; one more is read to
+    tell whether any were left out, which every hit then carries as truncated."""
+    return f"""SELECT '{kind}' AS kind, c.id, ts_rank(c.document, {_TSQUERY}) AS rank,
+                      c.matches > %(candidates)s AS truncated
+               FROM (
+                   SELECT m.*, row_number() OVER (ORDER BY m.id DESC) AS n, COUNT(*) OVER () AS matches FROM (
+                       SELECT s.{key} AS id, s.document FROM {table} s
+                       WHERE s.document @@ {_TSQUERY}{filters}
+                       ORDER BY s.{key} DESC LIMIT %(candidates)s + 1
+                   ) m
+               ) c
+               WHERE c.n <= %(candidates)s"""
+
+
+def search_runs(query, match="words", scope="all", provider=None, model=None, limit=20, after=None):
+    """One page of prompts and outputs matching query, best match first.
+
+    match: "words" (web search syntax: "quoted phrases", or, -excluded) or "substring".
+    scope: "all", "prompts" or "outputs"; provider and model limit the search to those
+    outputs. after: (rank, kind, id) of the last hit on the previous page.
+    Returns (hits, more, truncated): more is whether another page follows, truncated
+    whether a word search matched more than SEARCH_RANK_CANDIDATES rows of a table and
+    left the older ones out.
+    """
+    params = {
+        "q": query,
+        "limit": limit + 1,
+        "candidates": SEARCH_RANK_CANDIDATES,
+        "headline": _HEADLINE_OPTIONS,
+        "start": SNIPPET_START,
+        "end": SNIPPET_END,
+    }
+    output_filters = [key for key, value in (("provider", provider), ("model", model)) if value]
+    params.update(provider=provider, model=model)
+    search_prompts = scope in ("all", "prompts") and not output_filters
+    search_outputs = scope in ("all", "outputs")
+
+    searches = []
+    if match == "words":
+        if search_prompts:
+            searches.append(_ranked_matches("prompt", "run_prompts_search", "run_prompt_id"))
+        if search_outputs:
+            searches.append(_ranked_matches(
+                "output", "run_outputs_search", "run_output_id", _filter_sql("s", output_filters),
+            ))
+        snippet = f"ts_headline('english', b.body, {_TSQUERY}, %(headline)s)"
+        snippet_join = ""
+        # Word-search hits are bounded by the candidate windows, so a second pass is cheap
+        truncated = "(SELECT COALESCE(bool_or(truncated), false) FROM hits)"
+    else:
+        params["pattern"] = _like_pattern(query)
+        if search_prompts:
+            searches.append(
+                """SELECT 'prompt' AS kind, rp.id, 0::real AS rank, false AS truncated
+                   FROM run_prompts rp WHERE rp.prompt_text ILIKE %(pattern)s"""
+            )
+        if search_outputs:
+            searches.append(
+                f"""SELECT 'output' AS kind, ro.id, 0::real AS rank, false AS truncated
+                    FROM run_outputs ro WHERE ro.output_text ILIKE %(pattern)s{_filter_sql("ro", output_filters)}"""
+            )
+        # The first match with _SNIPPET_CONTEXT characters either side
+        snippet = f"""CASE WHEN m.pos = 0 THEN left(b.body, {2 * _SNIPPET_CONTEXT}) ELSE concat(
+                          CASE WHEN m.pos > {_SNIPPET_CONTEXT + 1} THEN '…' END,
+                          substr(b.body, GREATEST(m.pos - {_SNIPPET_CONTEXT}, 1), LEAST(m.pos - 1, {_SNIPPET_CONTEXT})),
+                          %(start)s, substr(b.body, m.pos, length(%(q)s)), %(end)s,
+                          substr(b.body, m.pos + length(%(q)s), {_SNIPPET_CONTEXT}),
+                          CASE WHEN m.pos + length(%(q)s) + {_SNIPPET_CONTEXT} <= length(b.body) THEN '…' END
+                      ) END"""
+        snippet_join = "CROSS JOIN LATERAL (SELECT strpos(lower(b.body), lower(%(q)s)) AS pos) m"
+        truncated = "false"
+    if not searches:
+        return [], False, False
+
+    keyset = ""
+    if after is not None:
+        # Ranks are real; compare as real so a rank read back from a cursor matches exactly
+        keyset = "WHERE (rank, kind, id) < (%(after_rank)s::real, %(after_kind)s, %(after_id)s)"
+        params.update(after_rank=after[0], after_kind=after[1], after_id=after[2])
+    conn = get_db()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            f"""WITH hits AS ({" UNION ALL ".join(searches)}),
+                page AS (
+                    SELECT * FROM hits {keyset}
+                    ORDER BY rank DESC, kind DESC, id DESC
+                    LIMIT %(limit)s
+                )
+                SELECT page.kind, page.rank, rp.run_id, rp.id AS run_prompt_id, rp.sequence_num,
+                       ro.id AS output_id, ro.provider, ro.model,
+                       COALESCE(ro.created_at, rp.created_at) AS created_at,
+                       {snippet} AS snippet, {truncated} AS truncated
+                FROM page
+                LEFT JOIN run_outputs ro ON page.kind = 'output' AND ro.id = page.id
+                JOIN run_prompts rp ON rp.id = CASE WHEN page.kind = 'output' THEN ro.run_prompt_id ELSE page.id END
+                CROSS JOIN LATERAL (
+                    SELECT CASE WHEN page.kind = 'output' THEN ro.output_text ELSE rp.prompt_text END AS body
+                ) b
+                {snippet_join}
+                ORDER BY page.rank DESC, page.kind DESC, page.id DESC""",
+            params,
+        )
+        rows = list(cur.fetchall())
+        # Every row carries the same flag
+        truncated = bool(rows) and rows[0]["truncated"]
+        for row in rows:
+            del row["truncated"]
+        return rows[:limit], len(rows) > limit, truncated
+    finally:
+        release_db(conn)
+
+
+# --- LLM response cache ---
+
+def get_llm_cache_entry(cache_key, ttl_seconds):
+    """Return (response, seconds until it expires) and record the hit, or None if missing or expired."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE llm_cache SET hit_count = hit_count + 1, last_hit_at = NOW()
+               WHERE cache_key = %s AND created_at > NOW() - make_interval(secs => %s)
+               RETURNING response,
+                   EXTRACT(EPOCH FROM created_at + make_interval(secs => %s) - NOW())::float8""",
+            (cache_key, ttl_seconds, ttl_seconds),
+        )
+        row = cur.fetchone()
+        conn.commit()
+        return (row[0], row[1]) if row else None
+    finally:
+        release_db(conn)
+
+
+def put_llm_cache_entry(cache_key, provider, model, response):
+    payload = json.dumps(response)
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO llm_cache (cache_key, provider, model, response, size_bytes) VALUES (%s, %s, %s, %s, %s)
+               ON CONFLICT (cache_key) DO UPDATE SET response = EXCLUDED.response, size_bytes = EXCLUDED.size_bytes,
+                   created_at = NOW(), last_hit_at = NOW()""",
+            (cache_key, provider, model, payload, len(payload)),
+        )
+        conn.commit()
+    finally:
+        release_db(conn)
+
+
+def prune_llm_cache(ttl_seconds, max_bytes):
+    """Delete expired entries, then least recently hit ones until the table fits in max_bytes."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM llm_cache WHERE created_at <= NOW() - make_interval(secs => %s)", (ttl_seconds,))
+        deleted = cur.rowcount
+        cur.execute(
+            """DELETE FROM llm_cache WHERE cache_key IN (
+                   SELECT cache_key FROM (
+                       SELECT cache_key, SUM(size_bytes) OVER (ORDER BY last_hit_at DESC, cache_key) AS running
+                       FROM llm_cache
+                   ) ranked WHERE running > %s
+               )""",
+            (max_bytes,),
+        )
+        deleted += cur.rowcount
+        conn.commit()
+        return deleted
+    finally:
+        release_db(conn)
+
+
+# --- Judge cache ---
+
+def get_judge_cache_entry(cache_key, ttl_seconds):
+    """Return a cached evaluation as {"result_json", "latency_ms"} (and record the hit), or None."""
+    conn = get_db()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            """UPDATE judge_cache SET hit_count = hit_count + 1, last_hit_at = NOW()
+               WHERE cache_key = %s AND created_at > NOW() - make_interval(secs => %s)
+               RETURNING result_json, latency_ms""",
+            (cache_key, ttl_seconds),
+        )
+        row = cur.fetchone()
+        conn.commit()
+        return row
+    finally:
+        release_db(conn)
+
+
+def put_judge_cache_entry(cache_key, judge_provider, judge_model, judge_prompt_id, result_json, latency_ms):
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO judge_cache (cache_key, judge_provider, judge_model, judge_prompt_id, result_json, latency_ms)
+               VALUES (%s, %s, %s, %s, %s, %s)
+               ON CONFLICT (cache_key) DO UPDATE SET result_json = EXCLUDED.result_json,
+                   latency_ms = EXCLUDED.latency_ms, created_at = NOW(), last_hit_at = NOW()""",
+            (cache_key, judge_provider, judge_model, judge_prompt_id, json.dumps(result_json), latency_ms),
+        )
+        conn.commit()
+    finally:
+        release_db(conn)
+
+
+def prune_judge_cache(ttl_seconds):
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM judge_cache WHERE created_at <= NOW() - make_interval(secs => %s)", (ttl_seconds,))
+        conn.commit()
+        return cur.rowcount
+    finally:
+        release_db(conn)
+
+
+# --- Autorun jobs ---
+# Task claims use FOR UPDATE SKIP LOCKED so any number of workers can share the queue.
+# Every update of a running task is fenced on worker_id: a worker that lost its lease
+# can't complete or fail a task someone else has since claimed.
+
+def enqueue_autorun(run_id, prompt_texts, params):
+    """Create a run's prompts, its job and one pending task per prompt in one transaction."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        rows = psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO run_prompts (run_id, prompt_text, sequence_num) VALUES %s RETURNING id, sequence_num",
+            [(run_id, text, i + 1) for i, text in enumerate(prompt_texts)],
+            fetch=True,
+        )
+        run_prompt_ids = [row[0] for row in sorted(rows, key=lambda r: r[1])]
+        cur.execute(
+            "INSERT INTO autorun_jobs (run_id, params) VALUES (%s, %s) RETURNING id",
+            (run_id, json.dumps(params)),
+        )
+        job_id = cur.fetchone()[0]
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO autorun_tasks (job_id, run_prompt_id) VALUES %s",
+            [(job_id, run_prompt_id) for run_prompt_id in run_prompt_ids],
+        )
+        cur.execute("SELECT pg_notify('jobs_changed', %s)", (str(run_id),))
+        conn.commit()
+        return run_prompt_ids
+    finally:
+        release_db(conn)
+
+
+def _finalize_job(cur, job_id):
+    """Mark an active job done once it has no open tasks, and set its run's final status.
+    The job row must already be locked by the caller's transaction."""
+    cur.execute(
+        """UPDATE autorun_jobs j SET state = 'done', updated_at = NOW()
+           WHERE j.id = %s AND j.state = 'active'
+             AND NOT EXISTS (SELECT 1 FROM autorun_tasks t WHERE t.job_id = j.id AND t.state IN ('pending', 'running'))
+           RETURNING j.run_id""",
+        (job_id,),
+    )
+    row = cur.fetchone()
+    if row:
+        cur.execute(
+            """UPDATE runs SET status = CASE
+                   WHEN EXISTS (SELECT 1 FROM autorun_tasks WHERE job_id = %s AND state = 'failed') THEN 'failed'
+                   ELSE 'completed' END
+               WHERE id = %s""",
+            (job_id, row[0]),
+        )
+
+
+def claim_autorun_tasks(worker_id, limit, lease_seconds, per_job_limit, max_attempts):
+    """Claim up to limit runnable tasks (pending, or running with an expired lease) of active jobs,
+    oldest job first, keeping at most per_job_limit tasks of one job in the compare stage."""
+    conn = get_db()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute(
+            """WITH claimed AS (
+                   UPDATE autorun_tasks t
+                   SET state = 'running', worker_id = %(worker)s, attempts = t.attempts + 1,
+                       lease_expires_at = NOW() + make_interval(secs => %(lease)s),
+                       heartbeat_at = NOW(), updated_at = NOW()
+                   WHERE t.id IN (
+                       -- Rank candidates per job so one claim never exceeds a job's free slots;
+                       -- the outer state check re-applies after the row lock is taken
+                       SELECT c.id FROM autorun_tasks c
+                       WHERE c.id IN (
+                           SELECT ranked.id FROM (
+                               SELECT o.id,
+                                      ROW_NUMBER() OVER (PARTITION BY o.job_id ORDER BY o.id) AS n,
+                                      (SELECT COUNT(*) FROM autorun_tasks r
+                                       WHERE r.job_id = o.job_id AND r.state = 'running'
+                                         AND r.stage = 'compare' AND r.lease_expires_at >= NOW()) AS busy
+                               FROM autorun_tasks o JOIN autorun_jobs j ON j.id = o.job_id
+                               WHERE j.state = 'active'
+                                 AND o.attempts < %(max_attempts)s
+                                 AND (o.state = 'pending' OR (o.state = 'running' AND o.lease_expires_at < NOW()))
+                           ) ranked
+                           WHERE ranked.n + ranked.busy <= %(per_job)s
+                       )
+                         AND (c.state = 'pending' OR (c.state = 'running' AND c.lease_expires_at < NOW()))
+                       ORDER BY c.job_id, c.id
+                       LIMIT %(limit)s
+                       FOR UPDATE OF c SKIP LOCKED
+                   )
+                   RETURNING t.id, t.job_id, t.run_prompt_id, t.attempts, t.stage
+               )
+               SELECT c.id, c.job_id, c.run_prompt_id, c.attempts, c.stage, j.run_id, j.params,
+                      r.models_config, r.judge_enabled, rp.prompt_text
+               FROM claimed c
+               JOIN autorun_jobs j ON j.id = c.job_id
+               JOIN runs r ON r.id = j.run_id
+               JOIN run_prompts rp ON rp.id = c.run_prompt_id
+               ORDER BY c.job_id, c.id""",
+            {
+                "worker": worker_id,
+                "lease": lease_seconds,
+                "max_attempts": max_attempts,
+                "per_job": per_job_limit,
+                "limit": limit,
+            },
+        )
+        tasks = cur.fetchall()
+        conn.commit()
+        return tasks
+    finally:
+        release_db(conn)
+
+
+def renew_autorun_leases(worker_id, task_ids, lease_seconds):
+    """Extend the leases of tasks this worker still holds. Returns the ids still held; the
+    others were cancelled or reclaimed after an expired lease and must be abandoned."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE autorun_tasks
+               SET lease_expires_at = NOW() + make_interval(secs => %s), heartbeat_at = NOW()
+               WHERE id = ANY(%s) AND worker_id = %s AND state = 'running'
+               RETURNING id""",
+            (lease_seconds, list(task_ids), worker_id),
+        )
+        held = {row[0] for row in cur.fetchall()}
+        conn.commit()
+        return held
+    finally:
+        release_db(conn)
+
+
+def advance_autorun_task(task_id, worker_id):
+    """Move a task whose outputs are saved on to the judge stage. Returns False if the worker
+    no longer holds it."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE autorun_tasks SET stage = 'judge', updated_at = NOW()
+               WHERE id = %s AND worker_id = %s AND state = 'running'""",
+            (task_id, worker_id),
+        )
+        conn.commit()
+        return cur.rowcount == 1
+    finally:
+        release_db(conn)
+
+
+def _lock_task_job(cur, task_id):
+    cur.execute(
+        "SELECT j.id FROM autorun_jobs j JOIN autorun_tasks t ON t.job_id = j.id WHERE t.id = %s FOR UPDATE OF j",
+        (task_id,),
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def complete_autorun_task(task_id, worker_id):
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        # Lock the job first so two workers finishing its last tasks can't both miss the finish
+        job_id = _lock_task_job(cur, task_id)
+        if job_id is not None:
+            cur.execute(
+                """UPDATE autorun_tasks SET state = 'done', lease_expires_at = NULL, updated_at = NOW()
+                   WHERE id = %s AND worker_id = %s AND state = 'running'""",
+                (task_id, worker_id),
+            )
+            _finalize_job(cur, job_id)
+        conn.commit()
+    finally:
+        release_db(conn)
+
+
+def fail_autorun_task(task_id, worker_id, error, max_attempts):
+    """Record a failed attempt: the task goes back to pending, or fails for good after max_attempts."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        job_id = _lock_task_job(cur, task_id)
+        if job_id is not None:
+            cur.execute(
+                """UPDATE autorun_tasks
+                   SET state = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+                       last_error = %s, lease_expires_at = NULL, updated_at = NOW()
+                   WHERE id = %s AND worker_id = %s AND state = 'running'""",
+                (max_attempts, error, task_id, worker_id),
+            )
+            _finalize_job(cur, job_id)
+        conn.commit()
+    finally:
+        release_db(conn)
+
+
+def release_autorun_tasks(worker_id, task_ids):
+    """Hand unfinished tasks back to the queue (worker shutdown) without counting the attempt."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """UPDATE autorun_tasks
+               SET state = 'pending', attempts = GREATEST(attempts - 1, 0), lease_expires_at = NULL, updated_at = NOW()
+               WHERE id = ANY(%s) AND worker_id = %s AND state = 'running'""",
+            (list(task_ids), worker_id),
+        )
+        cur.execute("SELECT pg_notify('jobs_changed', '')")
+        conn.commit()
+    finally:
+        release_db(conn)
+
+
+def expire_autorun_tasks(max_attempts):
+    """Fail tasks whose lease expired on their last allowed attempt (e.g. they crash their worker)."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT j.id FROM autorun_jobs j
+               WHERE j.state = 'active' AND EXISTS (
+                   SELECT 1 FROM autorun_tasks t
+                   WHERE t.job_id = j.id AND t.state = 'running'
+                     AND t.lease_expires_at < NOW() AND t.attempts >= %s
+               )
+               FOR UPDATE SKIP LOCKED""",
+            (max_attempts,),
+        )
+        job_ids = [row[0] for row in cur.fetchall()]
+        for job_id in job_ids:
+            cur.execute(
+                """UPDATE autorun_tasks SET state = 'failed', last_error = 'Lease expired on final attempt',
+                       lease_expires_at = NULL, updated_at = NOW()
+                   WHERE job_id = %s AND state = 'running' AND lease_expires_at < NOW() AND attempts >= %s""",
+                (job_id, max_attempts),
+            )
+            _finalize_job(cur, job_id)
+        conn.commit()
+        return len(job_ids)
+    finally:
+        release_db(conn)
+
+
+def clear_prompt_results(run_prompt_id, outputs=True):
+    """Remove outputs and judge results left by an interrupted attempt at a prompt; with
+    outputs=False only the judge results go. The prompt's cleared counters are bumped so
+    status deltas can tell pollers to drop the deleted rows."""
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        outputs_cleared = 0
+        if outputs:
+            cur.execute("DELETE FROM run_outputs WHERE run_prompt_id = %s", (run_prompt_id,))
+            outputs_cleared = int(cur.rowcount > 0)
+        cur.execute("DELETE FROM judge_results WHERE run_prompt_id = %s", (run_prompt_id,))
+        judge_results_cleared = int(cur.rowcount > 0)
+        if outputs_cleared or judge_results_cleared:
+            cur.execute(
+                """UPDATE run_prompts SET outputs_cleared = outputs_cleared + %s,
+                       judge_results_cleared = judge_results_cleared + %s
+                   WHERE id = %s""",
+                (outputs_cleared, judge_results_cleared, run_prompt_id),
+            )
+        conn.commit()
+    finally:
+        release_db(conn)
+
+
+def get_prompt_outputs(run_prompt_id):
+    conn = get_db()
+    try:
+        cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute("SELECT * FROM run_outputs WHERE run_prompt_id = %s ORDER BY id", (run_prompt_id,))
+        rows = cur.fetchall()
+        for row in rows:
+            row.pop("written_xid", None)
+        return rows
+    finally:
+        release_db(conn)
+
+
+def set_autorun_state(run_id, action):
+    """Apply pause, resume or cancel to a run's job. Returns (changed, run status), or None if
+    the run has no job. Resuming also requeues failed tasks."""
+    transitions = {
+        "pause": (("active",), "paused", "paused"),
+        "resume": (("paused", "done"), "active", "running"),
+        "cancel": (("active", "paused"), "cancelled", "cancelled"),
+    }
+    allowed_from, job_state, run_status = transitions[action]
+    conn = get_db()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """SELECT j.id, j.state, r.status FROM autorun_jobs j JOIN runs r ON r.id = j.run_id
+               WHERE j.run_id = %s FOR UPDATE OF j""",
+            (run_id,),
+        )
+        row = cur.fetchone()
+        if not row:
+            conn.commit()
+            return None
+        job_id, state, status = row
+        if state not in allowed_from:
+            conn.commit()
+            return False, status
+        if action == "resume":
+            cur.execute(
+                """UPDATE autorun_tasks SET state = 'pending', attempts = 0, last_error = NULL, updated_at = NOW()
+                   WHERE job_id = %s AND state = 'failed'""",
+                (job_id,),
+            )
+        elif action == "cancel":
+            # Workers notice their running tasks are gone at the next lease renewal and stop them
+            cur.execute(
+                """UPDATE autorun_tasks SET state = 'cancelled', lease_expires_at = NULL, updated_at = NOW()
+                   WHERE job_id = %s AND state IN ('pending', 'running')""",
+                (job_id,),
+            )
+        cur.execute("UPDATE autorun_jobs SET state = %s, updated_at = NOW() WHERE id = %s", (job_state, job_id))
+        cur.execute("UPDATE runs SET status = %s WHERE id = %s", (run_status, run_id))
+        if action == "resume":
+            # Nothing left to requeue: settle straight back to done
+            _finalize_job(cur, job_id)
+            cur.execute("SELECT status FROM runs WHERE id = %s", (run_id,))
+            run_status = cur.fetchone()[0]
+        cur.execute("SELECT pg_notify('jobs_changed', %s)", (str(run_id),))
+        conn.commit()
+        return True, run_status
+    finally:
+        release_db(conn)
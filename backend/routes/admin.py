@@ -1,7 +1,10 @@
 from flask import Blueprint, jsonify, request
 
-from llmcalls import AVAILABLE_MODELS
+from llmcalls import AVAILABLE_MODELS, invalidate_clients
 from models import get_providers, upsert_provider, get_settings, set_setting
+from services.governor import governor
+from services.resilience import breakers_snapshot
+from utils.validators import validate_judge_panel_settings
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -33,6 +36,8 @@ def update_provider(name):
         endpoint=data.get("endpoint"),
         is_active=data.get("is_active"),
     )
+    if data.get("api_key") is not None or data.get("endpoint") is not None:
+        invalidate_clients(name)
     return jsonify({"status": "ok"})
 
 
@@ -45,7 +50,11 @@ def get_app_settings():
 @admin_bp.route("/settings", methods=["PUT"])
 def update_settings():
     data = request.get_json()
-    for key in ["judge_provider", "judge_model", "judge_prompt_id", "judge_additional_instruction"]:
+    validate_judge_panel_settings(data)
+    for key in [
+        "judge_provider", "judge_model", "judge_prompt_id", "judge_additional_instruction",
+        "judge_panel", "judge_panel_aggregation", "judge_panel_consensus",
+    ]:
         if key in data:
             set_setting(key, data[key])
     return jsonify({"status": "ok"})
@@ -55,3 +64,13 @@ def update_settings():
 def list_models(provider):
     models = AVAILABLE_MODELS.get(provider, [])
     return jsonify(models)
+
+
+@admin_bp.route("/governor", methods=["GET"])
+def governor_status():
+    return jsonify(governor.snapshot())
+
+
+@admin_bp.route("/breakers", methods=["GET"])
+def breaker_status():
+    return jsonify(breakers_snapshot())
@@ -1,16 +1,24 @@
-from flask import Blueprint, jsonify, request
+import json
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 
 from models import (
     create_run,
     add_run_prompt,
-    get_run,
     save_score,
-    get_completed_prompts_count,
-    get_run_prompts_count,
+    get_run_status_delta,
+    run_version_token,
+    set_autorun_state,
 )
-from services.run_service import execute_comparison, start_autorun
+from services.run_service import execute_comparison, start_autorun, stream_comparison
 from services.judge_service import run_judge
-from utils.validators import require_fields, validate_models_config, validate_prompts
+from utils.validators import (
+    require_fields,
+    validate_cache_mode,
+    validate_models_config,
+    validate_prompts,
+    validate_timeout,
+)
 
 compare_bp = Blueprint("compare", __name__)
 
@@ -20,6 +28,8 @@ def single_run():
     data = request.get_json()
     require_fields(data, ["prompt", "models"])
     validate_models_config(data["models"])
+    validate_cache_mode(data.get("cache_mode"))
+    validate_timeout(data.get("timeout_seconds"))
 
     prompt = data["prompt"].strip()
     if not prompt:
@@ -29,7 +39,14 @@ def single_run():
     run_id = create_run("single", data["models"], judge_enabled)
     run_prompt_id = add_run_prompt(run_id, prompt, sequence_num=1)
 
-    results = execute_comparison(prompt, data["models"], run_prompt_id)
+    results = execute_comparison(
+        prompt,
+        data["models"],
+        run_prompt_id,
+        data.get("cache_mode"),
+        timeout=data.get("timeout_seconds"),
+        hedge=data.get("hedge"),
+    )
 
     return jsonify({
         "run_id": run_id,
@@ -38,37 +55,133 @@ def single_run():
     })
 
 
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@compare_bp.route("/run/stream", methods=["POST"])
+def single_run_stream():
+    """Same as /run, but streams each model's tokens back as Server-Sent Events."""
+    data = request.get_json()
+    require_fields(data, ["prompt", "models"])
+    validate_models_config(data["models"])
+    validate_cache_mode(data.get("cache_mode"))
+    validate_timeout(data.get("timeout_seconds"))
+
+    prompt = data["prompt"].strip()
+    if not prompt:
+        return jsonify({"error": "Prompt cannot be empty"}), 400
+
+    judge_enabled = data.get("judge_enabled", False)
+    run_id = create_run("single", data["models"], judge_enabled)
+    run_prompt_id = add_run_prompt(run_id, prompt, sequence_num=1)
+
+    def generate():
+        yield _sse("start", {"run_id": run_id, "run_prompt_id": run_prompt_id, "models": data["models"]})
+        events = stream_comparison(
+            prompt, data["models"], run_prompt_id, data.get("cache_mode"), timeout=data.get("timeout_seconds"),
+        )
+        for kind, payload in events:
+            yield _sse(kind, payload)
+        yield _sse("end", {"run_id": run_id, "run_prompt_id": run_prompt_id})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @compare_bp.route("/autorun", methods=["POST"])
 def autorun():
     data = request.get_json()
     require_fields(data, ["prompts", "models"])
     validate_models_config(data["models"])
     validate_prompts(data["prompts"])
+    validate_cache_mode(data.get("cache_mode"))
+    validate_timeout(data.get("timeout_seconds"))
 
     judge_enabled = data.get("judge_enabled", False)
     run_id = create_run("autorun", data["models"], judge_enabled)
 
-    start_autorun(run_id, data["prompts"], data["models"], judge_enabled)
+    start_autorun(
+        run_id,
+        data["prompts"],
+        data["models"],
+        judge_enabled,
+        data.get("cache_mode"),
+        timeout=data.get("timeout_seconds"),
+    )
 
     return jsonify({"run_id": run_id, "status": "running"})
 
 
 @compare_bp.route("/autorun/<int:run_id>/status", methods=["GET"])
 def autorun_status(run_id):
-    run = get_run(run_id)
-    if not run:
+    """Autorun progress.
+
+    Without ?cursor the full prompt tree is returned. With ?cursor=<n> (use 0 on the first
+    poll) only rows written since that cursor come back, as flat lists, together with the
+    next cursor. Responses carry an ETag; a matching If-None-Match gets a 304 without a
+    database round trip while the run is unchanged.
+    """
+    token = run_version_token(run_id)
+    if token and request.if_none_match.contains(token):
+        response = Response(status=304)
+        response.set_etag(token)
+        return response
+
+    cursor = request.args.get("cursor", type=int)
+    delta = get_run_status_delta(run_id, cursor)
+    if not delta:
         return jsonify({"error": "Run not found"}), 404
 
-    total = len(run.get("prompts", []))
-    completed = get_completed_prompts_count(run_id)
-
-    return jsonify({
+    body = {
         "run_id": run_id,
-        "status": run["status"],
-        "completed": completed,
-        "total": total,
-        "prompts": run.get("prompts", []),
-    })
+        "status": delta["status"],
+        "completed": delta["completed"],
+        "total": delta["total"],
+        "cursor": delta["cursor"],
+    }
+    if cursor is None:
+        prompts = {p["id"]: dict(p, outputs=[], scores=[], judge_results=[]) for p in delta["prompts"]}
+        for key in ("outputs", "scores", "judge_results"):
+            for row in delta[key]:
+                prompts[row["run_prompt_id"]][key].append(row)
+        body["prompts"] = list(prompts.values())
+    else:
+        for key in ("prompts", "outputs", "scores", "judge_results"):
+            body[key] = delta[key]
+
+    response = jsonify(body)
+    if token:
+        response.set_etag(token)
+    return response
+
+
+def _change_autorun(run_id, action):
+    result = set_autorun_state(run_id, action)
+    if result is None:
+        return jsonify({"error": "Autorun not found"}), 404
+    changed, status = result
+    if not changed:
+        return jsonify({"error": f"Run is {status}"}), 409
+    return jsonify({"run_id": run_id, "status": status})
+
+
+@compare_bp.route("/autorun/<int:run_id>/pause", methods=["POST"])
+def pause_autorun(run_id):
+    return _change_autorun(run_id, "pause")
+
+
+@compare_bp.route("/autorun/<int:run_id>/resume", methods=["POST"])
+def resume_autorun(run_id):
+    return _change_autorun(run_id, "resume")
+
+
+@compare_bp.route("/autorun/<int:run_id>/cancel", methods=["POST"])
+def cancel_autorun(run_id):
+    return _change_autorun(run_id, "cancel")
 
 
 @compare_bp.route("/score", methods=["POST"])
@@ -104,7 +217,7 @@ def invoke_judge():
     run_prompt_id = data["run_prompt_id"]
 
     # Get outputs for this prompt
-    from models import get_db
+    from models import get_db, release_db
     import psycopg2.extras
 
     conn = get_db()
@@ -115,7 +228,7 @@ def invoke_judge():
         cur.execute("SELECT prompt_text FROM run_prompts WHERE id = %s", (run_prompt_id,))
         prompt_row = cur.fetchone()
     finally:
-        conn.close()
+        release_db(conn)
 
     if not outputs or not prompt_row:
         return jsonify({"error": "No outputs found for this prompt"}), 404
@@ -125,6 +238,7 @@ def invoke_judge():
         outputs=outputs,
         user_prompt=prompt_row["prompt_text"],
         num_models=len(outputs),
+        force_refresh=bool(data.get("force_refresh", False)),
     )
 
     return jsonify(result)
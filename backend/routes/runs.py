@@ -1,17 +1,72 @@
 from flask import Blueprint, jsonify, request, Response
 
-from models import list_runs, get_run, delete_run
-from services.export_service import export_run_csv, export_run_xlsx
+from models import list_runs, get_run, delete_run, get_leaderboard, search_runs
+from services.export_service import ARCHIVE_FORMATS, ARCHIVE_LAYOUTS, export_run_csv, export_run_xlsx, export_runs_archive
+from services.ratings import RATING_SOURCES, get_ratings
+from utils.errors import ValidationError
+from utils.validators import (
+    encode_cursor,
+    parse_leaderboard_filters,
+    parse_run_filters,
+    parse_run_page,
+    parse_search_args,
+)
 
 runs_bp = Blueprint("runs", __name__)
 
 
 @runs_bp.route("/", methods=["GET"])
 def get_runs():
-    limit = request.args.get("limit", 50, type=int)
-    offset = request.args.get("offset", 0, type=int)
-    runs = list_runs(limit=limit, offset=offset)
-    return jsonify(runs)
+    limit, after = parse_run_page(request.args)
+    runs, more = list_runs(parse_run_filters(request.args), limit=limit, after=after)
+    response = jsonify(runs)
+    if more:
+        response.headers["X-Next-Cursor"] = encode_cursor(runs[-1]["created_at"], runs[-1]["id"])
+    return response
+
+
+@runs_bp.route("/export", methods=["GET"])
+def export_runs():
+    filters = parse_run_filters(request.args)
+    fmt = request.args.get("format", "csv")
+    layout = request.args.get("layout", "per_run")
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValidationError(f"format must be one of: {', '.join(ARCHIVE_FORMATS)}")
+    if layout not in ARCHIVE_LAYOUTS:
+        raise ValidationError(f"layout must be one of: {', '.join(ARCHIVE_LAYOUTS)}")
+
+    return Response(
+        export_runs_archive(filters, fmt=fmt, layout=layout),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=llm_compare_runs_{layout}_{fmt}.zip"},
+    )
+
+
+@runs_bp.route("/search", methods=["GET"])
+def search():
+    hits, more, truncated = search_runs(**parse_search_args(request.args))
+    response = jsonify(hits)
+    if truncated:
+        # Only the newest SEARCH_RANK_CANDIDATES matches per table were ranked and paged
+        response.headers["X-Search-Truncated"] = "true"
+    if more:
+        last = hits[-1]
+        hit_id = last["output_id"] if last["kind"] == "output" else last["run_prompt_id"]
+        response.headers["X-Next-Cursor"] = encode_cursor(last["rank"], last["kind"], hit_id)
+    return response
+
+
+@runs_bp.route("/leaderboard", methods=["GET"])
+def leaderboard():
+    return jsonify(get_leaderboard(parse_leaderboard_filters(request.args)))
+
+
+@runs_bp.route("/ratings", methods=["GET"])
+def ratings():
+    source = request.args.get("source", "all")
+    if source not in RATING_SOURCES:
+        raise ValidationError(f"source must be one of: {', '.join(RATING_SOURCES)}")
+    return jsonify(get_ratings(source, request.args.get("judge_prompt_id") or None))
 
 
 @runs_bp.route("/<int:run_id>", methods=["GET"])
@@ -27,16 +82,14 @@ def export_run(run_id):
     fmt = request.args.get("format", "csv")
 
     if fmt == "xlsx":
-        data = export_run_xlsx(run_id)
         return Response(
-            data,
+            export_run_xlsx(run_id),
             mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={"Content-Disposition": f"attachment; filename=llm_compare_run_{run_id}.xlsx"},
         )
     else:
-        data = export_run_csv(run_id)
         return Response(
-            data,
+            export_run_csv(run_id),
             mimetype="text/csv",
             headers={"Content-Disposition": f"attachment; filename=llm_compare_run_{run_id}.csv"},
         )
@@ -0,0 +1,135 @@
+"""Write-behind persistence for run outputs and judge results.
+
+Rows submitted from anywhere in the process are grouped and written with multi-row
+INSERTs in one transaction, at most BATCH_WRITER_MAX_LATENCY_MS after the first row of a
+batch arrived. Callers that need the new row id wait on the returned future; callers
+that don't just move on. Pending rows are flushed when the process exits. Failed batches
+are retried, except when the connection dropped during the commit and the rows may
+already be stored.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from models import CommitOutcomeUnknown, write_batch
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH = int(os.environ.get("BATCH_WRITER_MAX_BATCH", "200"))
+MAX_LATENCY = float(os.environ.get("BATCH_WRITER_MAX_LATENCY_MS", "250")) / 1000
+WRITE_ATTEMPTS = 3
+
+_OUTPUT = "output"
+_JUDGE_RESULT = "judge_result"
+_FLUSH = "flush"
+_STOP = "stop"
+
+
+class BatchWriter:
+    def __init__(self, max_batch=MAX_BATCH, max_latency=MAX_LATENCY):
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="llmwars-batch-writer", daemon=True)
+                    self._thread.start()
+
+    def _submit(self, kind, row):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((kind, row, future))
+        return future
+
+    def submit_output(self, row):
+        """Queue a run_outputs row (add_run_output's arguments as a dict). Resolves to its id."""
+        return self._submit(_OUTPUT, row)
+
+    def submit_judge_result(self, row):
+        """Queue a judge_results row (save_judge_result's arguments as a dict). Resolves to its id."""
+        return self._submit(_JUDGE_RESULT, row)
+
+    def flush(self, timeout=None):
+        """Block until every row submitted before this call has been written or has failed.
+        Write errors are not raised here; they are set on each row's future."""
+        if self._thread is None:
+            return
+        self._submit(_FLUSH, None).result(timeout)
+
+    async def aflush(self):
+        if self._thread is None:
+            return
+        await asyncio.wrap_future(self._submit(_FLUSH, None))
+
+    def close(self, timeout=30):
+        if self._thread is None:
+            return
+        self._queue.put((_STOP, None, Future()))
+        self._thread.join(timeout)
+
+    def _write(self, batch):
+        outputs = [item for item in batch if item[0] == _OUTPUT]
+        judge_results = [item for item in batch if item[0] == _JUDGE_RESULT]
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                output_ids, judge_ids = write_batch(
+                    outputs=[row for _, row, _ in outputs],
+                    judge_results=[row for _, row, _ in judge_results],
+                )
+                break
+            except Exception as e:
+                # Only retry writes known to have rolled back; a lost commit may have landed
+                if attempt == WRITE_ATTEMPTS or isinstance(e, CommitOutcomeUnknown):
+                    logger.exception("Batch write of %d rows failed", len(batch))
+                    for _, _, future in batch:
+                        future.set_exception(e)
+                    return
+                time.sleep(0.2 * attempt)
+        for (_, _, future), row_id in zip(outputs, output_ids):
+            future.set_result(row_id)
+        for (_, _, future), row_id in zip(judge_results, judge_ids):
+            future.set_result(row_id)
+
+    def _run(self):
+        while True:
+            kind, row, future = self._queue.get()
+            batch = []
+            markers = []
+            stop = False
+            deadline = time.monotonic() + self.max_latency
+            # Gather until the batch is full, the latency budget is spent, or a flush/stop arrives
+            while True:
+                if kind in (_FLUSH, _STOP):
+                    markers.append(future)
+                    stop = kind == _STOP
+                    break
+                batch.append((kind, row, future))
+                if len(batch) >= self.max_batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    kind, row, future = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set_result(None)
+            if stop:
+                return
+
+
+writer = BatchWriter()
+atexit.register(writer.close)
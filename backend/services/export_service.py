@@ -1,28 +1,42 @@
 import csv
 import io
+import json
+import tempfile
+import zipfile
 
 from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 
-from models import get_run
+from models import get_run_header, iter_export_prompts, iter_run_export_prompts
 
+LABELS = ["Model A", "Model B", "Model C"]
+CSV_CHUNK_SIZE = 64 * 1024
+XLSX_CHUNK_SIZE = 256 * 1024
+# Excel rejects cells longer than this many characters
+XLSX_CELL_LIMIT = 32767
+XLSX_TRUNCATION_MARKER = " … [truncated]"
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+ARCHIVE_FORMATS = ("csv", "jsonl")
+ARCHIVE_LAYOUTS = ("per_run", "combined")
+LONG_HEADER = [
+    "Run ID", "Timestamp", "Mode", "Judge Enabled", "Prompt #", "Prompt", "Model Label",
+    "Provider", "Model", "Output", "Latency (ms)", "Error", "User Score", "User Notes",
+    "AI Judge Score", "AI Judge Notes",
+]
 
-def _build_export_rows(run_id):
-    """Build flat rows for export from a run."""
-    run = get_run(run_id)
-    if not run:
-        return [], []
 
-    # Determine model labels
-    models_config = run.get("models_config", [])
-    if isinstance(models_config, str):
-        import json
-        models_config = json.loads(models_config)
+def _load_json(value, default):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return default
+    return value if value is not None else default
 
-    labels = ["Model A", "Model B", "Model C"]
 
-    # Build header
+def _export_header(run, models_config):
     header = ["Timestamp", "Mode", "Prompt #", "Prompt"]
-    for i, cfg in enumerate(models_config):
+    for cfg in models_config:
         label = f"{cfg['provider']}/{cfg['model']}"
         header.append(f"{label} Output")
         header.append(f"{label} User Score")
@@ -30,74 +44,241 @@ def _build_export_rows(run_id):
         if run.get("judge_enabled"):
             header.append(f"{label} AI Judge Score")
             header.append(f"{label} AI Judge Notes")
+    return header
+
 
-    rows = []
-    for prompt in run.get("prompts", []):
-        row = [
-            str(run.get("created_at", "")),
-            run.get("mode", ""),
-            prompt.get("sequence_num", 1),
-            prompt.get("prompt_text", ""),
-        ]
-
-        outputs = prompt.get("outputs", [])
-        scores = prompt.get("scores", [])
-        judge_results = prompt.get("judge_results", [])
-
-        # Parse judge result
-        judge_evaluations = {}
-        if judge_results:
-            jr = judge_results[0].get("result_json", {})
-            if isinstance(jr, str):
-                import json
-                try:
-                    jr = json.loads(jr)
-                except json.JSONDecodeError:
-                    jr = {}
-            for ev in jr.get("evaluations", []):
-                judge_evaluations[ev.get("model_label", "")] = ev
-
-        for i, cfg in enumerate(models_config):
-            # Find matching output
-            output = next(
-                (o for o in outputs if o["provider"] == cfg["provider"] and o["model"] == cfg["model"]),
-                None,
-            )
-            row.append(output.get("output_text", "") if output else "")
-
-            # Find matching score
-            label = labels[i]
-            score_entry = next((s for s in scores if s["model_label"] == label), None)
-            row.append(score_entry.get("score", "") if score_entry else "")
-            row.append(score_entry.get("comment", "") if score_entry else "")
-
-            if run.get("judge_enabled"):
-                judge_ev = judge_evaluations.get(label, {})
-                row.append(judge_ev.get("score", ""))
-                row.append(judge_ev.get("comment", ""))
-
-        rows.append(row)
-
-    return header, rows
+def _export_row(run, models_config, prompt):
+    row = [
+        str(run.get("created_at", "")),
+        run.get("mode", ""),
+        prompt.get("sequence_num", 1),
+        prompt.get("prompt_text", ""),
+    ]
+
+    # First match wins, as in the per-model scans this replaces
+    outputs = {}
+    for o in prompt.get("outputs") or []:
+        outputs.setdefault((o["provider"], o["model"]), o)
+    scores = {}
+    for s in prompt.get("scores") or []:
+        scores.setdefault(s["model_label"], s)
+    judge_evaluations = {}
+    for ev in _load_json(prompt.get("judge_result"), {}).get("evaluations", []):
+        judge_evaluations[ev.get("model_label", "")] = ev
+
+    for i, cfg in enumerate(models_config):
+        output = outputs.get((cfg["provider"], cfg["model"]))
+        row.append(output.get("output_text", "") if output else "")
+
+        label = LABELS[i]
+        score_entry = scores.get(label)
+        row.append(score_entry.get("score", "") if score_entry else "")
+        row.append(score_entry.get("comment", "") if score_entry else "")
+
+        if run.get("judge_enabled"):
+            judge_ev = judge_evaluations.get(label, {})
+            row.append(judge_ev.get("score", ""))
+            row.append(judge_ev.get("comment", ""))
+
+    return row
+
+
+def iter_export_rows(run_id):
+    """Yield the header, then one flat row per prompt, streaming prompts from the database."""
+    run = get_run_header(run_id)
+    if not run:
+        yield []
+        return
+    models_config = _load_json(run.get("models_config"), [])
+    yield _export_header(run, models_config)
+    for prompt in iter_run_export_prompts(run_id):
+        yield _export_row(run, models_config, prompt)
 
 
 def export_run_csv(run_id):
-    header, rows = _build_export_rows(run_id)
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(header)
-    writer.writerows(rows)
-    return output.getvalue().encode("utf-8")
+    """Yield the CSV export as UTF-8 chunks of roughly CSV_CHUNK_SIZE bytes."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in iter_export_rows(run_id):
+        writer.writerow(row)
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _xlsx_cell(value):
+    if not isinstance(value, str):
+        return value
+    # Control characters make openpyxl raise; long outputs would make Excel refuse the file
+    value = ILLEGAL_CHARACTERS_RE.sub("", value)
+    if len(value) > XLSX_CELL_LIMIT:
+        value = value[:XLSX_CELL_LIMIT - len(XLSX_TRUNCATION_MARKER)] + XLSX_TRUNCATION_MARKER
+    return value
 
 
 def export_run_xlsx(run_id):
-    header, rows = _build_export_rows(run_id)
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "LLM Compare Results"
-    ws.append(header)
-    for row in rows:
-        ws.append(row)
-    output = io.BytesIO()
-    wb.save(output)
-    return output.getvalue()
+    """Yield the XLSX export in chunks.
+
+    The workbook is written in openpyxl's write-only mode, which streams rows to disk,
+    and saved to a temporary file that is then read back chunk by chunk.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("LLM Compare Results")
+    for row in iter_export_rows(run_id):
+        ws.append([_xlsx_cell(value) for value in row])
+    with tempfile.TemporaryFile() as spool:
+        wb.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(XLSX_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+class _ArchiveSink:
+    """Write-only, unseekable file object that zipfile writes into; drained by the generator."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _prompt_run(prompt):
+    return {
+        "id": prompt["run_id"],
+        "created_at": prompt.get("run_created_at"),
+        "mode": prompt.get("run_mode"),
+        "judge_enabled": prompt.get("judge_enabled"),
+    }
+
+
+def _long_rows(prompt, models_config):
+    """One row per model for a prompt: the long-format layout used by combined exports."""
+    run = _prompt_run(prompt)
+    outputs = {}
+    for o in prompt.get("outputs") or []:
+        outputs.setdefault((o["provider"], o["model"]), o)
+    scores = {}
+    for s in prompt.get("scores") or []:
+        scores.setdefault(s["model_label"], s)
+    judge_evaluations = {}
+    for ev in _load_json(prompt.get("judge_result"), {}).get("evaluations", []):
+        judge_evaluations[ev.get("model_label", "")] = ev
+
+    for i, cfg in enumerate(models_config):
+        label = LABELS[i] if i < len(LABELS) else f"Model {i + 1}"
+        output = outputs.get((cfg["provider"], cfg["model"])) or {}
+        score_entry = scores.get(label) or {}
+        judge_ev = judge_evaluations.get(label, {}) if run["judge_enabled"] else {}
+        yield {
+            "Run ID": run["id"],
+            "Timestamp": str(run["created_at"] or ""),
+            "Mode": run["mode"] or "",
+            "Judge Enabled": bool(run["judge_enabled"]),
+            "Prompt #": prompt.get("sequence_num", 1),
+            "Prompt": prompt.get("prompt_text", ""),
+            "Model Label": label,
+            "Provider": cfg["provider"],
+            "Model": cfg["model"],
+            "Output": output.get("output_text", ""),
+            "Latency (ms)": output.get("latency_ms", ""),
+            "Error": output.get("error") or "",
+            "User Score": score_entry.get("score", ""),
+            "User Notes": score_entry.get("comment", ""),
+            "AI Judge Score": judge_ev.get("score", ""),
+            "AI Judge Notes": judge_ev.get("comment", ""),
+        }
+
+
+def _jsonl_prompt(prompt):
+    return {
+        "run_id": prompt["run_id"],
+        "run_created_at": prompt.get("run_created_at"),
+        "mode": prompt.get("run_mode"),
+        "judge_enabled": prompt.get("judge_enabled"),
+        "sequence_num": prompt.get("sequence_num"),
+        "prompt_text": prompt.get("prompt_text"),
+        "outputs": prompt.get("outputs") or [],
+        "scores": prompt.get("scores") or [],
+        "judge_result": _load_json(prompt.get("judge_result"), None),
+    }
+
+
+class _ArchiveEntry:
+    """A text member of the archive being written, with a CSV or JSONL row writer."""
+
+    def __init__(self, zf, name, fmt, header=None):
+        self._text = io.TextIOWrapper(zf.open(name, "w", force_zip64=True), encoding="utf-8", newline="")
+        self._fmt = fmt
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.writer(self._text)
+            if header:
+                self._csv.writerow(header)
+
+    def write(self, record):
+        if self._csv is not None:
+            self._csv.writerow(record)
+        else:
+            self._text.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def close(self):
+        self._text.close()
+
+
+def export_runs_archive(filters, fmt="csv", layout="per_run"):
+    """Yield a zip archive of every run matching filters, in chunks of roughly ARCHIVE_CHUNK_SIZE.
+
+    per_run writes one member per run (the single-run CSV layout, or one JSON object per
+    prompt); combined writes a single long-format table with one row per prompt and model.
+    Runs are read in one ordered pass over a server-side cursor and compressed as they
+    arrive, so neither the rows nor the archive are ever held in memory.
+    """
+    sink = _ArchiveSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        entry = None
+        if layout == "combined":
+            entry = _ArchiveEntry(zf, f"runs.{fmt}", fmt, LONG_HEADER)
+        current_run = None
+        models_config = []
+        for prompt in iter_export_prompts(filters):
+            if prompt["run_id"] != current_run:
+                current_run = prompt["run_id"]
+                models_config = _load_json(prompt.get("models_config"), [])
+                if layout == "per_run":
+                    if entry is not None:
+                        entry.close()
+                    header = _export_header(_prompt_run(prompt), models_config)
+                    entry = _ArchiveEntry(zf, f"run_{current_run}.{fmt}", fmt, header)
+
+            if layout == "combined":
+                for row in _long_rows(prompt, models_config):
+                    entry.write(list(row.values()) if fmt == "csv" else row)
+            elif fmt == "csv":
+                entry.write(_export_row(_prompt_run(prompt), models_config, prompt))
+            else:
+                entry.write(_jsonl_prompt(prompt))
+
+            if len(sink) >= ARCHIVE_CHUNK_SIZE:
+                yield sink.drain()
+        if entry is not None:
+            entry.close()
+    yield sink.drain()
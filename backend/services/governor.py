@@ -0,0 +1,329 @@
+"""Per-provider rate limiting and adaptive concurrency for LLM calls.
+
+Every call takes a permit from the limiter for its provider (or provider and model, or
+provider and API key, per LLM_GOVERNOR_SCOPE). A limiter enforces:
+
+    requests per minute   token bucket, LLM_GOVERNOR_RPM (0 = unlimited)
+    tokens per minute     token bucket charged with an estimate up front and corrected
+                          with the reported usage afterwards, LLM_GOVERNOR_TPM
+    concurrency           AIMD: grows by about one per window of healthy calls, halves on
+                          a 429 and backs off gently when per-token latency degrades,
+                          between 1 and LLM_GOVERNOR_MAX_CONCURRENCY
+
+The token buckets belong to the limiter, but the concurrency limit and latency baseline
+are kept per model even when the limiter covers a whole provider, so a slow model backs
+itself off without throttling the provider's fast ones.
+
+Each limit can be overridden per provider, e.g. LLM_GOVERNOR_OPENAI_RPM. Callers that
+cannot be admitted wait in a FIFO queue instead of failing; threads (call_llm,
+stream_llm) and coroutines (acall_llm) share the same queue.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+
+SCOPES = ("provider", "model", "key")
+SCOPE = os.environ.get("LLM_GOVERNOR_SCOPE", "provider")
+OUTPUT_TOKEN_ESTIMATE = 512
+CHARS_PER_TOKEN = 4
+# Per-token latency above this multiple of the running baseline counts as congestion
+LATENCY_FACTOR = 2.0
+LATENCY_BASELINE_ALPHA = 0.05
+# At most one multiplicative decrease per this many seconds, so one burst of 429s
+# halves the limit once rather than once per failed call
+DECREASE_COOLDOWN = 2.0
+
+
+def _setting(provider, name, default):
+    value = os.environ.get(f"LLM_GOVERNOR_{provider.upper()}_{name}")
+    if value is None:
+        value = os.environ.get(f"LLM_GOVERNOR_{name}", default)
+    return float(value)
+
+
+def max_wait(provider):
+    """Longest a call without a deadline queues for a permit (LLM_GOVERNOR_MAX_WAIT seconds)."""
+    return _setting(provider, "MAX_WAIT", "120")
+
+
+def estimate_tokens(prompt, user_input, params=None):
+    """Rough token count charged against the TPM budget before the call is made."""
+    chars = len(prompt or "") + len(user_input or "")
+    max_tokens = (params or {}).get("max_tokens") or OUTPUT_TOKEN_ESTIMATE
+    return chars // CHARS_PER_TOKEN + min(max_tokens, OUTPUT_TOKEN_ESTIMATE)
+
+
+def _usage_tokens(usage):
+    usage = usage or {}
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens")) or 0
+    completion = usage.get("completion_tokens", usage.get("output_tokens")) or 0
+    return prompt, completion
+
+
+class _Bucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until amount is available (requests larger than the bucket wait for a full one)."""
+        if not self.capacity:
+            return 0
+        amount = min(amount, self.capacity)
+        return 0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if self.capacity:
+            self.level = min(self.capacity, self.level - amount)
+
+
+class _Waiter:
+    __slots__ = ("model", "tokens", "wake", "granted")
+
+    def __init__(self, model, tokens, wake):
+        self.model = model
+        self.tokens = tokens
+        self.wake = wake
+        self.granted = False
+
+
+class _Congestion:
+    """AIMD concurrency state of one model."""
+
+    __slots__ = ("limit", "in_flight", "rate_limited", "latency_baseline", "last_decrease")
+
+    def __init__(self, max_concurrency):
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.latency_baseline = None
+        self.last_decrease = 0.0
+
+    def decrease(self, now, factor):
+        if now - self.last_decrease >= DECREASE_COOLDOWN:
+            self.limit = max(1.0, self.limit * factor)
+            self.last_decrease = now
+
+
+class Limiter:
+    def __init__(self, key, rpm, tpm, max_concurrency):
+        self.key = key
+        self.max_concurrency = max(1, int(max_concurrency))
+        self._requests = _Bucket(rpm)
+        self._tokens = _Bucket(tpm)
+        self._models = {}
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _congestion(self, model):
+        congestion = self._models.get(model)
+        if congestion is None:
+            congestion = self._models[model] = _Congestion(self.max_concurrency)
+        return congestion
+
+    def _dispatch(self):
+        """Admit waiters in queue order while limits allow. Lock must be held.
+
+        A waiter whose model is at its concurrency limit is passed over, so later waiters
+        for other models still go; the shared budgets are granted strictly in order.
+        """
+        now = time.monotonic()
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        for waiter in list(self._queue):
+            congestion = self._congestion(waiter.model)
+            if congestion.in_flight >= int(congestion.limit):
+                continue
+            delay = max(self._requests.wait_time(1), self._tokens.wait_time(waiter.tokens))
+            if delay > 0:
+                # Budget exhausted: check again once the buckets have refilled enough
+                if self._timer is None:
+                    self._timer = threading.Timer(delay, self._on_timer)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self._queue.remove(waiter)
+            self._requests.take(1)
+            self._tokens.take(waiter.tokens)
+            congestion.in_flight += 1
+            waiter.granted = True
+            waiter.wake()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def enqueue(self, waiter):
+        with self._lock:
+            self._queue.append(waiter)
+            self._dispatch()
+
+    def abandon(self, waiter):
+        """Withdraw a waiter whose caller gave up, returning its slot if it was already granted."""
+        with self._lock:
+            if waiter.granted:
+                self._congestion(waiter.model).in_flight -= 1
+            else:
+                try:
+                    self._queue.remove(waiter)
+                except ValueError:
+                    pass
+            self._dispatch()
+
+    def release(self, model, reserved, usage=None, latency=None, rate_limited=False):
+        with self._lock:
+            congestion = self._congestion(model)
+            congestion.in_flight -= 1
+            now = time.monotonic()
+            if rate_limited:
+                congestion.rate_limited += 1
+                congestion.decrease(now, 0.5)
+            elif usage is not None:
+                prompt_tokens, completion_tokens = _usage_tokens(usage)
+                if prompt_tokens or completion_tokens:
+                    self._tokens.refill(now)
+                    self._tokens.take(prompt_tokens + completion_tokens - reserved)
+                if latency is not None:
+                    per_token = latency / max(completion_tokens, 1)
+                    baseline = congestion.latency_baseline
+                    if baseline is not None and per_token > LATENCY_FACTOR * baseline:
+                        congestion.decrease(now, 0.9)
+                    else:
+                        congestion.limit = min(self.max_concurrency, congestion.limit + 1 / congestion.limit)
+                    if baseline is None:
+                        congestion.latency_baseline = per_token
+                    else:
+                        congestion.latency_baseline = baseline + LATENCY_BASELINE_ALPHA * (per_token - baseline)
+            self._dispatch()
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            self._requests.refill(now)
+            self._tokens.refill(now)
+            models = [
+                {
+                    "model": model,
+                    "in_flight": congestion.in_flight,
+                    "concurrency_limit": round(congestion.limit, 2),
+                    "rate_limited": congestion.rate_limited,
+                }
+                for model, congestion in self._models.items()
+            ]
+            return {
+                "key": "/".join(self.key),
+                "queued": len(self._queue),
+                "in_flight": sum(m["in_flight"] for m in models),
+                # Sum of the per-model limits below
+                "concurrency_limit": round(sum(c.limit for c in self._models.values()), 2),
+                "max_concurrency": self.max_concurrency,
+                "rpm_limit": self._requests.capacity or None,
+                "rpm_available": round(self._requests.level, 1) if self._requests.capacity else None,
+                "tpm_limit": self._tokens.capacity or None,
+                "tpm_available": round(self._tokens.level) if self._tokens.capacity else None,
+                "rate_limited": sum(m["rate_limited"] for m in models),
+                "models": models,
+            }
+
+
+class Permit:
+    """A granted slot. Release it exactly once; later calls are no-ops."""
+
+    def __init__(self, limiter, model, tokens):
+        self._limiter = limiter
+        self._model = model
+        self._tokens = tokens
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self, usage=None, rate_limited=False):
+        if self._released:
+            return
+        self._released = True
+        latency = time.monotonic() - self._started if usage is not None else None
+        self._limiter.release(self._model, self._tokens, usage=usage, latency=latency, rate_limited=rate_limited)
+
+
+class PermitTimeout(TimeoutError):
+    """No permit was granted in time. Raised locally, so it says nothing about the provider."""
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Governor:
+    def __init__(self, scope=SCOPE):
+        self.scope = scope if scope in SCOPES else "provider"
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider, model, api_key):
+        if self.scope == "model":
+            key = (provider, model or "")
+        elif self.scope == "key":
+            key = (provider, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12])
+        else:
+            key = (provider,)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = Limiter(
+                    key,
+                    rpm=_setting(provider, "RPM", "0"),
+                    tpm=_setting(provider, "TPM", "0"),
+                    max_concurrency=_setting(provider, "MAX_CONCURRENCY", "16"),
+                )
+                self._limiters[key] = limiter
+            return limiter
+
+    def acquire(self, provider, model, api_key, tokens, timeout=None):
+        """Block the calling thread until a permit is granted. Raises PermitTimeout after timeout seconds."""
+        limiter = self.limiter(provider, model, api_key)
+        event = threading.Event()
+        waiter = _Waiter(model or "", tokens, event.set)
+        limiter.enqueue(waiter)
+        try:
+            if not event.wait(timeout):
+                raise PermitTimeout(f"[{provider}] no rate limit slot within the deadline")
+        except BaseException:
+            limiter.abandon(waiter)
+            raise
+        return Permit(limiter, model or "", tokens)
+
+    async def aacquire(self, provider, model, api_key, tokens, timeout=None):
+        limiter = self.limiter(provider, model, api_key)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = _Waiter(model or "", tokens, lambda: loop.call_soon_threadsafe(_resolve, future))
+        limiter.enqueue(waiter)
+        try:
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise PermitTimeout(f"[{provider}] no rate limit slot within the deadline") from None
+        except BaseException:
+            limiter.abandon(waiter)
+            raise
+        return Permit(limiter, model or "", tokens)
+
+    def snapshot(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.snapshot() for limiter in limiters]
+
+
+governor = Governor()
@@ -0,0 +1,240 @@
+"""Durable autorun execution.
+
+An autorun is stored as a job (one per run) and one task per prompt. Workers claim tasks
+with FOR UPDATE SKIP LOCKED under a lease they keep renewing while they work; a task whose
+worker dies is claimed again once its lease expires, so a run picks up from its last
+completed prompt after a crash or restart. Any number of workers can share the queue:
+one is embedded in each Flask process (unless AUTORUN_EMBEDDED_WORKER=0) and more can be
+started with `python worker.py` on any machine that reaches the database.
+
+Within a worker each task goes through two stages. The compare stage calls the models
+and saves the outputs; the task then joins a bounded queue for the judge stage, whose own
+pool of coroutines judges it and marks it done. A compare slot is freed as soon as the
+task is queued, so the next prompt's model calls overlap this one's judging; when the
+queue is full the compare stage waits for it. A task stays claimed (and its run stays
+running) until both stages are through, and a retry of a task that already reached the
+judge stage only repeats the judging.
+
+Pausing stops new prompts from being claimed and lets in-flight ones finish; cancelling
+also stops in-flight prompts at the worker's next lease renewal.
+"""
+import asyncio
+import atexit
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from models import (
+    advance_autorun_task,
+    claim_autorun_tasks,
+    complete_autorun_task,
+    expire_autorun_tasks,
+    fail_autorun_task,
+    on_jobs_changed,
+    release_autorun_tasks,
+    renew_autorun_leases,
+)
+from services.run_service import arun_autorun_compare, arun_autorun_judge
+from utils.aio import submit
+
+logger = logging.getLogger(__name__)
+
+# Prompts one autorun keeps in flight, and the cap across all autoruns in one worker
+AUTORUN_PROMPT_CONCURRENCY = int(os.environ.get("AUTORUN_PROMPT_CONCURRENCY", "3"))
+AUTORUN_MAX_CONCURRENCY = int(os.environ.get("AUTORUN_MAX_CONCURRENCY", "8"))
+LEASE_SECONDS = float(os.environ.get("AUTORUN_LEASE_SECONDS", "60"))
+POLL_SECONDS = float(os.environ.get("AUTORUN_POLL_SECONDS", "5"))
+MAX_ATTEMPTS = int(os.environ.get("AUTORUN_TASK_MAX_ATTEMPTS", "3"))
+# Judge calls in flight per worker, and judged-ready prompts that may wait for one
+AUTORUN_JUDGE_CONCURRENCY = int(os.environ.get("AUTORUN_JUDGE_CONCURRENCY", "4"))
+AUTORUN_JUDGE_QUEUE = int(os.environ.get("AUTORUN_JUDGE_QUEUE", "8"))
+# Renew well before the lease runs out, and poll at least that often
+RENEW_SECONDS = LEASE_SECONDS / 3
+
+
+class Worker:
+    def __init__(self, concurrency=AUTORUN_MAX_CONCURRENCY, judge_concurrency=AUTORUN_JUDGE_CONCURRENCY,
+                 judge_queue=AUTORUN_JUDGE_QUEUE, worker_id=None):
+        self.concurrency = concurrency
+        self.judge_concurrency = judge_concurrency
+        self.judge_queue = judge_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        # Compare stage: task id -> asyncio task
+        self._running = {}
+        # Judge stage: task id -> asyncio task judging it, or None while it waits in the queue
+        self._judging = {}
+        self._queue = None
+        self._judges = []
+        self._loop = None
+        self._wake = None
+        self._stopping = False
+        self._done = None
+
+    def wake(self):
+        """Ask the worker to look for work now. Safe to call from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._done = asyncio.Event()
+        self._queue = asyncio.Queue(maxsize=self.judge_queue)
+        self._judges = [asyncio.create_task(self._judge_loop()) for _ in range(self.judge_concurrency)]
+        on_jobs_changed(self.wake)
+        logger.info("Autorun worker %s started", self.worker_id)
+        try:
+            while not self._stopping:
+                self._wake.clear()
+                try:
+                    await self._renew()
+                    await self._fill()
+                except Exception:
+                    logger.exception("Autorun worker %s: queue poll failed", self.worker_id)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), min(POLL_SECONDS, RENEW_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self._shutdown()
+            self._done.set()
+
+    async def stop(self):
+        self._stopping = True
+        if self._wake is not None:
+            self._wake.set()
+            await self._done.wait()
+
+    def stop_threadsafe(self, timeout=10):
+        if self._loop is not None and not self._stopping:
+            asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result(timeout)
+
+    async def _renew(self):
+        task_ids = set(self._running) | set(self._judging)
+        if not task_ids:
+            return
+        held = await asyncio.to_thread(renew_autorun_leases, self.worker_id, list(task_ids), LEASE_SECONDS)
+        for task_id in task_ids - held:
+            # Cancelled, or reclaimed by another worker after our lease lapsed
+            self._drop(task_id)
+
+    def _drop(self, task_id):
+        running = self._running.get(task_id)
+        if running is not None:
+            running.cancel()
+        # A queued task is skipped when it reaches the front of the queue
+        judging = self._judging.pop(task_id, None)
+        if judging is not None:
+            judging.cancel()
+
+    async def _fill(self):
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return
+        await asyncio.to_thread(expire_autorun_tasks, MAX_ATTEMPTS)
+        tasks = await asyncio.to_thread(
+            claim_autorun_tasks, self.worker_id, free, LEASE_SECONDS, AUTORUN_PROMPT_CONCURRENCY, MAX_ATTEMPTS,
+        )
+        for task in tasks:
+            self._running[task["id"]] = asyncio.create_task(self._execute(task))
+
+    async def _fail(self, task, error):
+        logger.error("Autorun task %s (run %s) failed: %s", task["id"], task["run_id"], error, exc_info=error)
+        try:
+            await asyncio.to_thread(fail_autorun_task, task["id"], self.worker_id, str(error), MAX_ATTEMPTS)
+        except Exception:
+            # The lease will lapse and the task will be retried elsewhere
+            logger.exception("Could not record failure of autorun task %s", task["id"])
+
+    async def _execute(self, task):
+        """Compare stage, then hand the task to the judge stage (or finish it if there is no judge)."""
+        try:
+            results = None
+            if task["stage"] == "compare":
+                results = await arun_autorun_compare(task)
+                if not task["judge_enabled"]:
+                    await asyncio.to_thread(complete_autorun_task, task["id"], self.worker_id)
+                    return
+                if not await asyncio.to_thread(advance_autorun_task, task["id"], self.worker_id):
+                    return
+            # Registered before queueing so lease renewals keep covering it
+            self._judging[task["id"]] = None
+            await self._queue.put((task, results))
+        except asyncio.CancelledError:
+            self._judging.pop(task["id"], None)
+            raise
+        except Exception as e:
+            self._judging.pop(task["id"], None)
+            await self._fail(task, e)
+        finally:
+            self._running.pop(task["id"], None)
+            self._wake.set()
+
+    async def _judge_loop(self):
+        while True:
+            task, results = await self._queue.get()
+            try:
+                if task["id"] not in self._judging:
+                    continue
+                judging = asyncio.create_task(self._judge(task, results))
+                self._judging[task["id"]] = judging
+                try:
+                    # A dropped task cancels only its own judging, not this loop
+                    await asyncio.wait({judging})
+                except asyncio.CancelledError:
+                    judging.cancel()
+                    raise
+            finally:
+                self._queue.task_done()
+
+    async def _judge(self, task, results):
+        try:
+            await arun_autorun_judge(task, results)
+            await asyncio.to_thread(complete_autorun_task, task["id"], self.worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._fail(task, e)
+        finally:
+            self._judging.pop(task["id"], None)
+            self._wake.set()
+
+    async def _shutdown(self):
+        held = set(self._running) | set(self._judging)
+        running = list(self._running.values()) + self._judges
+        running += [judging for judging in self._judging.values() if judging is not None]
+        for coro_task in running:
+            coro_task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        if held:
+            # Tasks already in the judge stage keep it, so whoever claims them next only judges
+            try:
+                await asyncio.to_thread(release_autorun_tasks, self.worker_id, list(held))
+            except Exception:
+                logger.exception("Could not release autorun tasks on shutdown")
+        logger.info("Autorun worker %s stopped", self.worker_id)
+
+
+_embedded = None
+_embedded_lock = threading.Lock()
+
+
+def start_embedded_worker():
+    """Run a worker on the shared event loop of this process (once)."""
+    global _embedded
+    with _embedded_lock:
+        if _embedded is None:
+            _embedded = Worker()
+            submit(_embedded.run())
+            atexit.register(stop_embedded_worker)
+    return _embedded
+
+
+def stop_embedded_worker(timeout=10):
+    if _embedded is not None:
+        try:
+            _embedded.stop_threadsafe(timeout)
+        except Exception:
+            logger.exception("Embedded autorun worker did not stop cleanly")
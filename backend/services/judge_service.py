@@ -1,30 +1,112 @@
+import asyncio
+import hashlib
 import json
 import logging
+import os
+import threading
 import time
+import uuid
+from collections import Counter
 
 logger = logging.getLogger(__name__)
 
-from llmcalls import call_llm
-from models import get_setting, get_provider, save_judge_result
+from llmcalls import acall_llm
+from models import (
+    get_judge_cache_entry,
+    get_setting,
+    get_provider,
+    prune_judge_cache,
+    put_judge_cache_entry,
+    write_batch,
+)
+from services.batch_writer import writer
 from sysprompt import prompts
+from utils.aio import run_sync
 
+# Identical evaluations (same prompt, outputs, template, instruction and judge model) are
+# answered from the judge_cache table instead of calling the judge again
+JUDGE_CACHE_ENABLED = os.environ.get("JUDGE_CACHE_ENABLED", "1") == "1"
+JUDGE_CACHE_TTL = float(os.environ.get("JUDGE_CACHE_TTL_HOURS", "720")) * 3600
+PRUNE_EVERY = 100
 
-def run_judge(run_prompt_id, outputs, user_prompt, num_models):
-    judge_provider = get_setting("judge_provider") or "openai"
-    judge_model = get_setting("judge_model") or "gpt-4o"
+PANEL_AGGREGATIONS = ("mean", "majority", "borda")
+LABELS = ["Model A", "Model B", "Model C"]
+
+_stores_since_prune = 0
+_prune_lock = threading.Lock()
+
+
+def judge_cache_key(judge_provider, judge_model, judge_prompt_id, template, additional_instruction,
+                    user_prompt, outputs):
+    """Hash of everything that determines an evaluation. Outputs are kept in order, since
+    their position decides which label each one is judged under."""
+    canonical = json.dumps(
+        {
+            "judge_provider": judge_provider,
+            "judge_model": judge_model,
+            "judge_prompt_id": judge_prompt_id,
+            "template": template,
+            "additional_instruction": additional_instruction.strip(),
+            "user_prompt": user_prompt,
+            "outputs": [
+                [o["provider"], o["model"], o.get("output_text") or o.get("text", "")]
+                for o in outputs
+            ],
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _judge_panel():
+    """Judges to consult: the judge_panel setting (a JSON list of {"provider", "model"}), or
+    the single judge_provider/judge_model when no panel is configured."""
+    panel = []
+    raw = get_setting("judge_panel")
+    if raw:
+        try:
+            panel = [
+                {"provider": j["provider"], "model": j["model"]}
+                for j in json.loads(raw)
+                if isinstance(j, dict) and j.get("provider") and j.get("model")
+            ]
+        except (json.JSONDecodeError, TypeError):
+            logger.error("Ignoring malformed judge_panel setting")
+    if not panel:
+        panel = [{"provider": get_setting("judge_provider") or "openai", "model": get_setting("judge_model") or "gpt-4o"}]
+    return panel
+
+
+def _prepare_judge(outputs, user_prompt, num_models):
+    """Load judge settings and build the formatted judge prompt. Returns a dict, or {"error": ...}."""
     judge_prompt_id = get_setting("judge_prompt_id") or "JG001V1"
     judge_additional_instruction = get_setting("judge_additional_instruction") or ""
 
-    provider_config = get_provider(judge_provider)
-    if not provider_config or not provider_config.get("api_key"):
-        return {"error": "Judge provider not configured"}
-
     prompt_template = prompts.get(judge_prompt_id)
     if not prompt_template:
         return {"error": f"Judge prompt '{judge_prompt_id}' not found"}
 
+    judges = []
+    for judge in _judge_panel():
+        provider_config = get_provider(judge["provider"])
+        if not provider_config or not provider_config.get("api_key"):
+            logger.warning("Skipping judge %s/%s: provider not configured", judge["provider"], judge["model"])
+            continue
+        judges.append({
+            "judge_provider": judge["provider"],
+            "judge_model": judge["model"],
+            "provider_config": provider_config,
+            "cache_key": judge_cache_key(
+                judge["provider"], judge["model"], judge_prompt_id, prompt_template["full_prompt"],
+                judge_additional_instruction, user_prompt, outputs,
+            ),
+        })
+    if not judges:
+        return {"error": "Judge provider not configured"}
+
     max_score = num_models
-    labels = ["Model A", "Model B", "Model C"][:num_models]
+    labels = LABELS[:num_models]
 
     model_outputs_text = ""
     for i, output in enumerate(outputs):
@@ -53,49 +135,273 @@ def run_judge(run_prompt_id, outputs, user_prompt, num_models):
     if judge_additional_instruction.strip():
         formatted_prompt += f"\n\n# Additional Instruction (HIGH PRIORITY)\n{judge_additional_instruction.strip()}"
 
-    print("\n" + "="*60)
-    print(f"[JUDGE] provider={judge_provider}  model={judge_model}  prompt_id={judge_prompt_id}")
-    print("-"*60)
-    print(formatted_prompt)
-    print("="*60 + "\n")
+    aggregation = get_setting("judge_panel_aggregation") or "mean"
+    consensus = get_setting("judge_panel_consensus")
+    return {
+        "judge_prompt_id": judge_prompt_id,
+        "formatted_prompt": formatted_prompt,
+        "judges": judges,
+        "labels": labels,
+        "aggregation": aggregation if aggregation in PANEL_AGGREGATIONS else "mean",
+        # Judges that must name the same winner before the rest are cancelled; 0 waits for all
+        "consensus": int(consensus) if consensus and consensus.isdigit() else len(judges) // 2 + 1,
+    }
 
-    start = time.time()
-    result = call_llm(
-        provider=judge_provider,
-        prompt="",
-        user_input=formatted_prompt,
-        model=judge_model,
-        api_key=provider_config["api_key"],
-        endpoint=provider_config.get("endpoint"),
-    )
-    latency_ms = int((time.time() - start) * 1000)
 
-    if result.get("error"):
-        return {"error": result["error"]}
+def _cache_lookup(key):
+    try:
+        return get_judge_cache_entry(key, JUDGE_CACHE_TTL)
+    except Exception:
+        logger.exception("Judge cache lookup failed")
+        return None
+
+
+def _cache_store(judge, judge_prompt_id, judge_output, latency_ms):
+    global _stores_since_prune
+    try:
+        put_judge_cache_entry(
+            judge["cache_key"], judge["judge_provider"], judge["judge_model"], judge_prompt_id,
+            judge_output, latency_ms,
+        )
+        with _prune_lock:
+            _stores_since_prune += 1
+            due = _stores_since_prune >= PRUNE_EVERY
+            if due:
+                _stores_since_prune = 0
+        if due:
+            prune_judge_cache(JUDGE_CACHE_TTL)
+    except Exception:
+        logger.exception("Judge cache store failed")
+
 
+async def _save(rows, write_behind):
+    if write_behind:
+        # Raises the write error of any row that did not make it
+        await asyncio.gather(*(asyncio.wrap_future(writer.submit_judge_result(row)) for row in rows))
+    else:
+        await asyncio.to_thread(write_batch, judge_results=rows)
+
+
+def _parse_judge_output(text, run_prompt_id):
     try:
-        judge_output = json.loads(result["text"])
+        return json.loads(text)
     except json.JSONDecodeError:
-        text = result["text"]
         start_idx = text.find("{")
         end_idx = text.rfind("}") + 1
         if start_idx >= 0 and end_idx > start_idx:
             try:
-                judge_output = json.loads(text[start_idx:end_idx])
+                return json.loads(text[start_idx:end_idx])
             except json.JSONDecodeError:
-                logger.error("Judge output parse failed for run_prompt_id=%s", run_prompt_id)
-                judge_output = {"parse_error": True}
-        else:
-            logger.error("Judge output parse failed for run_prompt_id=%s", run_prompt_id)
-            judge_output = {"parse_error": True}
-
-    save_judge_result(
-        run_prompt_id=run_prompt_id,
-        judge_provider=judge_provider,
-        judge_model=judge_model,
-        judge_prompt_id=judge_prompt_id,
-        result_json=judge_output,
-        latency_ms=latency_ms,
+                pass
+        logger.error("Judge output parse failed for run_prompt_id=%s", run_prompt_id)
+        return {"parse_error": True}
+
+
+def _valid(judge_output):
+    return isinstance(judge_output, dict) and isinstance(judge_output.get("evaluations"), list)
+
+
+async def _aevaluate(request, judge, run_prompt_id, force_refresh):
+    """One judge's evaluation, from the cache or the judge model. Returns a dict with
+    result, latency_ms and cached, or with error. A cache hit carries the latency of the
+    original judge call and a result marked "cached": true."""
+    if JUDGE_CACHE_ENABLED and not force_refresh:
+        cached = await asyncio.to_thread(_cache_lookup, judge["cache_key"])
+        if cached is not None:
+            result = dict(cached["result_json"], cached=True)
+            return {"judge": judge, "result": result, "latency_ms": cached["latency_ms"] or 0, "cached": True}
+
+    logger.debug(
+        "Judge call provider=%s model=%s prompt_id=%s:\n%s",
+        judge["judge_provider"], judge["judge_model"], request["judge_prompt_id"], request["formatted_prompt"],
     )
 
-    return {"result": judge_output, "latency_ms": latency_ms}
+    start = time.time()
+    result = await acall_llm(
+        provider=judge["judge_provider"],
+        prompt="",
+        user_input=request["formatted_prompt"],
+        model=judge["judge_model"],
+        api_key=judge["provider_config"]["api_key"],
+        endpoint=judge["provider_config"].get("endpoint"),
+    )
+    latency_ms = int((time.time() - start) * 1000)
+
+    if result.get("error"):
+        return {"judge": judge, "error": result["error"]}
+
+    judge_output = _parse_judge_output(result["text"], run_prompt_id)
+    # Unparseable output is worth another try next time rather than being replayed
+    if JUDGE_CACHE_ENABLED and isinstance(judge_output, dict) and not judge_output.get("parse_error"):
+        await asyncio.to_thread(_cache_store, judge, request["judge_prompt_id"], judge_output, latency_ms)
+    return {"judge": judge, "result": judge_output, "latency_ms": latency_ms, "cached": False}
+
+
+def _row(run_prompt_id, request, judge_provider, judge_model, result_json, latency_ms, panel_id=None):
+    return {
+        "run_prompt_id": run_prompt_id,
+        "judge_provider": judge_provider,
+        "judge_model": judge_model,
+        "judge_prompt_id": request["judge_prompt_id"],
+        "result_json": result_json,
+        "latency_ms": latency_ms,
+        "panel_id": panel_id,
+    }
+
+
+def aggregate_panel(judge_outputs, method, labels):
+    """Combine several judges' evaluations into one in the same shape.
+
+    mean      each label scores the mean of its scores; the highest mean wins
+    majority  the label most judges named as winner wins (ties go to the higher mean)
+    borda     each judge awards a label one point per label it scored lower (half for a tie)
+
+    Labels no judge scored get a null score and cannot win. If no judge scored anything the
+    aggregate is a parse_error, like a single judge's unreadable output.
+    """
+    answered = len(judge_outputs)
+    judge_outputs = [j for j in judge_outputs if _valid(j)]
+    scores = {label: [] for label in labels}
+    points = dict.fromkeys(labels, 0.0)
+    votes = Counter()
+    for output in judge_outputs:
+        given = {}
+        for ev in output["evaluations"]:
+            if ev.get("model_label") in scores and isinstance(ev.get("score"), (int, float)):
+                given[ev["model_label"]] = ev["score"]
+        for label, score in given.items():
+            scores[label].append(score)
+            points[label] += sum(1.0 if score > other else 0.5 if score == other else 0.0
+                                 for other_label, other in given.items() if other_label != label)
+        if output.get("winner") in scores:
+            votes[output["winner"]] += 1
+
+    scored = [label for label in labels if scores[label]]
+    if not scored:
+        return {
+            "parse_error": True,
+            "judge_reasoning": f"None of {answered} judges returned a usable score",
+            "aggregation": method,
+        }
+    means = {label: sum(scores[label]) / len(scores[label]) for label in scored}
+    if method == "borda":
+        winner = max(scored, key=lambda label: (points[label], means[label]))
+    elif method == "majority":
+        winner = max(scored, key=lambda label: (votes[label], means[label]))
+    else:
+        winner = max(scored, key=lambda label: means[label])
+
+    evaluations = []
+    for label in labels:
+        evaluation = {
+            "model_label": label,
+            "score": round(means[label], 2) if label in means else None,
+            "comment": f"Mean of {len(scores[label])} judge score(s); chosen as winner by {votes[label]}",
+        }
+        if method == "borda":
+            evaluation["borda_points"] = points[label]
+        evaluations.append(evaluation)
+    return {
+        "evaluations": evaluations,
+        "winner": winner,
+        "judge_reasoning": f"{method} of {len(judge_outputs)} judges; {votes[winner]} named {winner} the winner",
+        "aggregation": method,
+    }
+
+
+async def _apanel(request, run_prompt_id, force_refresh):
+    """Run every judge concurrently; once `consensus` of them name the same winner, cancel the rest."""
+    calls = [asyncio.create_task(_aevaluate(request, judge, run_prompt_id, force_refresh))
+             for judge in request["judges"]]
+    pending = set(calls)
+    evaluations = []
+    votes = Counter()
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for call in done:
+                try:
+                    evaluation = call.result()
+                except Exception as e:
+                    logger.exception("Panel judge failed for run_prompt_id=%s", run_prompt_id)
+                    evaluation = {"error": str(e)}
+                evaluations.append(evaluation)
+                if _valid(evaluation.get("result")) and evaluation["result"].get("winner"):
+                    votes[evaluation["result"]["winner"]] += 1
+            if request["consensus"] and votes and votes.most_common(1)[0][1] >= request["consensus"]:
+                break
+    finally:
+        for call in pending:
+            call.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return evaluations, len(pending)
+
+
+async def arun_judge(run_prompt_id, outputs, user_prompt, num_models, write_behind=False, force_refresh=False):
+    """Judge a prompt's outputs and save the evaluation to judge_results.
+
+    A cached evaluation of the same inputs is saved without calling the judge, unless
+    force_refresh is set, in which case the judge is called and the cache entry replaced.
+
+    With a judge panel configured, all judges are asked concurrently and their scores
+    aggregated (judge_panel_aggregation). Each judge's result and the aggregate, saved
+    first so it is the one read as the prompt's judge result, share a panel_id.
+    """
+    # Settings lookups and the final insert are blocking DB calls; keep them off the event loop
+    request = await asyncio.to_thread(_prepare_judge, outputs, user_prompt, num_models)
+    if request.get("error"):
+        return request
+
+    if len(request["judges"]) == 1:
+        judge = request["judges"][0]
+        evaluation = await _aevaluate(request, judge, run_prompt_id, force_refresh)
+        if evaluation.get("error"):
+            return {"error": evaluation["error"]}
+        await _save([_row(
+            run_prompt_id, request, judge["judge_provider"], judge["judge_model"],
+            evaluation["result"], evaluation["latency_ms"],
+        )], write_behind)
+        return {"result": evaluation["result"], "latency_ms": evaluation["latency_ms"], "cached": evaluation["cached"]}
+
+    start = time.time()
+    evaluations, cancelled = await _apanel(request, run_prompt_id, force_refresh)
+    latency_ms = int((time.time() - start) * 1000)
+    answered = [e for e in evaluations if not e.get("error")]
+    if not answered:
+        return {"error": "; ".join(e["error"] for e in evaluations) or "No judge answered"}
+    if all(e["cached"] for e in answered):
+        # Wall time would only measure the lookups; report the slowest original judge call
+        latency_ms = max(e["latency_ms"] for e in answered)
+
+    panel_id = uuid.uuid4().hex
+    aggregate = aggregate_panel([e["result"] for e in answered], request["aggregation"], request["labels"])
+    aggregate["panel"] = {
+        "judges": [
+            {
+                "provider": e["judge"]["judge_provider"],
+                "model": e["judge"]["judge_model"],
+                "winner": e["result"].get("winner") if _valid(e["result"]) else None,
+                "cached": e["cached"],
+            }
+            for e in answered
+        ],
+        "failed": len(evaluations) - len(answered),
+        "cancelled": cancelled,
+    }
+    rows = [_row(run_prompt_id, request, "panel", request["aggregation"], aggregate, latency_ms, panel_id)]
+    rows += [
+        _row(run_prompt_id, request, e["judge"]["judge_provider"], e["judge"]["judge_model"],
+             e["result"], e["latency_ms"], panel_id)
+        for e in answered
+    ]
+    await _save(rows, write_behind)
+    return {
+        "result": aggregate,
+        "latency_ms": latency_ms,
+        "cached": all(e["cached"] for e in answered),
+        "panel_id": panel_id,
+    }
+
+
+def run_judge(run_prompt_id, outputs, user_prompt, num_models, force_refresh=False):
+    return run_sync(arun_judge(run_prompt_id, outputs, user_prompt, num_models, force_refresh=force_refresh))
@@ -0,0 +1,157 @@
+"""Content-addressed cache of LLM responses.
+
+Requests are keyed by a hash of everything that determines the answer (provider, model,
+endpoint, system prompt, input and extra params; never the API key). A bounded in-memory
+LRU sits in front of the llm_cache table; both expire entries LLM_CACHE_TTL_HOURS after they
+were stored, and the table is pruned back under LLM_CACHE_MAX_MB.
+
+Cache modes, chosen per run:
+    off           no lookup, nothing stored (default)
+    fresh         always call the provider, then refresh the cache
+    prefer_cache  serve from cache when possible, otherwise call and store
+    replay        serve from cache only; a miss is returned as an error
+"""
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from models import get_llm_cache_entry, put_llm_cache_entry, prune_llm_cache
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("off", "fresh", "prefer_cache", "replay")
+READ_MODES = ("prefer_cache", "replay")
+
+DEFAULT_MODE = os.environ.get("LLM_CACHE_DEFAULT_MODE", "off")
+MEMORY_ENTRIES = int(os.environ.get("LLM_CACHE_MEMORY_ENTRIES", "512"))
+TTL_SECONDS = float(os.environ.get("LLM_CACHE_TTL_HOURS", "720")) * 3600
+MAX_BYTES = int(float(os.environ.get("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024)
+PRUNE_EVERY = 100
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+_stores_since_prune = 0
+
+
+def resolve_mode(mode):
+    mode = mode or DEFAULT_MODE
+    return mode if mode in CACHE_MODES else "off"
+
+
+def request_key(provider, prompt, user_input, model, endpoint, params):
+    canonical = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "endpoint": endpoint or "",
+            "prompt": prompt or "",
+            "input": user_input,
+            "params": params or {},
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def mark(result, mode, hit, tier=None):
+    """Record the cache outcome in the result's usage so it lands in run_outputs.usage_data."""
+    usage = dict(result.get("usage") or {})
+    usage["cache"] = {"mode": mode, "hits": int(hit), "misses": int(not hit), "tier": tier}
+    result["usage"] = usage
+    return result
+
+
+def _memory_get(key):
+    with _lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= time.monotonic():
+            del _memory[key]
+            return None
+        _memory.move_to_end(key)
+        return copy.deepcopy(response)
+
+
+def _memory_put(key, response, ttl=TTL_SECONDS):
+    # Entries promoted from the table keep the table row's remaining lifetime
+    with _lock:
+        _memory[key] = (time.monotonic() + ttl, copy.deepcopy(response))
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _db_lookup(key):
+    try:
+        return get_llm_cache_entry(key, TTL_SECONDS)
+    except Exception:
+        logger.exception("LLM cache lookup failed")
+        return None
+
+
+def _db_store(key, provider, model, response):
+    global _stores_since_prune
+    try:
+        put_llm_cache_entry(key, provider, model, response)
+        with _lock:
+            _stores_since_prune += 1
+            due = _stores_since_prune >= PRUNE_EVERY
+            if due:
+                _stores_since_prune = 0
+        if due:
+            prune_llm_cache(TTL_SECONDS, MAX_BYTES)
+    except Exception:
+        logger.exception("LLM cache store failed")
+
+
+def _stored_response(result):
+    # Retry counts describe the call that filled the cache, not later hits
+    usage = {k: v for k, v in (result.get("usage") or {}).items() if k != "retries"}
+    return {"text": result.get("text", ""), "usage": usage, "model": result.get("model")}
+
+
+def lookup(key, mode):
+    """Return a cached result marked as a hit, or None."""
+    response = _memory_get(key)
+    if response is not None:
+        return mark(response, mode, hit=True, tier="memory")
+    entry = _db_lookup(key)
+    if entry is None:
+        return None
+    response, ttl = entry
+    _memory_put(key, response, ttl)
+    return mark(response, mode, hit=True, tier="db")
+
+
+async def alookup(key, mode):
+    response = _memory_get(key)
+    if response is not None:
+        return mark(response, mode, hit=True, tier="memory")
+    entry = await asyncio.to_thread(_db_lookup, key)
+    if entry is None:
+        return None
+    response, ttl = entry
+    _memory_put(key, response, ttl)
+    return mark(response, mode, hit=True, tier="db")
+
+
+def store(key, provider, result):
+    response = _stored_response(result)
+    _memory_put(key, response)
+    _db_store(key, provider, response["model"], response)
+
+
+async def astore(key, provider, result):
+    response = _stored_response(result)
+    _memory_put(key, response)
+    await asyncio.to_thread(_db_store, key, provider, response["model"], response)
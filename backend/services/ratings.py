@@ -0,0 +1,248 @@
+"""Bradley-Terry ratings from pairwise preferences.
+
+Every prompt's user scores and every judge evaluation rank the models it compared; each
+pair of models in it is one comparison, and a tie counts half to each side. Comparisons
+arrive from Postgres already aggregated per model pair and are kept in a few flat NumPy
+arrays (pair endpoints, wins each way, ties), which is all Bradley-Terry needs however
+many comparisons there are.
+
+The fit is Hunter's MM algorithm, vectorized over model pairs and over bootstrap
+replicates at once. Replicates redraw the comparisons with replacement (one multinomial
+draw over the pair/outcome cells) and are split across a thread pool, since NumPy
+releases the GIL. Strengths are reported on the Elo scale, centred on 1500.
+
+Fits are cached per source and judge template. A later request loads only comparisons
+added since the cached fit, folds them into its counts and refits starting from the
+previous strengths, which converges in a few iterations. Comparisons removed by deleting
+runs are dropped by a full refit at most RATINGS_FULL_REFIT_SECONDS after the last one.
+
+Loads are bounded by row ids, and ids are allocated before their rows commit, so a
+watermark is only used once every transaction that was running when it was read has
+finished. Until then the previous watermark stands, and a row that commits out of id
+order is still folded in exactly once. On a cold start, before any watermark has settled,
+the ids written by transactions that ended before the oldest running one began are used
+instead, so the first fit is not empty while writes are always in flight; the periodic
+full refit picks up the rare row that commits below them afterwards.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from models import get_committed_rating_watermarks, get_pairwise_counts, get_rating_watermarks
+
+RATING_SOURCES = ("all", "user", "judge")
+BOOTSTRAP = int(os.environ.get("RATINGS_BOOTSTRAP", "200"))
+BOOTSTRAP_WORKERS = int(os.environ.get("RATINGS_BOOTSTRAP_WORKERS", str(os.cpu_count() or 1)))
+FULL_REFIT_SECONDS = float(os.environ.get("RATINGS_FULL_REFIT_SECONDS", "3600"))
+# Virtual comparisons per pair, split evenly, so a model that never won still gets a finite rating
+PRIOR = 1.0
+TOLERANCE = 1e-7
+MAX_ITERATIONS = 2000
+CONFIDENCE = 0.95
+ELO_BASE = 1500
+ELO_SCALE = 400 / math.log(10)
+
+
+class _Comparisons:
+    """Outcome counts per model pair, growing as new comparisons are folded in."""
+
+    def __init__(self):
+        self.models = []
+        self._index = {}
+        self._pairs = {}
+        self.a = np.zeros(0, dtype=np.intp)
+        self.b = np.zeros(0, dtype=np.intp)
+        self.counts = np.zeros((0, 3), dtype=np.int64)
+
+    def _model(self, key):
+        if key not in self._index:
+            self._index[key] = len(self.models)
+            self.models.append(key)
+        return self._index[key]
+
+    def add(self, rows):
+        a, b, counts = list(self.a), list(self.b), self.counts.tolist()
+        for row in rows:
+            pair = (self._model((row["a_provider"], row["a_model"])), self._model((row["b_provider"], row["b_model"])))
+            if pair not in self._pairs:
+                self._pairs[pair] = len(a)
+                a.append(pair[0])
+                b.append(pair[1])
+                counts.append([0, 0, 0])
+            cell = counts[self._pairs[pair]]
+            cell[0] += row["a_wins"]
+            cell[1] += row["b_wins"]
+            cell[2] += row["ties"]
+        self.a = np.array(a, dtype=np.intp)
+        self.b = np.array(b, dtype=np.intp)
+        self.counts = np.array(counts, dtype=np.int64).reshape(-1, 3)
+
+
+def fit(a, b, counts, n_models, start=None):
+    """Bradley-Terry strengths for each row of counts (shape (..., pairs, 3): a wins, b wins,
+    ties). Returns (log strengths with mean 0, shape (..., n_models), iterations)."""
+    counts = np.asarray(counts, dtype=np.float64)
+    a_wins = counts[..., 0] + counts[..., 2] / 2 + PRIOR / 2
+    b_wins = counts[..., 1] + counts[..., 2] / 2 + PRIOR / 2
+    games = a_wins + b_wins
+    # Pair -> model incidence, so per-model sums over pairs are matrix products
+    a_onehot = np.zeros((len(a), n_models))
+    a_onehot[np.arange(len(a)), a] = 1
+    b_onehot = np.zeros((len(b), n_models))
+    b_onehot[np.arange(len(b)), b] = 1
+    incidence = a_onehot + b_onehot
+    wins = a_wins @ a_onehot + b_wins @ b_onehot
+
+    batch = counts.shape[:-2]
+    strength = np.ones(batch + (n_models,)) if start is None else np.broadcast_to(np.exp(start), batch + (n_models,))
+    iterations = 0
+    for iterations in range(1, MAX_ITERATIONS + 1):
+        per_pair = games / (strength[..., a] + strength[..., b])
+        updated = wins / (per_pair @ incidence)
+        # Strengths are only defined up to scale; pin the geometric mean to 1
+        updated /= np.exp(np.log(updated).mean(axis=-1, keepdims=True))
+        converged = np.max(np.abs(np.log(updated) - np.log(strength))) < TOLERANCE
+        strength = updated
+        if converged:
+            break
+    return np.log(strength), iterations
+
+
+def _bootstrap_chunk(comparisons, start, size, seed):
+    cells = comparisons.counts.ravel()
+    total = int(cells.sum())
+    rng = np.random.default_rng(seed)
+    draws = rng.multinomial(total, cells / total, size=size).reshape(size, -1, 3)
+    log_strength, _ = fit(comparisons.a, comparisons.b, draws, len(comparisons.models), start)
+    return log_strength
+
+
+def bootstrap(comparisons, start, replicates=BOOTSTRAP, workers=BOOTSTRAP_WORKERS):
+    """Log strengths of `replicates` bootstrap refits, shape (replicates, models)."""
+    sizes = [len(chunk) for chunk in np.array_split(np.arange(replicates), max(1, min(workers, replicates)))]
+    seeds = np.random.SeedSequence().spawn(len(sizes))
+    with ThreadPoolExecutor(max_workers=len(sizes)) as pool:
+        chunks = pool.map(lambda args: _bootstrap_chunk(comparisons, start, *args), zip(sizes, seeds))
+        return np.concatenate(list(chunks))
+
+
+def _elo(log_strength):
+    return ELO_BASE + ELO_SCALE * log_strength
+
+
+class _Fit:
+    def __init__(self):
+        self.comparisons = _Comparisons()
+        self.watermarks = (0, 0)
+        self.log_strength = None
+        self.result = None
+        self.full_at = 0.0
+
+
+_fits = {}
+_lock = threading.Lock()
+# Watermarks read but not yet settled, as (snapshot xmax, watermarks), oldest first
+_unsettled = deque(maxlen=1000)
+_settled = (0, 0)
+
+
+def _settled_watermarks():
+    """The newest watermarks no transaction can still add rows below. Lock must be held."""
+    global _settled
+    score_id, judge_id, xmin, xmax = get_rating_watermarks()
+    _unsettled.append((xmax, (score_id, judge_id)))
+    while _unsettled and _unsettled[0][0] <= xmin:
+        # MAX(id) drops when the newest rows are deleted; never move a watermark back
+        _settled = tuple(map(max, _settled, _unsettled.popleft()[1]))
+    if _settled == (0, 0):
+        _settled = tuple(get_committed_rating_watermarks())
+    return _settled
+
+
+def _refit(state, incremental):
+    comparisons = state.comparisons
+    n_models = len(comparisons.models)
+    if not n_models:
+        return {
+            "models": [],
+            "comparisons": 0,
+            "iterations": 0,
+            "bootstrap": BOOTSTRAP,
+            "incremental": incremental,
+            "fitted_at": datetime.now(timezone.utc).isoformat(),
+        }
+    start = None
+    if incremental and state.log_strength is not None:
+        # Warm start; models seen for the first time start at the mean
+        start = np.zeros(n_models)
+        start[:len(state.log_strength)] = state.log_strength
+    log_strength, iterations = fit(comparisons.a, comparisons.b, comparisons.counts, n_models, start)
+    state.log_strength = log_strength
+
+    ratings = _elo(log_strength)
+    low = high = [None] * n_models
+    if BOOTSTRAP > 0:
+        samples = _elo(bootstrap(comparisons, log_strength))
+        tail = (1 - CONFIDENCE) / 2 * 100
+        low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+
+    wins = np.zeros(n_models)
+    losses = np.zeros(n_models)
+    ties = np.zeros(n_models)
+    np.add.at(wins, comparisons.a, comparisons.counts[:, 0])
+    np.add.at(wins, comparisons.b, comparisons.counts[:, 1])
+    np.add.at(losses, comparisons.a, comparisons.counts[:, 1])
+    np.add.at(losses, comparisons.b, comparisons.counts[:, 0])
+    np.add.at(ties, comparisons.a, comparisons.counts[:, 2])
+    np.add.at(ties, comparisons.b, comparisons.counts[:, 2])
+
+    models = []
+    for i, (provider, model) in enumerate(comparisons.models):
+        models.append({
+            "provider": provider,
+            "model": model,
+            "rating": round(float(ratings[i]), 1),
+            "ci_low": None if low[i] is None else round(float(low[i]), 1),
+            "ci_high": None if high[i] is None else round(float(high[i]), 1),
+            "wins": int(wins[i]),
+            "losses": int(losses[i]),
+            "ties": int(ties[i]),
+        })
+    models.sort(key=lambda m: m["rating"], reverse=True)
+    return {
+        "models": models,
+        "comparisons": int(comparisons.counts.sum()),
+        "iterations": iterations,
+        "bootstrap": BOOTSTRAP,
+        "incremental": incremental,
+        "fitted_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def get_ratings(source="all", judge_prompt_id=None):
+    """Current ratings for source ("all", "user" or "judge"), refitting only if comparisons
+    were added since the cached fit."""
+    sources = ("user", "judge") if source == "all" else (source,)
+    key = (source, judge_prompt_id)
+    with _lock:
+        state = _fits.get(key)
+        watermarks = _settled_watermarks()
+        full = state is None or time.monotonic() - state.full_at >= FULL_REFIT_SECONDS
+        if not full and watermarks == state.watermarks:
+            return state.result
+        if full:
+            state = _Fit()
+            state.full_at = time.monotonic()
+        state.comparisons.add(get_pairwise_counts(sources, judge_prompt_id, state.watermarks, watermarks))
+        state.watermarks = watermarks
+        state.result = _refit(state, incremental=not full)
+        # Nothing rated yet; keep no state so the first comparisons are fitted as they land
+        if watermarks != (0, 0):
+            _fits[key] = state
+        return state.result
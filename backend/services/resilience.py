@@ -0,0 +1,238 @@
+"""Retry policies and circuit breakers for LLM provider calls.
+
+Retries use exponential backoff with full jitter and honor Retry-After (or OpenAI's
+retry-after-ms). Only errors where a repeat is safe and likely to help are retried:
+429, 408/425, 5xx (including Anthropic's 529 "overloaded"), and transport failures such
+as refused or reset connections. Read timeouts are not retried since they have already
+spent the whole timeout, and other 4xx errors will not change on a second attempt.
+
+Each provider has a circuit breaker. After LLM_BREAKER_FAILURES consecutive calls fail
+with a sign the provider is down (5xx, timeouts, connection errors) it opens and calls
+fail fast for LLM_BREAKER_RESET_SECONDS; then a single trial call decides whether it
+closes again.
+
+Limits can be overridden per provider, e.g. LLM_RETRY_OPENAI_MAX_RETRIES.
+
+Successful call latencies are tracked per provider and model; hedge_delay() returns their
+LLM_HEDGE_QUANTILE, the point after which acall_llm may send a duplicate request.
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+import requests
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504, 529}
+# Failures where the request never produced a response we could use and repeating it is safe
+SAFE_TRANSPORT_ERRORS = (
+    requests.ConnectionError,
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    httpx.ReadError,
+    httpx.WriteError,
+    httpx.RemoteProtocolError,
+)
+# Failures that suggest the provider itself is unavailable
+OUTAGE_ERRORS = (requests.ConnectionError, requests.Timeout, httpx.TransportError)
+
+HEDGE_QUANTILE = float(os.environ.get("LLM_HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+
+
+def _setting(prefix, provider, name, default):
+    value = os.environ.get(f"{prefix}_{provider.upper()}_{name}")
+    if value is None:
+        value = os.environ.get(f"{prefix}_{name}", default)
+    return float(value)
+
+
+def error_status(exc):
+    """HTTP status of a provider error: requests/httpx responses, or the Gemini SDK's code."""
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is None:
+        status = getattr(exc, "code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after(exc):
+    """Seconds the provider asked us to wait, from retry-after-ms or Retry-After, or None."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class RetryPolicy:
+    def __init__(self, max_retries, base_delay, max_delay):
+        self.max_retries = int(max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def retryable(self, exc):
+        if isinstance(exc, (CircuitOpenError, TimeoutError)):
+            return False
+        status = error_status(exc)
+        if status is not None:
+            return status in RETRY_STATUSES
+        return isinstance(exc, SAFE_TRANSPORT_ERRORS)
+
+    def delay(self, exc, retries):
+        """Seconds to wait before the next attempt, or None to give up."""
+        if retries >= self.max_retries or not self.retryable(exc):
+            return None
+        wait = retry_after(exc)
+        if wait is not None:
+            # A provider asking for longer than we are willing to wait (e.g. an exhausted
+            # daily quota) is a failure, not something to sleep through
+            if wait > self.max_delay:
+                return None
+            return wait + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retries))
+
+
+class CircuitBreaker:
+    def __init__(self, provider, failure_threshold, reset_seconds):
+        self.provider = provider
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_started = now
+                return True
+            # A trial that never reported back (e.g. cancelled) doesn't hold the breaker forever
+            if self.state == "half_open" and now - self._trial_started >= self.reset_seconds:
+                self._trial_started = now
+                return True
+            return False
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(f"[{self.provider}] circuit open after repeated failures; failing fast")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self, exc):
+        if isinstance(exc, DeadlineExceeded):
+            # Our own budget ran out; says nothing about the provider's health
+            return
+        status = error_status(exc)
+        outage = (status is not None and status >= 500) or (status is None and isinstance(exc, OUTAGE_ERRORS))
+        if not outage:
+            # The provider answered, so it is up even if this request was rejected
+            self.record_success()
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "retry_in": (
+                    round(max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at)), 1)
+                    if self.state == "open" else None
+                ),
+            }
+
+
+_policies = {}
+_breakers = {}
+_lock = threading.Lock()
+
+
+def policy(provider):
+    with _lock:
+        if provider not in _policies:
+            _policies[provider] = RetryPolicy(
+                max_retries=_setting("LLM_RETRY", provider, "MAX_RETRIES", "2"),
+                base_delay=_setting("LLM_RETRY", provider, "BASE_DELAY", "0.5"),
+                max_delay=_setting("LLM_RETRY", provider, "MAX_DELAY", "30"),
+            )
+        return _policies[provider]
+
+
+def breaker(provider):
+    with _lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(
+                provider,
+                failure_threshold=_setting("LLM_BREAKER", provider, "FAILURES", "5"),
+                reset_seconds=_setting("LLM_BREAKER", provider, "RESET_SECONDS", "30"),
+            )
+        return _breakers[provider]
+
+
+def breakers_snapshot():
+    with _lock:
+        breakers = list(_breakers.values())
+    return [b.snapshot() for b in breakers]
+
+
+_latencies = {}
+
+
+def record_latency(provider, model, seconds):
+    with _lock:
+        samples = _latencies.get((provider, model))
+        if samples is None:
+            samples = _latencies[(provider, model)] = deque(maxlen=LATENCY_WINDOW)
+        samples.append(seconds)
+
+
+def hedge_delay(provider, model):
+    """Seconds to wait before hedging a call, or None until enough latencies are known."""
+    with _lock:
+        samples = sorted(_latencies.get((provider, model), ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return samples[int(HEDGE_QUANTILE * (len(samples) - 1))]
@@ -1,21 +1,51 @@
+import asyncio
+import os
+import queue
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
-from llmcalls import call_llm
+from llmcalls import acall_llm, stream_llm
 from models import (
     get_provider,
     add_run_output,
-    add_run_prompt,
-    update_run_status,
+    add_run_outputs,
+    clear_prompt_results,
+    enqueue_autorun,
+    get_prompt_outputs,
 )
+from services.batch_writer import writer
+from utils.aio import run_sync
 
+# End-to-end budget for one comparison (per prompt in an autorun); requests may set their own
+RUN_TIMEOUT = float(os.environ.get("LLM_RUN_TIMEOUT", "120"))
+# Whether single runs hedge slow calls unless the request says otherwise
+HEDGE_DEFAULT = os.environ.get("LLM_HEDGE_DEFAULT", "0") == "1"
 
-def execute_comparison(prompt_text, models_config, run_prompt_id):
-    """Call 2-3 LLMs in parallel for a single prompt. Returns list of result dicts."""
 
-    def call_single(cfg):
-        provider_config = get_provider(cfg["provider"])
+def _deadline(timeout):
+    return time.monotonic() + (timeout or RUN_TIMEOUT)
+
+
+def _load_provider_configs(models_config):
+    return {cfg["provider"]: get_provider(cfg["provider"]) for cfg in models_config}
+
+
+async def acompare(prompt_text, models_config, run_prompt_id, cache_mode=None, write_behind=False,
+                   deadline=None, hedge=False):
+    """Call 2-3 LLMs concurrently on the shared event loop. Returns list of result dicts.
+
+    Every call gives up at deadline (a time.monotonic() value, default RUN_TIMEOUT from now),
+    so one stuck model cannot hold up the others. All outputs are saved with one multi-row
+    insert. With write_behind=True they go through the batch writer instead, sharing its
+    inserts with other prompts; a failed write is raised here rather than lost.
+    """
+    if deadline is None:
+        deadline = _deadline(None)
+    provider_configs = await asyncio.to_thread(_load_provider_configs, models_config)
+
+    async def call_single(cfg):
+        provider_config = provider_configs.get(cfg["provider"])
         if not provider_config or not provider_config.get("api_key"):
             return {
                 "text": "",
@@ -27,23 +57,111 @@ def execute_comparison(prompt_text, models_config, run_prompt_id):
             }
 
         start = time.time()
-        result = call_llm(
+        result = await acall_llm(
             provider=cfg["provider"],
             prompt="",
             user_input=prompt_text,
             model=cfg["model"],
             api_key=provider_config["api_key"],
             endpoint=provider_config.get("endpoint"),
+            cache_mode=cache_mode,
+            deadline=deadline,
+            hedge=hedge,
         )
         result["latency_ms"] = int((time.time() - start) * 1000)
         return result
 
-    results = []
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        future_to_cfg = {executor.submit(call_single, cfg): cfg for cfg in models_config}
-        for future in as_completed(future_to_cfg):
-            result = future.result()
-            output_id = add_run_output(
+    results = await asyncio.gather(*(call_single(cfg) for cfg in models_config))
+    rows = [
+        {
+            "run_prompt_id": run_prompt_id,
+            "provider": result["provider"],
+            "model": result["model"],
+            "output_text": result.get("text", ""),
+            "usage_data": result.get("usage"),
+            "latency_ms": result.get("latency_ms", 0),
+            "error": result.get("error"),
+        }
+        for result in results
+    ]
+    if write_behind:
+        # Wait for this prompt's rows only; they share a batch with other prompts' rows
+        output_ids = await asyncio.gather(*(asyncio.wrap_future(writer.submit_output(row)) for row in rows))
+    else:
+        output_ids = await asyncio.to_thread(add_run_outputs, rows)
+    for result, output_id in zip(results, output_ids):
+        result["output_id"] = output_id
+    return list(results)
+
+
+def execute_comparison(prompt_text, models_config, run_prompt_id, cache_mode=None, timeout=None, hedge=None):
+    """Call 2-3 LLMs in parallel for a single prompt. Returns list of result dicts."""
+    hedge = HEDGE_DEFAULT if hedge is None else hedge
+    return run_sync(acompare(
+        prompt_text, models_config, run_prompt_id, cache_mode, deadline=_deadline(timeout), hedge=hedge,
+    ))
+
+
+def stream_comparison(prompt_text, models_config, run_prompt_id, cache_mode=None, timeout=None):
+    """Stream 2-3 LLMs in parallel for a single prompt.
+
+    Yields ("delta", {...}) events tagged with the model's index as tokens arrive, and one
+    ("done", result) event per model once its final output has been saved.
+    """
+    events = queue.Queue()
+    cancelled = threading.Event()
+    deadline = _deadline(timeout)
+
+    def stream_single(index, cfg):
+        result = None
+        try:
+            provider_config = get_provider(cfg["provider"])
+            if not provider_config or not provider_config.get("api_key"):
+                result = {
+                    "text": "",
+                    "usage": {},
+                    "model": cfg["model"],
+                    "provider": cfg["provider"],
+                    "error": f"Provider '{cfg['provider']}' not configured",
+                    "latency_ms": 0,
+                }
+            else:
+                start = time.time()
+                parts = []
+                stream = stream_llm(
+                    provider=cfg["provider"],
+                    prompt="",
+                    user_input=prompt_text,
+                    model=cfg["model"],
+                    api_key=provider_config["api_key"],
+                    endpoint=provider_config.get("endpoint"),
+                    cache_mode=cache_mode,
+                    deadline=deadline,
+                )
+                for kind, payload in stream:
+                    if kind == "done":
+                        result = payload
+                        break
+                    parts.append(payload)
+                    events.put(("delta", {
+                        "index": index,
+                        "provider": cfg["provider"],
+                        "model": cfg["model"],
+                        "text": payload,
+                    }))
+                    if cancelled.is_set():
+                        stream.close()
+                        result = {
+                            "text": "".join(parts),
+                            "usage": {},
+                            "model": cfg["model"],
+                            "provider": cfg["provider"],
+                            "error": "Stream cancelled",
+                        }
+                        break
+                result["latency_ms"] = int((time.time() - start) * 1000)
+
+            result["output_id"] = add_run_output(
                 run_prompt_id=run_prompt_id,
                 provider=result["provider"],
                 model=result["model"],
@@ -52,31 +170,69 @@ def execute_comparison(prompt_text, models_config, run_prompt_id):
                 latency_ms=result.get("latency_ms", 0),
                 error=result.get("error"),
             )
-            result["output_id"] = output_id
-            results.append(result)
+        except Exception as e:
+            result = dict(result or {"text": "", "usage": {}, "model": cfg["model"], "provider": cfg["provider"]})
+            result["error"] = result.get("error") or str(e)
+        finally:
+            result["index"] = index
+            events.put(("done", result))
+
+    executor = ThreadPoolExecutor(max_workers=3)
+    for index, cfg in enumerate(models_config):
+        executor.submit(stream_single, index, cfg)
+    try:
+        remaining = len(models_config)
+        while remaining:
+            kind, payload = events.get()
+            if kind == "done":
+                remaining -= 1
+            yield kind, payload
+    finally:
+        # If the client went away, let workers stop at their next token instead of blocking here
+        cancelled.set()
+        executor.shutdown(wait=False)
+
 
+async def arun_autorun_compare(task):
+    """Compare stage of an autorun task: call the models on its prompt and save the outputs.
+
+    A task on its second or later attempt first clears what an interrupted attempt left behind.
+    """
+    params = task["params"] or {}
+    if task["attempts"] > 1:
+        await asyncio.to_thread(clear_prompt_results, task["run_prompt_id"])
+    results = await acompare(
+        task["prompt_text"],
+        task["models_config"],
+        task["run_prompt_id"],
+        params.get("cache_mode"),
+        write_behind=True,
+        deadline=_deadline(params.get("timeout")),
+    )
     return results
 
 
-def start_autorun(run_id, prompts, models_config, judge_enabled=False):
-    """Start autorun in a background thread. Processes prompts sequentially."""
-    from services.judge_service import run_judge
+async def arun_autorun_judge(task, results=None):
+    """Judge stage of an autorun task. Without results (a retry that resumes at this stage),
+    the prompt's saved outputs are judged."""
+    from services.judge_service import arun_judge
 
-    def _run():
-        try:
-            for i, prompt_text in enumerate(prompts):
-                run_prompt_id = add_run_prompt(run_id, prompt_text, sequence_num=i + 1)
-                results = execute_comparison(prompt_text, models_config, run_prompt_id)
-                if judge_enabled and results:
-                    run_judge(
-                        run_prompt_id=run_prompt_id,
-                        outputs=results,
-                        user_prompt=prompt_text,
-                        num_models=len(results),
-                    )
-            update_run_status(run_id, "completed")
-        except Exception:
-            update_run_status(run_id, "failed")
-
-    thread = threading.Thread(target=_run, daemon=True)
-    thread.start()
+    if results is None:
+        await asyncio.to_thread(clear_prompt_results, task["run_prompt_id"], outputs=False)
+        results = await asyncio.to_thread(get_prompt_outputs, task["run_prompt_id"])
+    if results:
+        await arun_judge(
+            run_prompt_id=task["run_prompt_id"],
+            outputs=results,
+            user_prompt=task["prompt_text"],
+            num_models=len(results),
+            write_behind=True,
+        )
+
+
+def start_autorun(run_id, prompts, models_config, judge_enabled=False, cache_mode=None, timeout=None):
+    """Queue an autorun. Its prompts are executed by autorun workers (services/job_queue.py).
+
+    timeout bounds each prompt's comparison, counted from when the prompt starts.
+    """
+    enqueue_autorun(run_id, prompts, {"cache_mode": cache_mode, "timeout": timeout})
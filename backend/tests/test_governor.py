@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+import llmcalls
+from services import governor as governor_module, resilience
+from services.governor import DECREASE_COOLDOWN, Governor, Limiter, PermitTimeout, _Waiter
+
+
+class Recorder:
+    def __init__(self, model="m"):
+        self.waiter = _Waiter(model, 10, self.wake)
+        self.woken = False
+
+    def wake(self):
+        self.woken = True
+
+
+def enqueue(limiter, model="m"):
+    recorder = Recorder(model)
+    limiter.enqueue(recorder.waiter)
+    return recorder
+
+
+def test_concurrency_limit_queues_in_order():
+    limiter = Limiter(("p",), rpm=0, tpm=0, max_concurrency=2)
+    first, second, third = (enqueue(limiter) for _ in range(3))
+    assert (first.woken, second.woken, third.woken) == (True, True, False)
+    limiter.release("m", 10)
+    assert third.woken
+
+
+def test_model_at_its_limit_does_not_hold_up_other_models():
+    limiter = Limiter(("p",), rpm=0, tpm=0, max_concurrency=1)
+    enqueue(limiter, "slow")
+    blocked = enqueue(limiter, "slow")
+    other = enqueue(limiter, "fast")
+    assert not blocked.woken
+    assert other.woken
+
+
+def test_rate_limit_halves_only_that_model_once_per_cooldown():
+    limiter = Limiter(("p",), rpm=0, tpm=0, max_concurrency=8)
+    for model in ("a", "a", "b"):
+        enqueue(limiter, model)
+    limiter.release("a", 10, rate_limited=True)
+    limiter.release("a", 10, rate_limited=True)
+    models = {m["model"]: m for m in limiter.snapshot()["models"]}
+    assert models["a"]["concurrency_limit"] == 4
+    assert models["a"]["rate_limited"] == 2
+    assert models["b"]["concurrency_limit"] == 8
+
+
+def test_latency_degradation_backs_off_only_the_slow_model(monkeypatch):
+    limiter = Limiter(("p",), rpm=0, tpm=0, max_concurrency=8)
+    usage = {"prompt_tokens": 0, "completion_tokens": 10}
+    now = [1000.0]
+    monkeypatch.setattr(governor_module.time, "monotonic", lambda: now[0])
+    for model in ("slow", "fast"):
+        enqueue(limiter, model)
+        limiter.release(model, 10, usage=usage, latency=1.0)
+    now[0] += DECREASE_COOLDOWN
+    for model, latency in (("slow", 10.0), ("fast", 1.0)):
+        enqueue(limiter, model)
+        limiter.release(model, 10, usage=usage, latency=latency)
+    models = {m["model"]: m for m in limiter.snapshot()["models"]}
+    assert models["slow"]["concurrency_limit"] == pytest.approx(7.2)
+    assert models["fast"]["concurrency_limit"] == 8
+
+
+def test_request_budget_holds_waiters_until_refill():
+    limiter = Limiter(("p",), rpm=1, tpm=0, max_concurrency=8)
+    first = enqueue(limiter)
+    second = enqueue(limiter)
+    try:
+        assert first.woken and not second.woken
+        assert limiter.snapshot()["queued"] == 1
+    finally:
+        limiter._timer.cancel()
+
+
+def test_abandoning_a_granted_waiter_returns_its_slot():
+    limiter = Limiter(("p",), rpm=0, tpm=0, max_concurrency=1)
+    first = enqueue(limiter)
+    second = enqueue(limiter)
+    limiter.abandon(first.waiter)
+    assert second.woken
+    assert limiter.snapshot()["in_flight"] == 1
+
+
+def test_acquire_times_out_with_permit_timeout(monkeypatch):
+    monkeypatch.setenv("LLM_GOVERNOR_MAX_CONCURRENCY", "1")
+    governor = Governor(scope="provider")
+    governor.acquire("p", "m", None, 10)
+    with pytest.raises(PermitTimeout):
+        governor.acquire("p", "m", None, 10, timeout=0.01)
+    assert governor.snapshot()[0]["queued"] == 0
+
+
+def test_permit_timeout_leaves_the_breaker_alone(monkeypatch):
+    async def no_permit(*args, **kwargs):
+        raise PermitTimeout("[openai] no rate limit slot within the deadline")
+
+    monkeypatch.setattr(llmcalls.governor, "aacquire", no_permit)
+    breaker = resilience.breaker("openai")
+    monkeypatch.setattr(breaker, "failures", 2)
+    result = asyncio.run(llmcalls._ainvoke("openai", "", "hi", "gpt", "key", None, {}))
+    assert result["error"]
+    assert breaker.failures == 2
@@ -0,0 +1,61 @@
+import pytest
+
+from services.judge_service import aggregate_panel
+
+LABELS = ["Model A", "Model B", "Model C"]
+
+
+def judged(winner, **scores):
+    return {
+        "evaluations": [
+            {"model_label": f"Model {label}", "score": score, "comment": ""} for label, score in scores.items()
+        ],
+        "winner": f"Model {winner}",
+        "judge_reasoning": "",
+    }
+
+
+def by_label(aggregate, key="score"):
+    return {e["model_label"]: e.get(key) for e in aggregate["evaluations"]}
+
+
+def test_mean_averages_scores_and_picks_the_highest():
+    aggregate = aggregate_panel([judged("A", A=8, B=6, C=5), judged("B", A=6, B=9, C=5)], "mean", LABELS)
+    assert by_label(aggregate) == {"Model A": 7, "Model B": 7.5, "Model C": 5}
+    assert aggregate["winner"] == "Model B"
+    assert aggregate["aggregation"] == "mean"
+
+
+def test_majority_counts_winner_votes_and_breaks_ties_on_mean():
+    outputs = [judged("A", A=7, B=6), judged("A", A=6, B=9), judged("B", A=5, B=9)]
+    assert aggregate_panel(outputs, "majority", LABELS)["winner"] == "Model A"
+    tied = [judged("A", A=7, B=6), judged("B", A=5, B=9)]
+    assert aggregate_panel(tied, "majority", LABELS)["winner"] == "Model B"
+
+
+def test_borda_awards_points_per_label_beaten_and_half_for_ties():
+    aggregate = aggregate_panel([judged("A", A=9, B=5, C=5), judged("B", A=6, B=8, C=6)], "borda", LABELS)
+    assert by_label(aggregate, "borda_points") == {"Model A": 2.5, "Model B": 2.5, "Model C": 1.0}
+    # Equal points: the higher mean wins
+    assert aggregate["winner"] == "Model A"
+
+
+def test_label_no_judge_scored_gets_null_and_cannot_win():
+    aggregate = aggregate_panel([judged("C", A=4, B=6)], "majority", LABELS)
+    assert by_label(aggregate)["Model C"] is None
+    assert aggregate["winner"] == "Model B"
+
+
+def test_unusable_outputs_and_scores_are_ignored():
+    outputs = [{"parse_error": True}, judged("A", A="n/a", B=7), judged("D", A=3, B=5)]
+    aggregate = aggregate_panel(outputs, "mean", LABELS)
+    assert by_label(aggregate) == {"Model A": 3, "Model B": 6, "Model C": None}
+    assert aggregate["winner"] == "Model B"
+
+
+@pytest.mark.parametrize("method", ["mean", "majority", "borda"])
+def test_no_usable_score_is_a_parse_error(method):
+    aggregate = aggregate_panel([{"parse_error": True}, judged("A", A=None)], method, LABELS)
+    assert aggregate["parse_error"] is True
+    assert "evaluations" not in aggregate
+    assert aggregate["judge_reasoning"] == "None of 2 judges returned a usable score"
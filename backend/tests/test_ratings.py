@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from services import ratings
+from services.ratings import _Comparisons, bootstrap, fit
+
+# Pairs (0, 1), (1, 2), (0, 2)
+A = np.array([0, 1, 0])
+B = np.array([1, 2, 2])
+
+
+def expected_counts(strength, games):
+    """Counts a Bradley-Terry model with these strengths predicts for `games` per pair."""
+    p = strength[A] / (strength[A] + strength[B])
+    return np.stack([games * p, games * (1 - p), np.zeros(len(A))], axis=-1)
+
+
+def comparisons(counts):
+    result = _Comparisons()
+    result.add(
+        {"a_provider": "p", "a_model": str(a), "b_provider": "p", "b_model": str(b),
+         "a_wins": int(c[0]), "b_wins": int(c[1]), "ties": int(c[2])}
+        for a, b, c in zip(A, B, counts)
+    )
+    return result
+
+
+def test_fit_recovers_known_strengths():
+    strength = np.array([4.0, 2.0, 1.0])
+    log_strength, iterations = fit(A, B, expected_counts(strength, 1e6), 3)
+    assert log_strength == pytest.approx(np.log(strength) - np.log(strength).mean(), abs=1e-3)
+    assert log_strength.mean() == pytest.approx(0, abs=1e-12)
+    assert 1 < iterations < ratings.MAX_ITERATIONS
+
+
+def test_ties_count_half_to_each_side():
+    log_strength, _ = fit(A, B, [[0, 0, 10]] * 3, 3)
+    assert log_strength == pytest.approx(np.zeros(3), abs=1e-6)
+
+
+def test_model_that_never_won_gets_a_finite_rating():
+    log_strength, _ = fit(A, B, [[10, 0, 0], [10, 0, 0], [10, 0, 0]], 3)
+    assert np.all(np.isfinite(log_strength))
+    assert log_strength[0] > log_strength[1] > log_strength[2]
+
+
+def test_batched_fit_matches_separate_fits():
+    first = expected_counts(np.array([3.0, 1.0, 2.0]), 50)
+    second = expected_counts(np.array([1.0, 1.0, 5.0]), 80)
+    batched, _ = fit(A, B, np.stack([first, second]), 3)
+    assert batched[0] == pytest.approx(fit(A, B, first, 3)[0], abs=1e-6)
+    assert batched[1] == pytest.approx(fit(A, B, second, 3)[0], abs=1e-6)
+
+
+def test_warm_start_converges_to_the_same_fit_faster():
+    counts = expected_counts(np.array([4.0, 2.0, 1.0]), 1000)
+    cold, cold_iterations = fit(A, B, counts, 3)
+    warm, warm_iterations = fit(A, B, counts, 3, start=cold)
+    assert warm == pytest.approx(cold, abs=1e-6)
+    assert warm_iterations < cold_iterations
+
+
+def test_bootstrap_returns_one_fit_per_replicate_around_the_fit():
+    data = comparisons(expected_counts(np.array([4.0, 2.0, 1.0]), 2000).round())
+    log_strength, _ = fit(data.a, data.b, data.counts, 3)
+    samples = bootstrap(data, log_strength, replicates=30, workers=4)
+    assert samples.shape == (30, 3)
+    assert samples.mean(axis=0) == pytest.approx(log_strength, abs=0.05)
+    assert np.all(samples.std(axis=0) > 0)
+
+
+def test_cold_start_uses_committed_watermarks_and_keeps_them(monkeypatch):
+    # A transaction is always in flight, so no read ever settles on its own
+    monkeypatch.setattr(ratings, "_unsettled", type(ratings._unsettled)(maxlen=10))
+    monkeypatch.setattr(ratings, "_settled", (0, 0))
+    monkeypatch.setattr(ratings, "get_rating_watermarks", lambda: (9, 4, 100, 101))
+    monkeypatch.setattr(ratings, "get_committed_rating_watermarks", lambda: (7, 3))
+    assert ratings._settled_watermarks() == (7, 3)
+    monkeypatch.setattr(ratings, "get_committed_rating_watermarks", lambda: (5, 2))
+    assert ratings._settled_watermarks() == (7, 3)
+
+
+def test_empty_result_is_not_cached(monkeypatch):
+    monkeypatch.setattr(ratings, "_fits", {})
+    monkeypatch.setattr(ratings, "_settled_watermarks", lambda: (0, 0))
+    monkeypatch.setattr(ratings, "get_pairwise_counts", lambda *args: [])
+    assert ratings.get_ratings("user")["models"] == []
+    assert ratings._fits == {}
@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.errors import ValidationError
+from utils.validators import _decode_cursor, encode_cursor, parse_search_args
+
+
+def test_search_cursor_round_trip():
+    cursor = encode_cursor(0.0607927, "output", 42)
+    search = parse_search_args({"q": "zebra", "cursor": cursor})
+    assert search["after"] == (0.0607927, "output", 42)
+
+
+def test_cursor_has_no_padding_and_is_url_safe():
+    cursor = encode_cursor(1.5, "prompt", 7)
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+
+
+def test_cursor_encodes_datetimes_as_iso():
+    moment = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert _decode_cursor(encode_cursor(moment, 9)) == ["2026-01-02T03:04:05+00:00", 9]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor(1.0, "prompt"), encode_cursor("x", "prompt", 1)])
+def test_bad_search_cursor_is_rejected(cursor):
+    with pytest.raises(ValidationError):
+        parse_search_args({"q": "zebra", "cursor": cursor})
+
+
+def test_substring_search_needs_three_characters():
+    with pytest.raises(ValidationError):
+        parse_search_args({"q": "ab", "match": "substring"})
+    assert parse_search_args({"q": "abc", "match": "substring"})["match"] == "substring"
@@ -0,0 +1,33 @@
+import asyncio
+import threading
+
+_loop = None
+_loop_thread = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """Return the process-wide event loop, starting its thread on first use."""
+    global _loop, _loop_thread
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llmwars-aio", daemon=True)
+                thread.start()
+                _loop, _loop_thread = loop, thread
+    return _loop
+
+
+def submit(coro):
+    """Schedule a coroutine on the shared loop without waiting. Returns a concurrent Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run_sync(coro, timeout=None):
+    """Run a coroutine on the shared loop and block the calling thread until it finishes."""
+    loop = get_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("run_sync() called from the event loop thread; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result(timeout)
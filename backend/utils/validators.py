@@ -1,5 +1,19 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from models import SEARCH_MATCHES, SEARCH_SCOPES
+from services.judge_service import PANEL_AGGREGATIONS
+from services.llm_cache import CACHE_MODES
+
 from .errors import ValidationError
 
+MAX_PAGE_SIZE = 200
+MAX_SEARCH_LENGTH = 500
+# Trigram indexes cannot narrow down shorter substrings
+MIN_SUBSTRING_LENGTH = 3
+
 
 def require_fields(data, fields):
     missing = [f for f in fields if f not in data or data[f] is None]
@@ -21,3 +35,156 @@ def validate_prompts(prompts):
     for p in prompts:
         if not isinstance(p, str) or not p.strip():
             raise ValidationError("Each prompt must be a non-empty string")
+
+
+def validate_cache_mode(mode):
+    if mode is not None and mode not in CACHE_MODES:
+        raise ValidationError(f"cache_mode must be one of: {', '.join(CACHE_MODES)}")
+
+
+def validate_timeout(timeout):
+    if timeout is None:
+        return
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not 0 < timeout <= 600:
+        raise ValidationError("timeout_seconds must be a number between 0 and 600")
+
+
+def validate_judge_panel_settings(data):
+    """Check judge panel settings. They are stored as strings; an empty string clears one."""
+    panel = data.get("judge_panel")
+    if panel:
+        try:
+            judges = json.loads(panel)
+        except (TypeError, json.JSONDecodeError):
+            raise ValidationError("judge_panel must be a JSON list of {provider, model} objects")
+        if not isinstance(judges, list) or not all(
+            isinstance(j, dict) and j.get("provider") and j.get("model") for j in judges
+        ):
+            raise ValidationError("judge_panel must be a JSON list of {provider, model} objects")
+    aggregation = data.get("judge_panel_aggregation")
+    if aggregation and aggregation not in PANEL_AGGREGATIONS:
+        raise ValidationError(f"judge_panel_aggregation must be one of: {', '.join(PANEL_AGGREGATIONS)}")
+    consensus = data.get("judge_panel_consensus")
+    if consensus and not (isinstance(consensus, str) and consensus.isdigit()):
+        raise ValidationError("judge_panel_consensus must be a whole number (0 waits for every judge)")
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValidationError(f"{name} must be an ISO 8601 date or timestamp")
+
+
+def parse_run_filters(args):
+    """Read run filters from query args: from, to, provider, model, mode, status, judge_enabled."""
+    filters = {
+        "provider": args.get("provider") or None,
+        "model": args.get("model") or None,
+        "mode": args.get("mode") or None,
+        "status": args.get("status") or None,
+        "date_from": None,
+        "date_to": None,
+        "judge_enabled": None,
+    }
+    if args.get("from"):
+        filters["date_from"] = _parse_date(args["from"], "from")
+    if args.get("to"):
+        filters["date_to"] = _parse_date(args["to"], "to")
+    judge_enabled = args.get("judge_enabled")
+    if judge_enabled:
+        if judge_enabled.lower() not in ("true", "false", "1", "0"):
+            raise ValidationError("judge_enabled must be true or false")
+        filters["judge_enabled"] = judge_enabled.lower() in ("true", "1")
+    return filters
+
+
+def encode_cursor(*values):
+    """Opaque keyset cursor holding the sort key of the last row on a page."""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(value):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+    except (binascii.Error, ValueError):
+        values = None
+    if not isinstance(values, list):
+        raise ValidationError("cursor is invalid")
+    return values
+
+
+def _parse_limit(args, default=50, maximum=MAX_PAGE_SIZE):
+    limit = args.get("limit", default)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        limit = 0
+    if not 1 <= limit <= maximum:
+        raise ValidationError(f"limit must be between 1 and {maximum}")
+    return limit
+
+
+def parse_run_page(args):
+    """Read limit and cursor from query args. Returns (limit, after), where after is the
+    (created_at, id) of the last run on the previous page, or None for the first page."""
+    limit = _parse_limit(args)
+    if not args.get("cursor"):
+        return limit, None
+    values = _decode_cursor(args["cursor"])
+    try:
+        created_at, run_id = values
+        return limit, (datetime.fromisoformat(created_at), int(run_id))
+    except (TypeError, ValueError):
+        raise ValidationError("cursor is invalid")
+
+
+def parse_search_args(args):
+    """Read a search from query args: q, match, scope, provider, model, limit and cursor.
+    after is the (rank, kind, id) of the last hit on the previous page, or None."""
+    query = (args.get("q") or "").strip()
+    if not query:
+        raise ValidationError("q is required")
+    if len(query) > MAX_SEARCH_LENGTH:
+        raise ValidationError(f"q must be at most {MAX_SEARCH_LENGTH} characters")
+    match = args.get("match", "words")
+    if match not in SEARCH_MATCHES:
+        raise ValidationError(f"match must be one of: {', '.join(SEARCH_MATCHES)}")
+    if match == "substring" and len(query) < MIN_SUBSTRING_LENGTH:
+        raise ValidationError(f"substring searches need at least {MIN_SUBSTRING_LENGTH} characters")
+    scope = args.get("scope", "all")
+    if scope not in SEARCH_SCOPES:
+        raise ValidationError(f"scope must be one of: {', '.join(SEARCH_SCOPES)}")
+    search = {
+        "query": query,
+        "match": match,
+        "scope": scope,
+        "provider": args.get("provider") or None,
+        "model": args.get("model") or None,
+        "limit": _parse_limit(args, default=20, maximum=100),
+        "after": None,
+    }
+    if args.get("cursor"):
+        values = _decode_cursor(args["cursor"])
+        try:
+            rank, kind, hit_id = values
+            search["after"] = (float(rank), str(kind), int(hit_id))
+        except (TypeError, ValueError):
+            raise ValidationError("cursor is invalid")
+    return search
+
+
+def parse_leaderboard_filters(args):
+    """Read leaderboard filters from query args: from, to (whole UTC days), judge_prompt_id, provider."""
+    filters = {
+        "date_from": None,
+        "date_to": None,
+        "judge_prompt_id": args.get("judge_prompt_id") or None,
+        "provider": args.get("provider") or None,
+    }
+    if args.get("from"):
+        filters["date_from"] = _parse_date(args["from"], "from").date()
+    if args.get("to"):
+        filters["date_to"] = _parse_date(args["to"], "to").date()
+    return filters
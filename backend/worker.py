@@ -0,0 +1,28 @@
+"""Standalone autorun worker.
+
+Executes queued autoruns alongside (or instead of) the workers embedded in the web
+processes. Start as many as needed, on any machine that can reach the database:
+
+    python worker.py
+"""
+import asyncio
+import logging
+import signal
+
+import config  # noqa: F401  (loads .env)
+from models import init_db
+from services.job_queue import Worker
+
+
+async def main():
+    worker = Worker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(worker.stop()))
+    await worker.run()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    init_db()
+    asyncio.run(main())
@@ -42,3 +42,40 @@ export function updateSettings(data: Record<string, string>) {
 export function fetchModels(provider: string) {
   return apiFetch<ModelInfo[]>(`/admin/models/${provider}`);
 }
+
+export interface GovernorModel {
+  model: string;
+  in_flight: number;
+  concurrency_limit: number;
+  rate_limited: number;
+}
+
+export interface GovernorLimiter {
+  key: string;
+  queued: number;
+  in_flight: number;
+  /** Sum of the per-model limits in `models`. */
+  concurrency_limit: number;
+  max_concurrency: number;
+  rpm_limit: number | null;
+  rpm_available: number | null;
+  tpm_limit: number | null;
+  tpm_available: number | null;
+  rate_limited: number;
+  models: GovernorModel[];
+}
+
+export function fetchGovernorStatus() {
+  return apiFetch<GovernorLimiter[]>("/admin/governor");
+}
+
+export interface CircuitBreakerStatus {
+  provider: string;
+  state: "closed" | "open" | "half_open";
+  consecutive_failures: number;
+  retry_in: number | null;
+}
+
+export function fetchBreakerStatus() {
+  return apiFetch<CircuitBreakerStatus[]>("/admin/breakers");
+}
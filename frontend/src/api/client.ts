@@ -1,9 +1,10 @@
 const BASE_URL = "/api";
 
-export async function apiFetch<T>(
+/** Like apiFetch, for callers that also need the response headers. */
+export async function apiFetchResponse(
   path: string,
   options: RequestInit = {}
-): Promise<T> {
+): Promise<Response> {
   const url = `${BASE_URL}${path}`;
   const res = await fetch(url, {
     headers: {
@@ -18,5 +19,13 @@ export async function apiFetch<T>(
     throw new Error(error.error || `Request failed: ${res.status}`);
   }
 
+  return res;
+}
+
+export async function apiFetch<T>(
+  path: string,
+  options: RequestInit = {}
+): Promise<T> {
+  const res = await apiFetchResponse(path, options);
   return res.json();
 }
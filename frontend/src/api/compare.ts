@@ -5,9 +5,18 @@ export interface ModelSelection {
   model: string;
 }
 
+export type CacheMode = "off" | "fresh" | "prefer_cache" | "replay";
+
+export interface RunOptions {
+  /** End-to-end budget per comparison (per prompt for autoruns), 1-600 s. */
+  timeoutSeconds?: number;
+  /** Single runs only: race a duplicate request once a call passes the model's p95 latency. */
+  hedge?: boolean;
+}
+
 export interface LLMResult {
   text: string;
-  usage: Record<string, number>;
+  usage: Record<string, unknown>;
   model: string;
   provider: string;
   error: string | null;
@@ -21,33 +30,66 @@ export interface RunResponse {
   results: LLMResult[];
 }
 
+export interface AutorunOutput {
+  id: number;
+  run_prompt_id: number;
+  provider: string;
+  model: string;
+  output_text: string;
+  latency_ms: number;
+  error: string | null;
+}
+
+export interface AutorunScore {
+  id: number;
+  run_prompt_id: number;
+  model_label: string;
+  score: number;
+  comment: string;
+}
+
+export interface AutorunJudgeResult {
+  id: number;
+  run_prompt_id: number;
+  result_json: Record<string, unknown>;
+  latency_ms: number;
+}
+
+export interface AutorunPrompt {
+  id: number;
+  prompt_text: string;
+  sequence_num: number;
+  // Bumped whenever the prompt's outputs / judge results are deleted for a retry
+  outputs_cleared: number;
+  judge_results_cleared: number;
+}
+
 export interface AutorunStatusResponse {
   run_id: number;
   status: string;
   completed: number;
   total: number;
-  prompts: Array<{
-    id: number;
-    prompt_text: string;
-    sequence_num: number;
-    outputs: Array<{
-      id: number;
-      provider: string;
-      model: string;
-      output_text: string;
-      latency_ms: number;
-      error: string | null;
-    }>;
-    scores: Array<{
-      model_label: string;
-      score: number;
-      comment: string;
-    }>;
-    judge_results: Array<{
-      result_json: Record<string, unknown>;
-      latency_ms: number;
-    }>;
-  }>;
+  cursor: number;
+  prompts: Array<
+    AutorunPrompt & {
+      outputs: AutorunOutput[];
+      scores: AutorunScore[];
+      judge_results: AutorunJudgeResult[];
+    }
+  >;
+}
+
+/** Rows written since the cursor passed to pollAutorunStatus, as flat lists. */
+export interface AutorunStatusDelta {
+  run_id: number;
+  status: string;
+  completed: number;
+  total: number;
+  cursor: number;
+  prompts: AutorunPrompt[];
+  outputs: AutorunOutput[];
+  scores: AutorunScore[];
+  judge_results: AutorunJudgeResult[];
 }
 
 export interface ScoreSubmission {
@@ -60,32 +102,144 @@ export interface JudgeResponse {
   result?: {
     evaluations: Array<{
       model_label: string;
-      score: number;
+      /** null for a label no judge on a panel scored */
+      score: number | null;
       comment: string;
     }>;
     winner: string;
     judge_reasoning: string;
+    /** Set on evaluations reused from the judge cache, also in the saved judge result. */
+    cached?: boolean;
   };
   error?: string;
+  /** For a cached evaluation, the latency of the original judge call. */
   latency_ms?: number;
+  /** True when an identical earlier evaluation was reused instead of calling the judge. */
+  cached?: boolean;
+  /** Set when a judge panel answered; `result` is then the panel's aggregate. */
+  panel_id?: string;
 }
 
-export function submitRun(prompt: string, models: ModelSelection[], judgeEnabled: boolean) {
+export function submitRun(
+  prompt: string,
+  models: ModelSelection[],
+  judgeEnabled: boolean,
+  cacheMode?: CacheMode,
+  options: RunOptions = {}
+) {
   return apiFetch<RunResponse>("/compare/run", {
     method: "POST",
-    body: JSON.stringify({ prompt, models, judge_enabled: judgeEnabled }),
+    body: JSON.stringify({
+      prompt,
+      models,
+      judge_enabled: judgeEnabled,
+      cache_mode: cacheMode,
+      timeout_seconds: options.timeoutSeconds,
+      hedge: options.hedge,
+    }),
+  });
+}
+
+export interface StreamHandlers {
+  onStart?: (data: { run_id: number; run_prompt_id: number; models: ModelSelection[] }) => void;
+  onDelta?: (data: { index: number; provider: string; model: string; text: string }) => void;
+  onDone?: (data: LLMResult & { index: number }) => void;
+}
+
+export async function streamRun(
+  prompt: string,
+  models: ModelSelection[],
+  judgeEnabled: boolean,
+  handlers: StreamHandlers,
+  signal?: AbortSignal,
+  cacheMode?: CacheMode,
+  options: Pick<RunOptions, "timeoutSeconds"> = {}
+) {
+  const res = await fetch("/api/compare/run/stream", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      prompt,
+      models,
+      judge_enabled: judgeEnabled,
+      cache_mode: cacheMode,
+      timeout_seconds: options.timeoutSeconds,
+    }),
+    signal,
   });
+  if (!res.ok || !res.body) {
+    const error = await res.json().catch(() => ({ error: res.statusText }));
+    throw new Error(error.error || `Request failed: ${res.status}`);
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      const event = frame.match(/^event: (.*)$/m)?.[1];
+      const data = frame.match(/^data: (.*)$/m)?.[1];
+      if (!event || !data) continue;
+      const parsed = JSON.parse(data);
+      if (event === "start") handlers.onStart?.(parsed);
+      else if (event === "delta") handlers.onDelta?.(parsed);
+      else if (event === "done") handlers.onDone?.(parsed);
+    }
+  }
 }
 
-export function submitAutorun(prompts: string[], models: ModelSelection[], judgeEnabled: boolean) {
+export function submitAutorun(
+  prompts: string[],
+  models: ModelSelection[],
+  judgeEnabled: boolean,
+  cacheMode?: CacheMode,
+  options: Pick<RunOptions, "timeoutSeconds"> = {}
+) {
   return apiFetch<{ run_id: number; status: string }>("/compare/autorun", {
     method: "POST",
-    body: JSON.stringify({ prompts, models, judge_enabled: judgeEnabled }),
+    body: JSON.stringify({
+      prompts,
+      models,
+      judge_enabled: judgeEnabled,
+      cache_mode: cacheMode,
+      timeout_seconds: options.timeoutSeconds,
+    }),
+  });
+}
+
+/**
+ * Fetch what changed in an autorun since `cursor` (0 on the first poll).
+ * Resolves to null when the server answers 304 for the given ETag.
+ */
+export async function pollAutorunStatus(runId: number, cursor: number, etag: string | null) {
+  const res = await fetch(`/api/compare/autorun/${runId}/status?cursor=${cursor}`, {
+    headers: etag ? { "If-None-Match": etag } : {},
   });
+  if (res.status === 304) return null;
+  if (!res.ok) {
+    const error = await res.json().catch(() => ({ error: res.statusText }));
+    throw new Error(error.error || `Request failed: ${res.status}`);
+  }
+  return {
+    delta: (await res.json()) as AutorunStatusDelta,
+    etag: res.headers.get("ETag"),
+  };
 }
 
-export function pollAutorunStatus(runId: number) {
-  return apiFetch<AutorunStatusResponse>(`/compare/autorun/${runId}/status`);
+export type AutorunAction = "pause" | "resume" | "cancel";
+
+/** Pausing lets in-flight prompts finish; cancelling stops them too. */
+export function changeAutorun(runId: number, action: AutorunAction) {
+  return apiFetch<{ run_id: number; status: string }>(`/compare/autorun/${runId}/${action}`, {
+    method: "POST",
+  });
 }
 
 export function submitScore(runPromptId: number, scores: ScoreSubmission[]) {
@@ -95,9 +249,10 @@ export function submitScore(runPromptId: number, scores: ScoreSubmission[]) {
   });
 }
 
-export function invokeJudge(runPromptId: number) {
+/** Pass forceRefresh to call the judge even when a cached evaluation exists. */
+export function invokeJudge(runPromptId: number, forceRefresh = false) {
   return apiFetch<JudgeResponse>("/compare/judge", {
     method: "POST",
-    body: JSON.stringify({ run_prompt_id: runPromptId }),
+    body: JSON.stringify({ run_prompt_id: runPromptId, force_refresh: forceRefresh }),
   });
 }
@@ -1,4 +1,4 @@
-import { apiFetch } from "./client.ts";
+import { apiFetch, apiFetchResponse } from "./client.ts";
 
 export interface RunSummary {
   id: number;
@@ -37,8 +37,28 @@ export interface RunDetail extends RunSummary {
   }>;
 }
 
-export function fetchRuns(limit = 50, offset = 0) {
-  return apiFetch<RunSummary[]>(`/runs/?limit=${limit}&offset=${offset}`);
+/** A run as listed in history, with counts that would otherwise need the run's detail. */
+export interface RunListItem extends RunSummary {
+  prompt_count: number;
+  error_count: number;
+  /** Mean latency of the run's successful outputs; null if there are none. */
+  avg_latency_ms: number | null;
+}
+
+export interface RunsPage {
+  runs: RunListItem[];
+  /** Pass back as `cursor` for the next page; null on the last page. */
+  nextCursor: string | null;
+}
+
+export async function fetchRuns(filters: RunFilters = {}, cursor?: string | null, limit = 50): Promise<RunsPage> {
+  const params = new URLSearchParams({ limit: String(limit) });
+  for (const [key, value] of Object.entries(filters)) {
+    if (value !== undefined && value !== "") params.set(key, String(value));
+  }
+  if (cursor) params.set("cursor", cursor);
+  const res = await apiFetchResponse(`/runs/?${params.toString()}`);
+  return { runs: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
 }
 
 export function fetchRunDetail(runId: number) {
@@ -52,3 +72,148 @@ export function deleteRun(runId: number) {
 export function getExportUrl(runId: number, format: "csv" | "xlsx") {
   return `/api/runs/${runId}/export?format=${format}`;
 }
+
+export interface RunFilters {
+  from?: string;
+  to?: string;
+  provider?: string;
+  model?: string;
+  mode?: string;
+  status?: string;
+  judge_enabled?: boolean;
+}
+
+export function getBulkExportUrl(
+  filters: RunFilters,
+  format: "csv" | "jsonl" = "csv",
+  layout: "per_run" | "combined" = "per_run",
+) {
+  const params = new URLSearchParams({ format, layout });
+  for (const [key, value] of Object.entries(filters)) {
+    if (value !== undefined && value !== "") params.set(key, String(value));
+  }
+  return `/api/runs/export?${params.toString()}`;
+}
+
+export interface LeaderboardEntry {
+  provider: string;
+  model: string;
+  outputs: number;
+  errors: number;
+  mean_latency_ms: number | null;
+  tokens_per_second: number | null;
+  user_scores: number;
+  mean_user_score: number | null;
+  user_win_rate: number | null;
+  judge_evaluations: number;
+  mean_judge_score: number | null;
+  judge_win_rate: number | null;
+}
+
+/** Dates are whole UTC days: `from` inclusive, `to` exclusive. */
+export interface LeaderboardFilters {
+  from?: string;
+  to?: string;
+  provider?: string;
+  judge_prompt_id?: string;
+}
+
+export function fetchLeaderboard(filters: LeaderboardFilters = {}) {
+  const params = new URLSearchParams();
+  for (const [key, value] of Object.entries(filters)) {
+    if (value !== undefined && value !== "") params.set(key, String(value));
+  }
+  return apiFetch<LeaderboardEntry[]>(`/runs/leaderboard?${params.toString()}`);
+}
+
+export interface ModelRating {
+  provider: string;
+  model: string;
+  /** Bradley-Terry strength on the Elo scale (mean 1500). */
+  rating: number;
+  /** 95% bootstrap interval; null when bootstrapping is disabled. */
+  ci_low: number | null;
+  ci_high: number | null;
+  wins: number;
+  losses: number;
+  ties: number;
+}
+
+export interface RatingsResponse {
+  models: ModelRating[];
+  comparisons: number;
+  iterations: number;
+  bootstrap: number;
+  incremental: boolean;
+  fitted_at: string;
+}
+
+export function fetchRatings(source: "all" | "user" | "judge" = "all", judgePromptId?: string) {
+  const params = new URLSearchParams({ source });
+  if (judgePromptId) params.set("judge_prompt_id", judgePromptId);
+  return apiFetch<RatingsResponse>(`/runs/ratings?${params.toString()}`);
+}
+
+export interface SearchHit {
+  kind: "prompt" | "output";
+  /** ts_rank of the match; 0 for substring searches, which list newest first. */
+  rank: number;
+  run_id: number;
+  run_prompt_id: number;
+  sequence_num: number;
+  output_id: number | null;
+  provider: string | null;
+  model: string | null;
+  created_at: string;
+  /** Excerpt with each match wrapped in SNIPPET_START / SNIPPET_END. */
+  snippet: string;
+}
+
+export interface SearchParams {
+  q: string;
+  /** "words": full-text, with "quoted phrases", or, -excluded. "substring": at least 3 characters. */
+  match?: "words" | "substring";
+  scope?: "all" | "prompts" | "outputs";
+  /** Limit the search to this provider's / model's outputs. */
+  provider?: string;
+  model?: string;
+}
+
+export interface SearchPage {
+  hits: SearchHit[];
+  nextCursor: string | null;
+  /** A word search matched more rows than the server ranks; only the newest matches are listed. */
+  truncated: boolean;
+}
+
+export const SNIPPET_START = "\u0002";
+export const SNIPPET_END = "\u0003";
+
+/** Split a snippet into plain and matched parts, for rendering matches highlighted. */
+export function snippetParts(snippet: string): Array<{ text: string; match: boolean }> {
+  const parts: Array<{ text: string; match: boolean }> = [];
+  for (const piece of snippet.split(SNIPPET_START)) {
+    const end = piece.indexOf(SNIPPET_END);
+    if (end === -1) {
+      if (piece) parts.push({ text: piece, match: false });
+      continue;
+    }
+    parts.push({ text: piece.slice(0, end), match: true });
+    if (end + 1 < piece.length) parts.push({ text: piece.slice(end + 1), match: false });
+  }
+  return parts;
+}
+
+export async function searchRuns(search: SearchParams, cursor?: string | null, limit = 20): Promise<SearchPage> {
+  const params = new URLSearchParams({ limit: String(limit) });
+  for (const [key, value] of Object.entries(search)) {
+    if (value !== undefined && value !== "") params.set(key, String(value));
+  }
+  if (cursor) params.set("cursor", cursor);
+  const res = await apiFetchResponse(`/runs/search?${params.toString()}`);
+  return {
+    hits: await res.json(),
+    nextCursor: res.headers.get("X-Next-Cursor"),
+    truncated: res.headers.get("X-Search-Truncated") === "true",
+  };
+}
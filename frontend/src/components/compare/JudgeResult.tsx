@@ -50,7 +50,7 @@ export function JudgeResult({ result, loading }: Props) {
         {data.evaluations.map((ev) => (
           <div key={ev.model_label} className="p-2 rounded border border-[hsl(var(--border))] text-sm">
             <p className="font-medium">{ev.model_label}</p>
-            <p>Score: <strong>{ev.score}</strong></p>
+            <p>Score: <strong>{ev.score ?? "—"}</strong></p>
             <p className="text-[hsl(var(--muted-foreground))] text-xs mt-1">{ev.comment}</p>
           </div>
         ))}
@@ -1,9 +1,9 @@
 import { Trash2, Download, Eye } from "lucide-react";
 import { useMutation, useQueryClient } from "@tanstack/react-query";
-import { deleteRun, getExportUrl, type RunSummary } from "../../api/runs.ts";
+import { deleteRun, getExportUrl, type RunListItem } from "../../api/runs.ts";
 
 interface Props {
-  runs: RunSummary[];
+  runs: RunListItem[];
   onSelect: (runId: number) => void;
   selectedId: number | null;
 }
@@ -31,6 +31,9 @@ export function RunsTable({ runs, onSelect, selectedId }: Props) {
             <th className="text-left py-2 px-3 font-medium">Date</th>
             <th className="text-left py-2 px-3 font-medium">Mode</th>
             <th className="text-left py-2 px-3 font-medium">Models</th>
+            <th className="text-right py-2 px-3 font-medium">Prompts</th>
+            <th className="text-right py-2 px-3 font-medium">Errors</th>
+            <th className="text-right py-2 px-3 font-medium">Avg latency</th>
             <th className="text-left py-2 px-3 font-medium">Status</th>
             <th className="text-right py-2 px-3 font-medium">Actions</th>
           </tr>
@@ -55,6 +58,11 @@ export function RunsTable({ runs, onSelect, selectedId }: Props) {
               <td className="py-2 px-3 text-xs">
                 {run.models_config.map((m) => `${m.model}`).join(", ")}
               </td>
+              <td className="py-2 px-3 text-xs text-right">{run.prompt_count}</td>
+              <td className="py-2 px-3 text-xs text-right">{run.error_count}</td>
+              <td className="py-2 px-3 text-xs text-right">
+                {run.avg_latency_ms === null ? "—" : `${run.avg_latency_ms} ms`}
+              </td>
               <td className="py-2 px-3">
                 <span
                   className={`px-2 py-0.5 rounded text-xs ${
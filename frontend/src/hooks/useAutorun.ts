@@ -1,16 +1,73 @@
-import { useState, useEffect, useCallback } from "react";
-import { submitAutorun, pollAutorunStatus, type ModelSelection, type AutorunStatusResponse } from "../api/compare.ts";
+import { useState, useEffect, useCallback, useRef } from "react";
+import {
+  submitAutorun,
+  pollAutorunStatus,
+  changeAutorun,
+  type AutorunAction,
+  type ModelSelection,
+  type AutorunStatusResponse,
+  type AutorunStatusDelta,
+} from "../api/compare.ts";
+
+type AutorunPromptState = AutorunStatusResponse["prompts"][number];
+
+function upsertById<T extends { id: number }>(rows: T[], incoming: T[]) {
+  const byId = new Map(rows.map((r) => [r.id, r]));
+  for (const row of incoming) byId.set(row.id, row);
+  return [...byId.values()].sort((a, b) => a.id - b.id);
+}
+
+function mergeDelta(prev: AutorunStatusResponse | null, delta: AutorunStatusDelta): AutorunStatusResponse {
+  const prompts = new Map<number, AutorunPromptState>((prev?.prompts ?? []).map((p) => [p.id, p]));
+  for (const p of delta.prompts) {
+    const existing = prompts.get(p.id);
+    // Deltas never carry deleted rows; a moved cleared counter means ours are gone
+    const keep = <T>(rows: T[] | undefined, cleared: boolean) => (rows && !cleared ? rows : []);
+    prompts.set(p.id, {
+      ...p,
+      outputs: keep(existing?.outputs, existing?.outputs_cleared !== p.outputs_cleared),
+      scores: existing?.scores ?? [],
+      judge_results: keep(existing?.judge_results, existing?.judge_results_cleared !== p.judge_results_cleared),
+    });
+  }
+  const updatePrompt = (id: number, fn: (p: AutorunPromptState) => AutorunPromptState) => {
+    const prompt = prompts.get(id);
+    if (prompt) prompts.set(id, fn(prompt));
+  };
+  for (const o of delta.outputs) {
+    updatePrompt(o.run_prompt_id, (p) => ({ ...p, outputs: upsertById(p.outputs, [o]) }));
+  }
+  for (const s of delta.scores) {
+    updatePrompt(s.run_prompt_id, (p) => ({ ...p, scores: upsertById(p.scores, [s]) }));
+  }
+  for (const j of delta.judge_results) {
+    updatePrompt(j.run_prompt_id, (p) => ({ ...p, judge_results: upsertById(p.judge_results, [j]) }));
+  }
+  return {
+    run_id: delta.run_id,
+    status: delta.status,
+    completed: delta.completed,
+    total: delta.total,
+    cursor: delta.cursor,
+    prompts: [...prompts.values()].sort((a, b) => a.sequence_num - b.sequence_num),
+  };
+}
 
 export function useAutorun() {
   const [runId, setRunId] = useState<number | null>(null);
   const [status, setStatus] = useState<AutorunStatusResponse | null>(null);
   const [isRunning, setIsRunning] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const cursorRef = useRef(0);
+  const etagRef = useRef<string | null>(null);
 
   const start = useCallback(
     async (prompts: string[], models: ModelSelection[], judgeEnabled: boolean) => {
       setError(null);
       setIsRunning(true);
+      setStatus(null);
+      cursorRef.current = 0;
+      etagRef.current = null;
       try {
         const res = await submitAutorun(prompts, models, judgeEnabled);
         setRunId(res.run_id);
@@ -27,9 +84,12 @@ export function useAutorun() {
 
     const interval = setInterval(async () => {
       try {
-        const s = await pollAutorunStatus(runId);
-        setStatus(s);
-        if (s.status === "completed" || s.status === "failed") {
+        const res = await pollAutorunStatus(runId, cursorRef.current, etagRef.current);
+        if (!res) return;
+        cursorRef.current = res.delta.cursor;
+        etagRef.current = res.etag;
+        setStatus((prev) => mergeDelta(prev, res.delta));
+        if (["completed", "failed", "cancelled"].includes(res.delta.status)) {
           setIsRunning(false);
           clearInterval(interval);
         }
@@ -41,5 +101,21 @@ export function useAutorun() {
     return () => clearInterval(interval);
   }, [runId, isRunning]);
 
-  return { start, status, isRunning, error, runId };
+  const control = useCallback(
+    async (action: AutorunAction) => {
+      if (!runId) return;
+      setError(null);
+      try {
+        const res = await changeAutorun(runId, action);
+        setStatus((prev) => (prev ? { ...prev, status: res.status } : prev));
+        // A resumed run needs polling again
+        setIsRunning(!["completed", "failed", "cancelled"].includes(res.status));
+      } catch (e) {
+        setError((e as Error).message);
+      }
+    },
+    [runId]
+  );
+
+  return { start, status, isRunning, error, runId, control };
 }
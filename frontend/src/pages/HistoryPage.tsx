@@ -1,16 +1,25 @@
 import { useState } from "react";
-import { useQuery } from "@tanstack/react-query";
-import { fetchRuns } from "../api/runs.ts";
+import { useInfiniteQuery } from "@tanstack/react-query";
+import { fetchRuns, type RunFilters } from "../api/runs.ts";
 import { RunsTable } from "../components/history/RunsTable.tsx";
 import { RunDetail } from "../components/history/RunDetail.tsx";
 import { History } from "lucide-react";
 
 export function HistoryPage() {
   const [selectedRunId, setSelectedRunId] = useState<number | null>(null);
-  const { data: runs, isLoading, error } = useQuery({
-    queryKey: ["runs"],
-    queryFn: () => fetchRuns(),
+  const [filters, setFilters] = useState<RunFilters>({});
+  const { data, isLoading, error, fetchNextPage, hasNextPage, isFetchingNextPage } = useInfiniteQuery({
+    queryKey: ["runs", filters],
+    queryFn: ({ pageParam }) => fetchRuns(filters, pageParam),
+    initialPageParam: null as string | null,
+    getNextPageParam: (page) => page.nextCursor,
   });
+  const runs = data?.pages.flatMap((page) => page.runs);
+
+  const setFilter = (key: keyof RunFilters, value: string) =>
+    setFilters((prev) => ({ ...prev, [key]: value || undefined }));
+  const inputClass =
+    "rounded-md border border-[hsl(var(--input))] bg-[hsl(var(--background))] px-3 py-1.5 text-sm";
 
   return (
     <div className="max-w-6xl mx-auto space-y-4">
@@ -19,6 +28,44 @@ export function HistoryPage() {
         <h1 className="text-xl font-semibold">Run History</h1>
       </div>
 
+      <div className="flex flex-wrap items-center gap-2">
+        <input
+          placeholder="Provider"
+          value={filters.provider ?? ""}
+          onChange={(e) => setFilter("provider", e.target.value)}
+          className={inputClass}
+        />
+        <input
+          placeholder="Model"
+          value={filters.model ?? ""}
+          onChange={(e) => setFilter("model", e.target.value)}
+          className={inputClass}
+        />
+        <select value={filters.status ?? ""} onChange={(e) => setFilter("status", e.target.value)} className={inputClass}>
+          <option value="">Any status</option>
+          <option value="pending">Pending</option>
+          <option value="running">Running</option>
+          <option value="paused">Paused</option>
+          <option value="completed">Completed</option>
+          <option value="failed">Failed</option>
+          <option value="cancelled">Cancelled</option>
+        </select>
+        <input
+          type="date"
+          value={filters.from ?? ""}
+          onChange={(e) => setFilter("from", e.target.value)}
+          className={inputClass}
+          title="From"
+        />
+        <input
+          type="date"
+          value={filters.to ?? ""}
+          onChange={(e) => setFilter("to", e.target.value)}
+          className={inputClass}
+          title="Until (exclusive)"
+        />
+      </div>
+
       {isLoading && <p className="text-sm text-[hsl(var(--muted-foreground))]">Loading runs...</p>}
       {error && <p className="text-sm text-[hsl(var(--destructive))]">Failed to load runs</p>}
 
@@ -28,6 +75,16 @@ export function HistoryPage() {
         </div>
       )}
 
+      {hasNextPage && (
+        <button
+          onClick={() => fetchNextPage()}
+          disabled={isFetchingNextPage}
+          className="px-3 py-1.5 rounded-md text-sm bg-[hsl(var(--muted))] disabled:opacity-50"
+        >
+          {isFetchingNextPage ? "Loading..." : "Load more"}
+        </button>
+      )}
+
       {selectedRunId && (
         <div className="p-4 rounded-lg border border-[hsl(var(--border))] bg-[hsl(var(--card))]">
           <RunDetail runId={selectedRunId} />